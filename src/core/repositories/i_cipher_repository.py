@@ -28,12 +28,32 @@ class ICipherRepository(ABC):
     def get_team_ciphers(self, team):
         pass
 
+    @abstractmethod
+    def get_multiple_by_folder(self, user, folder_id):
+        pass
+
     @abstractmethod
     def get_multiple_by_user(self, user, only_personal=False, only_managed_team=False,
                              only_edited=False, only_deleted=False,
                              exclude_team_ids=None, filter_ids=None, exclude_types=None):
         pass
 
+    @abstractmethod
+    def rebuild_user_cipher_access(self, user):
+        pass
+
+    @abstractmethod
+    def verify_user_cipher_access(self, user):
+        pass
+
+    @abstractmethod
+    def get_sync_tombstones(self, user, since):
+        pass
+
+    @abstractmethod
+    def is_sync_access_changed(self, user, since) -> bool:
+        pass
+
     @abstractmethod
     def save_new_cipher(self, cipher_data) -> Cipher:
         pass
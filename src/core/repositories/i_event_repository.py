@@ -25,5 +25,11 @@ class IEventRepository(ABC):
         pass
 
     @abstractmethod
-    def export_enterprise_activity(self, enterprise_member, activity_logs, cc_emails=None, **kwargs):
+    def get_multiple_by_enterprise_activity_filters(self, enterprise_id: str, from_param: int, to_param: int,
+                                                    filters: dict = None):
+        pass
+
+    @abstractmethod
+    def export_enterprise_activity(self, enterprise_member, from_param: int, to_param: int, filters: dict = None,
+                                   cc_emails=None, **kwargs):
         pass
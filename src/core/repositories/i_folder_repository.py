@@ -24,3 +24,7 @@ class IFolderRepository(ABC):
     @abstractmethod
     def import_multiple_folders(self, user: User, folders):
         pass
+
+    @abstractmethod
+    def destroy_folder(self, folder: Folder):
+        pass
@@ -82,6 +82,10 @@ class IUserRepository(ABC):
     def get_max_allow_cipher_type(self, user: User):
         pass
 
+    @abstractmethod
+    def get_user_entitlements(self, user: User):
+        pass
+
     @abstractmethod
     def get_mobile_user_plan(self, pm_mobile_subscription):
         pass
@@ -1,19 +1,26 @@
 import json
 import uuid
 
+from django.db import transaction
 from django.db.models import Q, Case, When, Value, IntegerField, BooleanField, Count, F
 
 from core.repositories import ICipherRepository
-from core.utils.account_revision_date import bump_account_revision_date
+from core.utils.account_revision_date import bump_account_revision_date, revision_bumper
+from shared.caching.user_statistic_changes import record_user_statistic_changes, USER_STATISTIC_SOURCE_CIPHERS
 from shared.constants.ciphers import *
 from shared.utils.app import now, diff_list, get_cipher_detail_data
 from shared.constants.members import *
 from cystack_models.models.ciphers.ciphers import Cipher
+from cystack_models.models.ciphers.user_cipher_access import UserCipherAccess
+from cystack_models.models.ciphers.cipher_user_states import CipherUserState
 from cystack_models.models.teams.teams import Team
 from cystack_models.models.users.users import User
 from cystack_models.models.ciphers.folders import Folder
+from cystack_models.models.ciphers.sync_tombstones import SyncTombstone
 from cystack_models.models.teams.collections import Collection
 from cystack_models.models.teams.collections_ciphers import CollectionCipher
+from cystack_models.models.teams.collections_members import CollectionMember
+from cystack_models.models.teams.groups_members import GroupMember
 
 
 class CipherRepository(ICipherRepository):
@@ -66,11 +73,206 @@ class CipherRepository(ICipherRepository):
     def get_team_ciphers(self, team):
         return Cipher.objects.filter(team=team)
 
+    def get_user_team_access(self, user: User, only_managed_team=False, exclude_team_ids=None):
+        """
+        Resolve the confirmed team memberships of the user into the sets of team and collection ids
+        which decide the visible team ciphers and their `view_password` flag
+        :param user: (obj) User object
+        :param only_managed_team: (bool) if True => Only resolve the non-locked teams
+        :param exclude_team_ids: (list) Excluding all teams have id in this list
+        :return: (dict)
+        """
+        confirmed_team_members = user.team_members.filter(status=PM_MEMBER_STATUS_CONFIRMED)
+        if only_managed_team:
+            confirmed_team_members = confirmed_team_members.filter(team__locked=False)
+        if exclude_team_ids:
+            confirmed_team_members = confirmed_team_members.exclude(team_id__in=exclude_team_ids)
+        confirmed_team_members = list(confirmed_team_members.values(
+            'id', 'team_id', 'role_id', 'hide_passwords', 'team__personal_share'
+        ))
+
+        team_access = {
+            # The teams which the user can see all ciphers: owner, admin, personal sharing and access-all groups
+            "full_access_team_ids": set(),
+            # The teams which the user only sees the ciphers of the member collections
+            "collection_team_ids": set(),
+            "collection_ids": set(),
+            # The user can't view passwords of the ciphers in these teams and collections
+            "hide_password_team_ids": set(),
+            "hide_password_collection_ids": set(),
+            # The teams which the user can edit or delete ciphers
+            "edited_team_ids": set(),
+            "deleted_team_ids": set(),
+        }
+        if not confirmed_team_members:
+            return team_access
+
+        member_roles = {}
+        for team_member in confirmed_team_members:
+            team_id = team_member["team_id"]
+            role_id = team_member["role_id"]
+            member_roles[team_member["id"]] = role_id
+            if role_id in [MEMBER_ROLE_OWNER, MEMBER_ROLE_ADMIN] or team_member["team__personal_share"] is True:
+                team_access["full_access_team_ids"].add(team_id)
+            else:
+                team_access["collection_team_ids"].add(team_id)
+            if role_id == MEMBER_ROLE_MEMBER and team_member["team__personal_share"] is True and \
+                    team_member["hide_passwords"] is True:
+                team_access["hide_password_team_ids"].add(team_id)
+            if role_id in [MEMBER_ROLE_OWNER, MEMBER_ROLE_ADMIN, MEMBER_ROLE_MANAGER]:
+                team_access["edited_team_ids"].add(team_id)
+            if role_id == MEMBER_ROLE_OWNER:
+                team_access["deleted_team_ids"].add(team_id)
+
+        member_ids = list(member_roles.keys())
+        access_all_team_ids = GroupMember.objects.filter(
+            member_id__in=member_ids, group__access_all=True
+        ).values_list('group__team_id', flat=True)
+        team_access["full_access_team_ids"].update(access_all_team_ids)
+        team_access["collection_team_ids"].difference_update(team_access["full_access_team_ids"])
+
+        collection_members = CollectionMember.objects.filter(member_id__in=member_ids).values_list(
+            'member_id', 'collection_id', 'hide_passwords'
+        )
+        for member_id, collection_id, hide_passwords in collection_members:
+            team_access["collection_ids"].add(collection_id)
+            if hide_passwords is True and member_roles.get(member_id) == MEMBER_ROLE_MEMBER:
+                team_access["hide_password_collection_ids"].add(collection_id)
+        return team_access
+
+    def get_multiple_by_folder(self, user: User, folder_id: str):
+        """
+        Get list ciphers in the folder of the user. The folder is read from the CipherUserState rows, or from the legacy
+        `folders` column if the cipher has no state of the user (it was not backfilled yet)
+        :param user: (obj) User object
+        :param folder_id: (str) The folder id
+        :return:
+        """
+        legacy_ciphers = self.get_multiple_by_user(user=user).filter(folders__contains=folder_id).exclude(
+            id__in=CipherUserState.objects.filter(user=user).values('cipher_id')
+        ).only('id', 'folders')
+        legacy_cipher_ids = [
+            cipher.id for cipher in legacy_ciphers
+            if cipher.get_parsed_field("folders", int_keys=True).get(user.user_id) == folder_id
+        ]
+        return Cipher.objects.filter(
+            Q(cipher_user_states__user=user, cipher_user_states__folder_id=folder_id) | Q(id__in=legacy_cipher_ids)
+        ).distinct()
+
     def get_multiple_by_user(self, user: User, only_personal=False, only_managed_team=False,
                              only_edited=False, only_deleted=False,
                              exclude_team_ids=None, filter_ids=None, exclude_types=None):
         """
-        Get list ciphers of user
+        Get list ciphers of user from the cipher access index
+        :param user: (obj) User object
+        :param only_personal: (bool) if True => Only get list personal ciphers
+        :param only_managed_team: (bool) if True => Only get list ciphers of non-locked teams
+        :param only_edited: (bool) if True => Only get list ciphers that user is allowed edit permission
+        :param only_deleted: (bool) if True => Only get list ciphers that user is allowed delete permission
+        :param exclude_team_ids: (list) Excluding all ciphers have team_id in this list
+        :param filter_ids: (list) List filtered cipher ids
+        :param exclude_types: (list) Excluding all ciphers have type in this list
+        :return:
+        """
+        resolve_params = {
+            "only_personal": only_personal, "only_managed_team": only_managed_team,
+            "only_edited": only_edited, "only_deleted": only_deleted,
+            "exclude_team_ids": exclude_team_ids, "filter_ids": filter_ids, "exclude_types": exclude_types
+        }
+        if only_personal is True:
+            return self.resolve_multiple_by_user(user=user, **resolve_params)
+        if not self.is_built_user_cipher_access(user=user):
+            # A few ciphers are resolved directly instead of building the whole index
+            if filter_ids:
+                return self.resolve_multiple_by_user(user=user, **resolve_params)
+            self.build_user_cipher_access(user=user)
+
+        # All conditions of the index must be in a single filter() to share one join
+        access_q = Q(user_cipher_access__user=user)
+        if only_edited:
+            access_q &= Q(user_cipher_access__can_edit=True)
+        if only_deleted:
+            access_q &= Q(user_cipher_access__can_delete=True)
+        ciphers = Cipher.objects.filter(access_q).annotate(view_password=F('user_cipher_access__view_password'))
+        if only_managed_team:
+            ciphers = ciphers.filter(Q(team__isnull=True) | Q(team__locked=False))
+        if exclude_team_ids:
+            ciphers = ciphers.exclude(team_id__in=exclude_team_ids)
+        if filter_ids:
+            ciphers = ciphers.filter(id__in=filter_ids)
+        if exclude_types:
+            ciphers = ciphers.exclude(type__in=exclude_types)
+        return ciphers
+
+    def is_built_user_cipher_access(self, user: User):
+        """
+        The index of the user is built once, then it is updated by the write points (see `UserCipherAccess`)
+        """
+        return User.objects.filter(user_id=user.user_id, cipher_access_date__isnull=False).exists()
+
+    def build_user_cipher_access(self, user: User):
+        """
+        Build the cipher access index of the user for the first time. The user row is locked,
+        so the concurrent requests of the user build it only once
+        """
+        with transaction.atomic():
+            is_not_built = User.objects.select_for_update().filter(
+                user_id=user.user_id, cipher_access_date__isnull=True
+            ).exists()
+            if is_not_built:
+                self.rebuild_user_cipher_access(user=user)
+
+    def rebuild_user_cipher_access(self, user: User):
+        """
+        Rebuild the whole cipher access index of the user from the current memberships.
+        It is used by the first build and the repair command only
+        :param user: (obj) User object
+        :return: (int) Number of indexed ciphers
+        """
+        build_date = now()
+        team_access = self.get_user_team_access(user=user)
+        ciphers = self.resolve_multiple_by_user(user=user).values_list('id', 'team_id', 'view_password')
+        user_cipher_access = []
+        for cipher_id, team_id, view_password in ciphers:
+            user_cipher_access.append(UserCipherAccess(
+                user_id=user.user_id,
+                cipher_id=cipher_id,
+                can_edit=team_id is None or team_id in team_access["edited_team_ids"],
+                can_delete=team_id is None or team_id in team_access["deleted_team_ids"],
+                view_password=view_password
+            ))
+        with transaction.atomic():
+            UserCipherAccess.objects.filter(user_id=user.user_id).delete()
+            UserCipherAccess.objects.bulk_create(user_cipher_access, batch_size=1000, ignore_conflicts=True)
+            User.objects.filter(user_id=user.user_id).update(cipher_access_date=build_date)
+        return len(user_cipher_access)
+
+    def verify_user_cipher_access(self, user: User):
+        """
+        Compare the cipher access index of the user with the direct resolution
+        :param user: (obj) User object
+        :return: (tuple) The missing and the redundant rows of the index
+        """
+        team_access = self.get_user_team_access(user=user)
+        expected_access = set()
+        for cipher_id, team_id, view_password in self.resolve_multiple_by_user(user=user).values_list(
+                'id', 'team_id', 'view_password'):
+            expected_access.add((
+                cipher_id,
+                team_id is None or team_id in team_access["edited_team_ids"],
+                team_id is None or team_id in team_access["deleted_team_ids"],
+                view_password
+            ))
+        indexed_access = set(UserCipherAccess.objects.filter(user_id=user.user_id).values_list(
+            'cipher_id', 'can_edit', 'can_delete', 'view_password'
+        ))
+        return expected_access - indexed_access, indexed_access - expected_access
+
+    def resolve_multiple_by_user(self, user: User, only_personal=False, only_managed_team=False,
+                                 only_edited=False, only_deleted=False,
+                                 exclude_team_ids=None, filter_ids=None, exclude_types=None):
+        """
+        Resolve list ciphers of user directly from the team memberships
         :param user: (obj) User object
         :param only_personal: (bool) if True => Only get list personal ciphers
         :param only_managed_team: (bool) if True => Only get list ciphers of non-locked teams
@@ -89,84 +291,80 @@ class CipherRepository(ICipherRepository):
         if only_personal is True:
             return personal_ciphers.annotate(view_password=Value(True, output_field=BooleanField()))
 
-        confirmed_team_members = user.team_members.filter(status=PM_MEMBER_STATUS_CONFIRMED)
-        if only_managed_team:
-            confirmed_team_members = confirmed_team_members.filter(team__locked=False)
-        if exclude_team_ids:
-            confirmed_team_members = confirmed_team_members.exclude(team_id__in=exclude_team_ids)
-
-        confirmed_team_ids = confirmed_team_members.values_list('team_id', flat=True)
-        team_ciphers = Cipher.objects.filter(team_id__in=confirmed_team_ids)
-        if filter_ids:
-            team_ciphers = team_ciphers.filter(id__in=filter_ids)
-
-        team_ciphers = team_ciphers.filter(
-            # Owner, Admin ciphers
-            Q(
-                team__team_members__role_id__in=[MEMBER_ROLE_OWNER, MEMBER_ROLE_ADMIN],
-                team__team_members__user=user
-            ) |
-            # Group access all ciphers
-            Q(
-                team__groups__access_all=True,
-                team__groups__groups_members__member__user=user
-            ) |
-            # Team member
-            Q(
-                collections_ciphers__collection__collections_members__member__in=confirmed_team_members,
-                team__team_members__user=user
-            ) |
-            # Q(
-            #     collections_ciphers__collection__collections_groups__group__groups_members__member__in=confirmed_team_members,
-            #     team__team_members__user=user
-            # ) |
-            # Personal share
-            Q(
-                team__personal_share=True,
-                team__team_members__user=user
-            )
-        ).distinct().annotate(
-            view_password=Case(
-                When(
-                    Q(
-                        team__team_members__role_id__in=[MEMBER_ROLE_MEMBER],
-                        team__team_members__user=user,
-                        collections_ciphers__collection__collections_members__hide_passwords=True
-                    ), then=False
-                ),
-                When(
-                    Q(
-                        team__team_members__role_id__in=[MEMBER_ROLE_MEMBER],
-                        team__team_members__user=user,
-                        team__personal_share=True,
-                        team__team_members__hide_passwords=True
-                    ), then=False
-                ),
-                default=True,
-                output_field=BooleanField()
-            )
+        team_access = self.get_user_team_access(
+            user=user, only_managed_team=only_managed_team, exclude_team_ids=exclude_team_ids
         )
-        hide_password_cipher_ids = team_ciphers.filter(view_password=False).values_list('id', flat=True)
+        full_access_team_ids = team_access["full_access_team_ids"]
+        collection_team_ids = team_access["collection_team_ids"]
         if only_edited:
-            team_ciphers = team_ciphers.filter(
-                team__team_members__role_id__in=[MEMBER_ROLE_OWNER, MEMBER_ROLE_ADMIN, MEMBER_ROLE_MANAGER],
-                team__team_members__user=user
-            )
+            full_access_team_ids = full_access_team_ids & team_access["edited_team_ids"]
+            collection_team_ids = collection_team_ids & team_access["edited_team_ids"]
         if only_deleted:
-            team_ciphers = team_ciphers.filter(
-                team__team_members__role_id__in=[MEMBER_ROLE_OWNER],
-                team__team_members__user=user
+            full_access_team_ids = full_access_team_ids & team_access["deleted_team_ids"]
+            collection_team_ids = collection_team_ids & team_access["deleted_team_ids"]
+
+        # Resolve personal and team ciphers in a single query.
+        # The collection ciphers are matched by a semi-join, so the result does not need `distinct()`
+        ciphers_q = Q(user=user)
+        if full_access_team_ids:
+            ciphers_q |= Q(team_id__in=list(full_access_team_ids))
+        if collection_team_ids and team_access["collection_ids"]:
+            ciphers_q |= Q(
+                team_id__in=list(collection_team_ids),
+                id__in=CollectionCipher.objects.filter(
+                    collection_id__in=list(team_access["collection_ids"])
+                ).values('cipher_id')
             )
-        return Cipher.objects.filter(
-            id__in=list(personal_ciphers.values_list('id', flat=True)) + list(team_ciphers.values_list('id', flat=True))
-        ).exclude(type__in=exclude_types).annotate(
-            view_password=Case(
-                When(id__in=hide_password_cipher_ids, then=False),
-                default=True,
-                output_field=BooleanField()
+        ciphers = Cipher.objects.filter(ciphers_q)
+        if filter_ids:
+            ciphers = ciphers.filter(id__in=filter_ids)
+        if exclude_types:
+            ciphers = ciphers.exclude(type__in=exclude_types)
+
+        hide_password_whens = []
+        if team_access["hide_password_team_ids"]:
+            hide_password_whens.append(
+                When(team_id__in=list(team_access["hide_password_team_ids"]), then=False)
             )
+        if team_access["hide_password_collection_ids"]:
+            hide_password_whens.append(
+                When(id__in=CollectionCipher.objects.filter(
+                    collection_id__in=list(team_access["hide_password_collection_ids"])
+                ).values('cipher_id'), then=False)
+            )
+        if not hide_password_whens:
+            return ciphers.annotate(view_password=Value(True, output_field=BooleanField()))
+        return ciphers.annotate(
+            view_password=Case(*hide_password_whens, default=True, output_field=BooleanField())
         )
 
+    def get_sync_tombstones(self, user: User, since: float):
+        """
+        Get list tombstones of the objects which were hard-deleted and were visible to the user
+        :param user: (obj) User object
+        :param since: (float) Only get tombstones which were deleted from this time
+        :return:
+        """
+        confirmed_team_ids = user.team_members.filter(
+            status=PM_MEMBER_STATUS_CONFIRMED
+        ).values_list('team_id', flat=True)
+        return SyncTombstone.objects.filter(
+            Q(user_id=user.user_id) | Q(team_id__in=list(confirmed_team_ids))
+        ).filter(deleted_date__gte=since)
+
+    def is_sync_access_changed(self, user: User, since: float) -> bool:
+        """
+        Check the user lost or got the access to a team from the `since` revision date. The items of this team are not
+        listed by the tombstones nor by the revision dates, so the client must run the full sync
+        :param user: (obj) User object
+        :param since: (float) The revision date of the last sync
+        :return:
+        """
+        return SyncTombstone.objects.filter(
+            user_id=user.user_id, object_type__in=[SYNC_TOMBSTONE_ACCESS, SYNC_TOMBSTONE_ACCESS_GAIN],
+            deleted_date__gte=since
+        ).exists()
+
     def save_new_cipher(self, cipher_data):
         """
         Save new cipher
@@ -197,6 +395,7 @@ class CipherRepository(ICipherRepository):
             created_by_id=created_by_id,
         )
         cipher.save()
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_CIPHERS, created_by_id)
         # Create CipherFavorite
         if user_created_id and favorite:
             cipher.set_favorite(user_created_id, True)
@@ -206,6 +405,7 @@ class CipherRepository(ICipherRepository):
         # Create CipherCollections
         if team_id:
             cipher.collections_ciphers.model.create_multiple(cipher.id, *collection_ids)
+        UserCipherAccess.refresh_ciphers(cipher.id)
 
         # Update revision date of user (if this cipher is personal)
         # or all related cipher members (if this cipher belongs to a team)
@@ -225,6 +425,8 @@ class CipherRepository(ICipherRepository):
         # If team_id is not null => This cipher belongs to team
         if team_id:
             user_cipher_id = None
+        # The access index is only updated if the owner or the collections of the cipher change
+        is_access_changed = cipher.user_id != user_cipher_id or cipher.team_id != team_id
         # Create new cipher object
         cipher.revision_date = now()
         cipher.reprompt = cipher_data.get("reprompt", cipher.reprompt) or 0
@@ -249,8 +451,11 @@ class CipherRepository(ICipherRepository):
             added_collection_ids = diff_list(collection_ids, existed_collection_ids)
             cipher.collections_ciphers.filter(collection_id__in=removed_collection_ids).delete()
             cipher.collections_ciphers.model.create_multiple(cipher.id, *added_collection_ids)
+            is_access_changed = is_access_changed or bool(removed_collection_ids or added_collection_ids)
         else:
             cipher.collections_ciphers.all().delete()
+        if is_access_changed:
+            UserCipherAccess.refresh_ciphers(cipher.id)
 
         # Update revision date of user (if this cipher is personal)
         # or all related cipher members (if this cipher belongs to a team)
@@ -295,17 +500,18 @@ class CipherRepository(ICipherRepository):
             id__in=cipher_ids, deleted_date__isnull=True
         ).exclude(type__in=IMMUTABLE_CIPHER_TYPES)
         deleted_cipher_ids = list(ciphers.values_list('id', flat=True))
+        # Get the teams before updating, the updated ciphers do not match the filter anymore
+        team_ids = set(ciphers.exclude(team__isnull=True).values_list('team_id', flat=True))
         for cipher in ciphers:
             cipher.revision_date = current_time
             cipher.deleted_date = current_time
         Cipher.objects.bulk_update(ciphers, ['revision_date', 'deleted_date'], batch_size=100)
 
         # Bump revision date: teams and user
-        team_ids = ciphers.exclude(team__isnull=True).values_list('team_id', flat=True)
-        teams = Team.objects.filter(id__in=team_ids)
-        for team in teams:
-            bump_account_revision_date(team=team)
-        bump_account_revision_date(user=user_deleted)
+        with revision_bumper():
+            for team_id in team_ids:
+                bump_account_revision_date(team=team_id)
+            bump_account_revision_date(user=user_deleted)
         return deleted_cipher_ids
 
     def delete_permanent_multiple_cipher(self, cipher_ids: list, user_deleted: User):
@@ -318,15 +524,20 @@ class CipherRepository(ICipherRepository):
         ciphers = self.get_multiple_by_user(user=user_deleted, only_deleted=True).filter(
             id__in=cipher_ids
         ).exclude(type__in=IMMUTABLE_CIPHER_TYPES)
-        team_ids = ciphers.exclude(team__isnull=True).values_list('team_id', flat=True)
-        # Delete ciphers objects
-        deleted_cipher_ids = list(ciphers.values_list('id', flat=True))
+        # Delete ciphers objects and keep their tombstones for the delta sync
+        deleted_ciphers = list(ciphers.values('id', 'user_id', 'team_id', 'created_by_id'))
+        deleted_cipher_ids = [deleted_cipher.get("id") for deleted_cipher in deleted_ciphers]
+        team_ids = {deleted_cipher.get("team_id") for deleted_cipher in deleted_ciphers if deleted_cipher.get("team_id")}
         ciphers.delete()
+        SyncTombstone.create_multiple(SYNC_TOMBSTONE_CIPHER, *deleted_ciphers)
+        record_user_statistic_changes(
+            USER_STATISTIC_SOURCE_CIPHERS, *[deleted_cipher.get("created_by_id") for deleted_cipher in deleted_ciphers]
+        )
         # Bump revision date: teams and user
-        teams = Team.objects.filter(id__in=team_ids)
-        for team in teams:
-            bump_account_revision_date(team=team)
-        bump_account_revision_date(user=user_deleted)
+        with revision_bumper():
+            for team_id in team_ids:
+                bump_account_revision_date(team=team_id)
+            bump_account_revision_date(user=user_deleted)
         return deleted_cipher_ids
 
     def delete_permanent_multiple_cipher_by_teams(self, team_ids):
@@ -335,10 +546,16 @@ class CipherRepository(ICipherRepository):
         :param team_ids:
         :return:
         """
-        teams = Team.objects.filter(id__in=team_ids)
-        Cipher.objects.filter(team_id__in=team_ids).delete()
-        for team in teams:
-            bump_account_revision_date(team=team)
+        team_ciphers = Cipher.objects.filter(team_id__in=team_ids)
+        deleted_ciphers = list(team_ciphers.values('id', 'user_id', 'team_id', 'created_by_id'))
+        team_ciphers.delete()
+        SyncTombstone.create_multiple(SYNC_TOMBSTONE_CIPHER, *deleted_ciphers)
+        record_user_statistic_changes(
+            USER_STATISTIC_SOURCE_CIPHERS, *[deleted_cipher.get("created_by_id") for deleted_cipher in deleted_ciphers]
+        )
+        with revision_bumper():
+            for team_id in set(team_ids):
+                bump_account_revision_date(team=team_id)
 
     def restore_multiple_cipher(self, cipher_ids: list, user_restored: User):
         """
@@ -351,26 +568,28 @@ class CipherRepository(ICipherRepository):
         # Filter list ciphers from trash
         ciphers = self.get_multiple_by_user(user=user_restored, only_deleted=True).filter(
             id__in=cipher_ids, deleted_date__isnull=False
-        )
+        ).prefetch_related('cipher_user_states')
         # Restore all cipher by setting deleted_date as null
         restored_cipher_ids = list(ciphers.values_list('id', flat=True))
-        user_folder_ids = list(user_restored.folders.values_list('id', flat=True))
+        team_ids = set(ciphers.exclude(team__isnull=True).values_list('team_id', flat=True))
+        # The folders of the states were set to null by the folder deletion, but the legacy folders were not
+        user_folder_ids = set(user_restored.folders.values_list('id', flat=True))
+        stale_folder_cipher_ids = []
         for cipher in ciphers:
             cipher.revision_date = current_time
             cipher.deleted_date = None
-            folders = cipher.get_folders()
-            cipher_user_folder_id = folders.get(user_restored.user_id)
+            cipher_user_folder_id = cipher.get_folders().get(user_restored.user_id)
             if cipher_user_folder_id and cipher_user_folder_id not in user_folder_ids:
-                folders[user_restored.user_id] = None
-                cipher.folders = folders
+                stale_folder_cipher_ids.append(cipher.id)
 
-        Cipher.objects.bulk_update(ciphers, ['revision_date', 'deleted_date', 'folders'], batch_size=100)
+        Cipher.objects.bulk_update(ciphers, ['revision_date', 'deleted_date'], batch_size=100)
+        CipherUserState.bulk_set_folder(user_id=user_restored.user_id, cipher_ids=stale_folder_cipher_ids)
 
         # Bump revision date: teams and user
-        teams = ciphers.exclude(team__isnull=True).values_list('team', flat=True)
-        for team in teams:
-            bump_account_revision_date(team=team)
-        bump_account_revision_date(user=user_restored)
+        with revision_bumper():
+            for team_id in team_ids:
+                bump_account_revision_date(team=team_id)
+            bump_account_revision_date(user=user_restored)
 
         return restored_cipher_ids
 
@@ -379,9 +598,10 @@ class CipherRepository(ICipherRepository):
         ciphers = self.get_multiple_by_user(user=user_moved).filter(
             id__in=cipher_ids, deleted_date__isnull=True
         ).exclude(type__in=IMMUTABLE_CIPHER_TYPES)
-        # Move all cipher to new folder
-        for cipher in ciphers:
-            cipher.set_folder(user_id=user_moved.user_id, folder_id=folder_id)
+        # Move all cipher to new folder by bulk statements instead of saving each cipher
+        moved_cipher_ids = list(ciphers.values_list('id', flat=True))
+        CipherUserState.bulk_set_folder(user_id=user_moved.user_id, cipher_ids=moved_cipher_ids, folder_id=folder_id)
+        Cipher.objects.filter(id__in=moved_cipher_ids).update(revision_date=now())
         # Bump revision date of user
         bump_account_revision_date(user=user_moved)
 
@@ -403,7 +623,7 @@ class CipherRepository(ICipherRepository):
             except (KeyError, ValueError):
                 continue
 
-            cipher["folders"] = "{%d: '%s'}" % (user.user_id, folder.get("id"))
+            cipher["import_folder_id"] = folder.get("id")
 
         # Create multiple folders
         import_folders = []
@@ -419,6 +639,7 @@ class CipherRepository(ICipherRepository):
 
         # Create multiple ciphers
         import_ciphers = []
+        import_cipher_states = []
         import_ciphers_count = {vault_type: 0 for vault_type in LIST_CIPHER_TYPE}
 
         for cipher_data in ciphers:
@@ -438,22 +659,28 @@ class CipherRepository(ICipherRepository):
             # if cipher_data.get("notes"):
             #     cipher_data["data"]["notes"] = cipher_data.get("notes")
             cipher_data = json.loads(json.dumps(cipher_data))
-            import_ciphers.append(
-                Cipher(
-                    creation_date=cipher_data.get("creation_date", now()),
-                    revision_date=cipher_data.get("revision_date", now()),
-                    deleted_date=cipher_data.get("deleted_date"),
-                    reprompt=cipher_data.get("reprompt", 0) or 0,
-                    score=cipher_data.get("score", 0),
-                    type=cipher_data.get("type"),
-                    data=cipher_data.get("data"),
-                    user_id=user.user_id,
-                    created_by_id=user.user_id,
-                    folders=cipher_data.get("folders", ""),
-                    team_id=cipher_data.get("organizationId")
-                )
+            import_cipher = Cipher(
+                creation_date=cipher_data.get("creation_date", now()),
+                revision_date=cipher_data.get("revision_date", now()),
+                deleted_date=cipher_data.get("deleted_date"),
+                reprompt=cipher_data.get("reprompt", 0) or 0,
+                score=cipher_data.get("score", 0),
+                type=cipher_data.get("type"),
+                data=cipher_data.get("data"),
+                user_id=user.user_id,
+                created_by_id=user.user_id,
+                team_id=cipher_data.get("organizationId")
             )
+            import_ciphers.append(import_cipher)
+            if cipher_data.get("import_folder_id"):
+                import_cipher_states.append({
+                    "cipher_id": import_cipher.id, "user_id": user.user_id,
+                    "folder_id": cipher_data.get("import_folder_id")
+                })
         Cipher.objects.bulk_create(import_ciphers, batch_size=100, ignore_conflicts=True)
+        CipherUserState.create_multiple(*import_cipher_states)
+        UserCipherAccess.refresh_ciphers(*[import_cipher.id for import_cipher in import_ciphers])
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_CIPHERS, user.user_id)
         bump_account_revision_date(user=user)
 
     def import_multiple_ciphers(self, user: User, ciphers, allow_cipher_type=None):
@@ -465,6 +692,7 @@ class CipherRepository(ICipherRepository):
 
         # Create multiple ciphers
         import_ciphers = []
+        import_cipher_states = []
         import_ciphers_count = {vault_type: 0 for vault_type in LIST_CIPHER_TYPE}
 
         for cipher_data in ciphers:
@@ -483,7 +711,6 @@ class CipherRepository(ICipherRepository):
             folder_id = None
             if cipher_data.get("folderId") and cipher_data.get("folderId") in existed_folder_ids:
                 folder_id = cipher_data.get("folderId")
-            folders = "{%d: '%s'}" % (user.user_id, folder_id) if folder_id else ""
 
             # Get cipher data
             cipher_data["data"] = get_cipher_detail_data(cipher=cipher_data)
@@ -491,22 +718,27 @@ class CipherRepository(ICipherRepository):
             # if cipher_data.get("notes"):
             #     cipher_data["data"]["notes"] = cipher_data.get("notes")
             cipher_data = json.loads(json.dumps(cipher_data))
-            import_ciphers.append(
-                Cipher(
-                    creation_date=cipher_data.get("creation_date", now()),
-                    revision_date=cipher_data.get("revision_date", now()),
-                    deleted_date=cipher_data.get("deleted_date"),
-                    reprompt=cipher_data.get("reprompt", 0) or 0,
-                    score=cipher_data.get("score", 0),
-                    type=cipher_data.get("type"),
-                    data=cipher_data.get("data"),
-                    user_id=user.user_id,
-                    created_by_id=user.user_id,
-                    folders=folders,
-                    team_id=cipher_data.get("organizationId")
-                )
+            import_cipher = Cipher(
+                creation_date=cipher_data.get("creation_date", now()),
+                revision_date=cipher_data.get("revision_date", now()),
+                deleted_date=cipher_data.get("deleted_date"),
+                reprompt=cipher_data.get("reprompt", 0) or 0,
+                score=cipher_data.get("score", 0),
+                type=cipher_data.get("type"),
+                data=cipher_data.get("data"),
+                user_id=user.user_id,
+                created_by_id=user.user_id,
+                team_id=cipher_data.get("organizationId")
             )
+            import_ciphers.append(import_cipher)
+            if folder_id:
+                import_cipher_states.append({
+                    "cipher_id": import_cipher.id, "user_id": user.user_id, "folder_id": folder_id
+                })
         Cipher.objects.bulk_create(import_ciphers, batch_size=100, ignore_conflicts=True)
+        CipherUserState.create_multiple(*import_cipher_states)
+        UserCipherAccess.refresh_ciphers(*[import_cipher.id for import_cipher in import_ciphers])
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_CIPHERS, user.user_id)
         bump_account_revision_date(user=user)
 
     def sync_personal_cipher_offline(self, user: User, ciphers, folders, folder_relationships):
@@ -528,7 +760,7 @@ class CipherRepository(ICipherRepository):
             except (KeyError, ValueError):
                 continue
 
-            cipher["folders"] = "{%d: '%s'}" % (user.user_id, folder.get("id"))
+            cipher["import_folder_id"] = folder.get("id")
 
         # Create multiple folders
         sync_folders = []
@@ -540,6 +772,7 @@ class CipherRepository(ICipherRepository):
 
         # Create multiple ciphers
         sync_create_ciphers = []
+        sync_cipher_states = []
         sync_create_ciphers_data = [
             cipher_data for cipher_data in ciphers if not cipher_data.get("id") and cipher_data.get("type") != CIPHER_TYPE_MASTER_PASSWORD
         ]
@@ -554,25 +787,31 @@ class CipherRepository(ICipherRepository):
             #     cipher_data["data"]["notes"] = cipher_data.get("notes")
             cipher_data = json.loads(json.dumps(cipher_data))
 
-            sync_create_ciphers.append(
-                Cipher(
-                    creation_date=cipher_data.get("creationDate", now()),
-                    revision_date=cipher_data.get("revisionDate", now()),
-                    deleted_date=cipher_data.get("deletedDate"),
-                    reprompt=cipher_data.get("reprompt", 0) or 0,
-                    score=cipher_data.get("score", 0),
-                    type=cipher_data.get("type"),
-                    data=cipher_data.get("data"),
-                    user_id=user.user_id,
-                    folders=cipher_data.get("folders", ""),
-                    team_id=cipher_data.get("organizationId")
-                )
+            sync_create_cipher = Cipher(
+                creation_date=cipher_data.get("creationDate", now()),
+                revision_date=cipher_data.get("revisionDate", now()),
+                deleted_date=cipher_data.get("deletedDate"),
+                reprompt=cipher_data.get("reprompt", 0) or 0,
+                score=cipher_data.get("score", 0),
+                type=cipher_data.get("type"),
+                data=cipher_data.get("data"),
+                user_id=user.user_id,
+                team_id=cipher_data.get("organizationId")
             )
+            sync_create_ciphers.append(sync_create_cipher)
+            if cipher_data.get("import_folder_id"):
+                sync_cipher_states.append({
+                    "cipher_id": sync_create_cipher.id, "user_id": user.user_id,
+                    "folder_id": cipher_data.get("import_folder_id")
+                })
 
         Cipher.objects.bulk_create(sync_create_ciphers, batch_size=100, ignore_conflicts=True)
+        CipherUserState.create_multiple(*sync_cipher_states)
+        UserCipherAccess.refresh_ciphers(*[sync_create_cipher.id for sync_create_cipher in sync_create_ciphers])
 
         # Sync update existed ciphers
         sync_update_ciphers = []
+        sync_update_folder_cipher_ids = {}
         sync_update_ciphers_data = [
             cipher_data for cipher_data in ciphers if cipher_data.get("id") and cipher_data.get("type") != CIPHER_TYPE_MASTER_PASSWORD
         ]
@@ -610,16 +849,19 @@ class CipherRepository(ICipherRepository):
             cipher_obj.type = cipher_data.get("type")
             cipher_obj.data = cipher_data.get("data")
             cipher_obj.user_id = user.user_id
-            cipher_obj.folders = cipher_data.get("folders", "")
             cipher_obj.team_id = cipher_data.get("organizationId")
             sync_update_ciphers.append(cipher_obj)
+            sync_update_folder_cipher_ids.setdefault(cipher_data.get("import_folder_id"), []).append(cipher_obj.id)
 
         Cipher.objects.bulk_update(
             sync_update_ciphers,
             ['creation_date', 'revision_date', 'deleted_date', 'reprompt', 'score', 'type',
-             'data', 'user_id', 'folders', 'team_id'],
+             'data', 'user_id', 'team_id'],
             batch_size=100
         )
+        # Move the updated ciphers to their folders: one bulk upsert per folder
+        for folder_id, folder_cipher_ids in sync_update_folder_cipher_ids.items():
+            CipherUserState.bulk_set_folder(user_id=user.user_id, cipher_ids=folder_cipher_ids, folder_id=folder_id)
         bump_account_revision_date(user=user)
 
     def import_multiple_cipher_team(self, team: Team, ciphers, collections, collection_relationships,
@@ -700,7 +942,6 @@ class CipherRepository(ICipherRepository):
                     type=cipher_data.get("type"),
                     data=cipher_data.get("data"),
                     team_id=team.id,
-                    folders=cipher_data.get("folders", ""),
                 )
             )
             import_ciphers_id.append(cipher_data.get("id"))
@@ -718,5 +959,6 @@ class CipherRepository(ICipherRepository):
                 )
             )
         CollectionCipher.objects.bulk_create(import_collection_ciphers, batch_size=100, ignore_conflicts=True)
+        UserCipherAccess.refresh_ciphers(*import_ciphers_id)
         # Bump account revision date
         bump_account_revision_date(team=team)
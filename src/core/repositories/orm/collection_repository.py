@@ -4,11 +4,14 @@ from core.repositories import ICollectionRepository
 from core.utils.account_revision_date import bump_account_revision_date
 
 from shared.utils.app import now
+from shared.constants.ciphers import SYNC_TOMBSTONE_COLLECTION
 from shared.constants.members import *
 from cystack_models.models.users.users import User
 from cystack_models.models.teams.teams import Team
 from cystack_models.models.teams.collections import Collection
 from cystack_models.models.teams.collections_members import CollectionMember
+from cystack_models.models.ciphers.sync_tombstones import SyncTombstone
+from cystack_models.models.ciphers.user_cipher_access import UserCipherAccess
 
 
 class CollectionRepository(ICollectionRepository):
@@ -82,9 +85,14 @@ class CollectionRepository(ICollectionRepository):
             "read_only": True if member.get("role") == MEMBER_ROLE_MEMBER else False,
         } for member in users]
         collection.collections_members.model.create_multiple_by_collection(collection, *members_data)
+        UserCipherAccess.refresh_team(collection.team_id)
         return collection
 
     def destroy_collection(self, collection: Collection):
         team = collection.team
+        collection_id = collection.id
+        collection_cipher_ids = list(collection.collections_ciphers.values_list('cipher_id', flat=True))
         collection.delete()
+        UserCipherAccess.refresh_ciphers(*collection_cipher_ids)
+        SyncTombstone.create_multiple(SYNC_TOMBSTONE_COLLECTION, {"id": collection_id, "team_id": team.id})
         bump_account_revision_date(team=team)
@@ -1,18 +1,31 @@
+import csv
 import io
+import uuid
 
 import django_rq
-import xlsxwriter
 
-from django.db.models import QuerySet
+from django.db.models import Q
+from rq import Retry, get_current_job
 
 from core.repositories import IEventRepository
 from core.utils.data_helpers import convert_readable_date
+from cystack_models.models.enterprises.groups.groups import EnterpriseGroup
+from cystack_models.models.enterprises.members.enterprise_members import EnterpriseMember
 from cystack_models.models.events.events import Event
 from cystack_models.models.users.users import User
-from shared.constants.event import LOG_TYPES
+from shared.background.event_buffer import event_buffer
+from shared.caching.activity_export_cache import *
+from shared.constants.enterprise_members import *
+from shared.constants.event import *
 from shared.log.cylog import CyLog
 from shared.services.s3.s3_service import s3_service
 from shared.utils.app import now
+from shared.utils.streaming import ResumableGzip, iter_batches_by_keyset
+
+
+ACTIVITY_EXPORT_BATCH_SIZE = 1000
+ACTIVITY_EXPORT_PART_SIZE = 8 * 1024 * 1024         # S3 requires at least 5MB for the parts except the last one
+ACTIVITY_EXPORT_MAX_RETRIES = 3
 
 
 class EventRepository(IEventRepository):
@@ -20,7 +33,10 @@ class EventRepository(IEventRepository):
         return Event.objects.filter(team_id=team_id).order_by('-creation_date')
 
     def save_new_event(self, **data) -> Event:
-        return Event.create(**data)
+        # The event is inserted by the next flush of the event buffer
+        new_event = Event.build(**data)
+        event_buffer.add(new_event)
+        return new_event
 
     def save_new_event_by_multiple_teams(self, team_ids: list, **data):
         return Event.create_multiple_by_team_ids(team_ids, **data)
@@ -28,10 +44,13 @@ class EventRepository(IEventRepository):
     def save_new_event_by_ciphers(self, ciphers, **data):
         return Event.create_multiple_by_ciphers(ciphers, **data)
 
-    def normalize_enterprise_activity(self, activity_logs: QuerySet[Event], use_html: bool = True):
-        user_ids = activity_logs.exclude(user_id__isnull=True).values_list('user_id', flat=True)
-        acting_user_ids = activity_logs.exclude(acting_user_id__isnull=True).values_list('acting_user_id', flat=True)
-        query_user_ids = list(set(list(user_ids) + list(acting_user_ids)))
+    def normalize_enterprise_activity(self, activity_logs, use_html: bool = True):
+        # The logs are loaded once, the users are collected from the loaded rows
+        activity_logs = list(activity_logs)
+        query_user_ids = list(
+            {activity_log.user_id for activity_log in activity_logs if activity_log.user_id is not None} |
+            {activity_log.acting_user_id for activity_log in activity_logs if activity_log.acting_user_id is not None}
+        )
         users_data = User.get_infor_by_user_ids(user_ids=query_user_ids)
         users_data_dict = dict()
         for user_data in users_data:
@@ -62,45 +81,154 @@ class EventRepository(IEventRepository):
             logs.append(log)
         return logs
 
-    def export_enterprise_activity(self, enterprise_member, activity_logs: QuerySet[Event], cc_emails=None, **kwargs):
-        django_rq.enqueue(
-            self.export_enterprise_activity_job, enterprise_member, activity_logs, cc_emails,
-            kwargs.get("from"), kwargs.get("to")
+    def get_multiple_by_enterprise_activity_filters(self, enterprise_id: str, from_param: int, to_param: int,
+                                                    filters: dict = None):
+        """
+        Get the activity logs of the enterprise
+        :param enterprise_id: (str) The enterprise id
+        :param from_param: (int) The start timestamp
+        :param to_param: (int) The end timestamp
+        :param filters: (dict) The filter params: admin_only, member_only, member_ids, acting_member_ids, group, action
+        :return: (QuerySet) The events, ordered by (creation_date, id) descending
+        """
+        filters = filters or {}
+        enterprise_members = EnterpriseMember.objects.filter(enterprise_id=enterprise_id)
+        # The filters are on the event columns only, so the rows are unique without distinct()
+        events = Event.objects.filter(team_id=enterprise_id).order_by('-creation_date', '-id').filter(
+            creation_date__lte=to_param,
+            creation_date__gte=from_param
         )
+        if filters.get("admin_only") == "1":
+            admin_user_ids = list(enterprise_members.filter(
+                role_id__in=[E_MEMBER_ROLE_PRIMARY_ADMIN, E_MEMBER_ROLE_ADMIN]
+            ).values_list('user_id', flat=True))
+            events = events.filter(Q(acting_user_id__in=admin_user_ids) | Q(user_id__in=admin_user_ids))
+        if filters.get("member_only") == "1":
+            member_user_ids = list(enterprise_members.filter(
+                role_id__in=[E_MEMBER_ROLE_MEMBER]
+            ).values_list('user_id', flat=True))
+            events = events.filter(Q(acting_user_id__in=member_user_ids) | Q(user_id__in=member_user_ids))
+        if filters.get("member_ids"):
+            member_user_ids = list(enterprise_members.filter(
+                id__in=filters.get("member_ids").split(",")
+            ).values_list('user_id', flat=True))
+            events = events.filter(Q(acting_user_id__in=member_user_ids) | Q(user_id__in=member_user_ids))
+        if filters.get("acting_member_ids"):
+            member_user_ids = list(enterprise_members.filter(
+                id__in=filters.get("acting_member_ids").split(",")
+            ).values_list('user_id', flat=True))
+            events = events.filter(acting_user_id__in=member_user_ids)
+        if filters.get("group"):
+            member_user_ids = list(EnterpriseGroup.objects.filter(
+                enterprise_id=enterprise_id, id=filters.get("group")
+            ).values_list('groups_members__member__user_id', flat=True))
+            events = events.filter(Q(acting_user_id__in=member_user_ids) | Q(user_id__in=member_user_ids))
+        action_param = filters.get("action")
+        if action_param:
+            if action_param == "member_changes":
+                events = events.filter(type__in=[
+                    EVENT_E_MEMBER_INVITED, EVENT_E_MEMBER_CONFIRMED, EVENT_E_MEMBER_REMOVED,
+                    EVENT_E_MEMBER_UPDATED_GROUP, EVENT_E_MEMBER_ENABLED, EVENT_E_MEMBER_DISABLED
+                ])
+            elif action_param == "role_changes":
+                events = events.filter(type__in=[EVENT_E_MEMBER_UPDATED_ROLE])
+            elif action_param == "policy_violations":
+                events = events.filter(type__in=[EVENT_USER_BLOCK_LOGIN])
+            elif action_param == "user_login":
+                events = events.filter(type__in=[EVENT_USER_LOGIN, EVENT_USER_LOGIN_FAILED])
+            elif action_param == "member_billing_changes":
+                events = events.filter(type__in=[
+                    EVENT_E_MEMBER_CONFIRMED, EVENT_E_MEMBER_REMOVED, EVENT_E_MEMBER_ENABLED, EVENT_E_MEMBER_DISABLED
+                ])
+            elif action_param == "share":
+                events = events.filter(type__in=[EVENT_ITEM_SHARE_CREATED, EVENT_ITEM_QUICK_SHARE_CREATED])
+        return events
 
-    def export_enterprise_activity_job(self, enterprise_member, activity_logs, cc_emails=None,
-                                       from_param=None, to_param=None):
-        current_time = now()
-        filename = "activity_logs_{}".format(convert_readable_date(current_time, "%Y%m%d"))
-        logs = self.normalize_enterprise_activity(activity_logs=activity_logs, use_html=False)
-
-        # Write to xlsx file
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-        worksheet = workbook.add_worksheet()
-        title = ["Action", "Actor", "Time", "IP Address"]
-        worksheet.write_row(0, 0, title)
-        row_index = 2
-        for log in logs:
-            row = [
-                log.get("description", {}).get("en"),
-                log.get("acting_user", {}).get("email") if log.get("acting_user") else "",
-                convert_readable_date(log.get("creation_date")),
-                log.get("ip_address")
-            ]
-            worksheet.write_row(row_index, 0, row)
-            row_index += 1
-        workbook.close()
-        output.seek(0)
+    def export_enterprise_activity(self, enterprise_member, from_param: int, to_param: int, filters: dict = None,
+                                   cc_emails=None, **kwargs):
+        """
+        Start the export job. The job receives the filter params only and builds the queryset itself, so no event is
+        loaded by the web process. The job streams the events, it can be retried and resumed from its last uploaded part
+        :return: (str) The export id, to follow the progress of the export
+        """
+        export_id = uuid.uuid4().hex
+        set_activity_export_state(export_id, {
+            "enterprise_id": enterprise_member.enterprise_id,
+            "status": ACTIVITY_EXPORT_STATUS_PENDING,
+            "rows": 0,
+            "total": None
+        })
+        activity_filters = {"from": from_param, "to": to_param, "filters": filters or {}}
+        django_rq.enqueue(
+            self.export_enterprise_activity_job, enterprise_member, activity_filters, cc_emails,
+            kwargs.get("from"), kwargs.get("to"), export_id,
+            retry=Retry(
+                max=ACTIVITY_EXPORT_MAX_RETRIES,
+                interval=[30 * 2 ** i for i in range(ACTIVITY_EXPORT_MAX_RETRIES)]
+            )
+        )
+        return export_id
 
-        # Upload to S3
-        s3_path = f"support/tmp/activity/{enterprise_member.enterprise_id}/{filename}.xlsx"
-        s3_service.upload_bytes_object(key=s3_path, io_bytes=output)
+    def export_enterprise_activity_job(self, enterprise_member, activity_filters, cc_emails=None,
+                                       from_param=None, to_param=None, export_id=None):
+        """
+        Write the activity logs as a gzip CSV which is uploaded to S3 by a multipart upload.
+        The events are read by keyset batches and the users are resolved batch by batch, so the memory is bounded by
+        one batch and one part. The state is checkpointed only with an uploaded part, a retried job resumes from it.
+        When the last retry fails, the multipart upload is aborted
+        :param activity_filters: (dict) from, to and the filters of `get_multiple_by_enterprise_activity_filters`
+        """
+        activity_logs = self.get_multiple_by_enterprise_activity_filters(
+            enterprise_id=enterprise_member.enterprise_id,
+            from_param=activity_filters.get("from"),
+            to_param=activity_filters.get("to"),
+            filters=activity_filters.get("filters")
+        )
+        export_id = export_id or uuid.uuid4().hex
+        state = get_activity_export_state(export_id) or {}
+        if state.get("status") == ACTIVITY_EXPORT_STATUS_DONE:
+            return
+        if not state.get("upload_id"):
+            filename = "activity_logs_{}".format(convert_readable_date(now(), "%Y%m%d"))
+            s3_path = f"support/tmp/activity/{enterprise_member.enterprise_id}/{export_id}/{filename}.csv"
+            state.update({
+                "enterprise_id": enterprise_member.enterprise_id,
+                "filename": filename,
+                "s3_path": s3_path,
+                "upload_id": s3_service.create_multipart_upload(
+                    key=s3_path, ContentType="text/csv; charset=utf-8", ContentEncoding="gzip",
+                    ContentDisposition=f'attachment; filename="{filename}.csv"'
+                ),
+                "parts": [],
+                "position": None,
+                "rows": 0,
+                "total": activity_logs.count(),
+                "gzip": None,
+                "finished": False,
+            })
+        state["status"] = ACTIVITY_EXPORT_STATUS_RUNNING
+        set_activity_export_state(export_id, state)
 
-        # Close IO Stream
-        output.close()
+        try:
+            # If the last part is uploaded but the upload was not completed, the retry only completes it
+            if not state.get("finished"):
+                self.__write_activity_export(activity_logs=activity_logs, export_id=export_id, state=state)
+            s3_service.complete_multipart_upload(
+                key=state["s3_path"], upload_id=state["upload_id"], parts=state["parts"]
+            )
+        except Exception:
+            # The state holds the checkpoint of the last uploaded part only, so just the status is changed here
+            state["status"] = ACTIVITY_EXPORT_STATUS_FAILED
+            current_job = get_current_job()
+            if current_job is None or not current_job.retries_left:
+                s3_service.abort_multipart_upload(key=state["s3_path"], upload_id=state["upload_id"])
+                state["upload_id"] = None
+            set_activity_export_state(export_id, state)
+            raise
+        state["status"] = ACTIVITY_EXPORT_STATUS_DONE
+        set_activity_export_state(export_id, state)
 
-        download_url = s3_service.gen_one_time_url(file_path=s3_path, **{"expired": 900})
+        download_url = s3_service.gen_one_time_url(file_path=state["s3_path"], **{"expired": 900})
         CyLog.debug(**{"message": f"Exported to {download_url}"})
 
         # Sending mail
@@ -110,13 +238,72 @@ class EventRepository(IEventRepository):
             "cc": cc_emails,
             "attachments": [{
                 "url": download_url,
-                "name": f"{filename}.xlsx"
+                "name": f"{state['filename']}.csv"
             }],
             "org_name": enterprise_member.enterprise.name,
             "start_date": from_param,
             "end_date": to_param
         })
 
+    def __write_activity_export(self, activity_logs, export_id, state):
+        compressor = ResumableGzip(state=state["gzip"])
+        position, rows = state["position"], state["rows"]
+        part_buffer = []
+        part_size = 0
+        if not compressor.started:
+            # The BOM lets the spreadsheet apps read the CSV as utf-8
+            part_buffer.append(compressor.compress(self.__to_csv_bytes(
+                [["Action", "Actor", "Time", "IP Address"]], prefix="\ufeff"
+            )))
+        for events in iter_batches_by_keyset(
+            activity_logs, date_field="creation_date", batch_size=ACTIVITY_EXPORT_BATCH_SIZE, position=position
+        ):
+            logs = self.normalize_enterprise_activity(activity_logs=events, use_html=False)
+            csv_rows = [[
+                log.get("description", {}).get("en"),
+                log.get("acting_user", {}).get("email") if log.get("acting_user") else "",
+                convert_readable_date(log.get("creation_date")),
+                log.get("ip_address")
+            ] for log in logs]
+            compressed_data = compressor.compress(self.__to_csv_bytes(csv_rows))
+            part_buffer.append(compressed_data)
+            part_size += len(compressed_data)
+            position = [events[-1].creation_date, events[-1].id]
+            rows += len(events)
+            if part_size >= ACTIVITY_EXPORT_PART_SIZE:
+                part_buffer.append(compressor.flush_part())
+                self.__upload_activity_export_part(export_id, state, b"".join(part_buffer), checkpoint={
+                    "position": position, "rows": rows, "gzip": compressor.get_state()
+                })
+                part_buffer = []
+                part_size = 0
+        part_buffer.append(compressor.finish())
+        self.__upload_activity_export_part(export_id, state, b"".join(part_buffer), checkpoint={
+            "position": position, "rows": rows, "gzip": compressor.get_state(), "finished": True
+        })
+
+    @staticmethod
+    def __upload_activity_export_part(export_id, state, body, checkpoint):
+        """
+        Upload the next part, then checkpoint the position of the stream at the end of this part.
+        The state is not changed if the upload fails, so a retry resumes from the previous part
+        :param checkpoint: (dict) position, rows, gzip, finished
+        """
+        part_number = len(state["parts"]) + 1
+        part = s3_service.upload_part(
+            key=state["s3_path"], upload_id=state["upload_id"], part_number=part_number, body=body
+        )
+        state["parts"].append(part)
+        state.update(checkpoint)
+        set_activity_export_state(export_id, state)
+
+    @staticmethod
+    def __to_csv_bytes(rows, prefix=""):
+        output = io.StringIO()
+        output.write(prefix)
+        csv.writer(output).writerows(rows)
+        return output.getvalue().encode()
+
     @staticmethod
     def __get_activity_log_data(activity_log: Event):
         return {
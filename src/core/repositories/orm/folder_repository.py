@@ -5,6 +5,8 @@ from core.utils.account_revision_date import bump_account_revision_date
 
 from cystack_models.models.users.users import User
 from cystack_models.models.ciphers.folders import Folder
+from cystack_models.models.ciphers.sync_tombstones import SyncTombstone
+from shared.constants.ciphers import SYNC_TOMBSTONE_FOLDER
 from shared.utils.app import now
 
 
@@ -59,3 +61,9 @@ class FolderRepository(IFolderRepository):
         bump_account_revision_date(user=user)
 
         return folder_ids
+
+    def destroy_folder(self, folder: Folder):
+        folder_id = folder.id
+        user_id = folder.user_id
+        folder.delete()
+        SyncTombstone.create_multiple(SYNC_TOMBSTONE_FOLDER, {"id": folder_id, "user_id": user_id})
@@ -4,11 +4,16 @@ from django.db.models import When, Q, Value, Case, IntegerField, Count, OuterRef
 
 from core.repositories import ISharingRepository
 from core.utils.account_revision_date import bump_account_revision_date
+from shared.caching.user_statistic_changes import record_user_statistic_changes, USER_STATISTIC_SOURCE_CIPHERS
+from shared.constants.ciphers import SYNC_TOMBSTONE_FOLDER, SYNC_TOMBSTONE_CIPHER, SYNC_TOMBSTONE_COLLECTION
 from shared.constants.members import *
 from shared.utils.app import now
 from shared.utils.id_generator import sharing_id_generator
 from cystack_models.models.ciphers.ciphers import Cipher
+from cystack_models.models.ciphers.cipher_user_states import CipherUserState
 from cystack_models.models.ciphers.folders import Folder
+from cystack_models.models.ciphers.sync_tombstones import SyncTombstone
+from cystack_models.models.ciphers.user_cipher_access import UserCipherAccess
 from cystack_models.models.teams.teams import Team
 from cystack_models.models.users.users import User
 from cystack_models.models.members.team_members import TeamMember
@@ -94,6 +99,7 @@ class SharingRepository(ISharingRepository):
         group.save()
         group_user_ids = list(group.groups_members.values_list('member__user_id', flat=True))
         group.team.team_members.filter(is_added_by_group=True, user_id__in=group_user_ids).update(role_id=role_id)
+        UserCipherAccess.refresh_team_members(group.team_id, *group_user_ids)
         # Bump revision date
         bump_account_revision_date(team=group.team, **{"group_ids": [group.enterprise_group_id]})
         return group
@@ -126,8 +132,8 @@ class SharingRepository(ISharingRepository):
                 self._stop_share_cipher(cipher=c, user_id=user_owner.user_id, cipher_data=personal_cipher_data)
 
             # Update folder
-            Cipher.objects.filter(id__in=shared_folder_cipher_ids).update(
-                folders=str({user_owner.user_id: str(personal_folder.id)})
+            CipherUserState.bulk_set_folder(
+                user_id=user_owner.user_id, cipher_ids=shared_folder_cipher_ids, folder_id=str(personal_folder.id)
             )
 
         # If the team shared a cipher
@@ -135,10 +141,7 @@ class SharingRepository(ISharingRepository):
             self._stop_share_cipher(cipher=cipher, user_id=user_owner.user_id, cipher_data=cipher_data)
 
         # Delete this team
-        team.ciphers.all().delete()
-        team.collections.all().delete()
-        team.groups.all().delete()
-        team.delete()
+        self._delete_team(team=team)
 
         # Update revision date of user
         bump_account_revision_date(user=user_owner)
@@ -178,6 +181,7 @@ class SharingRepository(ISharingRepository):
             deleted_members = team_members.filter(group_count=1)
             deleted_members_user_ids = list(deleted_members.values_list('user_id', flat=True))
             deleted_members.delete()
+            SyncTombstone.create_access_revocations(team.id, *deleted_members_user_ids)
             # Filter list members have other groups => Set role_id by other groups
             first_group_subquery = GroupMember.objects.exclude(group_id=group.id).filter(
                 member_id=OuterRef('id')
@@ -191,6 +195,7 @@ class SharingRepository(ISharingRepository):
                     m.save()
             # Delete this group
             group.delete()
+            UserCipherAccess.refresh_team_members(team.id, *group_members_user_ids)
         if member:
             group_member = member.groups_members.all().order_by('group__creation_date').first()
             if not group_member:
@@ -237,10 +242,7 @@ class SharingRepository(ISharingRepository):
         Cipher.objects.filter(id__in=shared_folder_cipher_ids).update(revision_date=now(), deleted_date=now())
 
         # Delete this team
-        team.ciphers.all().delete()
-        team.collections.all().delete()
-        team.groups.all().delete()
-        team.delete()
+        self._delete_team(team=team)
 
         # Update revision date of user
         bump_account_revision_date(user=user_owner)
@@ -339,12 +341,15 @@ class SharingRepository(ISharingRepository):
 
             # Delete all folders of the ciphers
             Cipher.objects.filter(id__in=shared_cipher_ids).update(folders="")
+            CipherUserState.objects.filter(cipher_id__in=shared_cipher_ids).update(folder=None)
             # Create a collection for the shared ciphers
             shared_collection.collections_ciphers.model.create_multiple_for_collection(
                 shared_collection.id, *shared_cipher_ids
             )
             # Then, delete the root folder
+            folder_id, folder_user_id = folder.id, folder.user_id
             folder.delete()
+            SyncTombstone.create_multiple(SYNC_TOMBSTONE_FOLDER, {"id": folder_id, "user_id": folder_user_id})
 
         # Share a single cipher
         if cipher:
@@ -356,6 +361,31 @@ class SharingRepository(ISharingRepository):
 
         return new_sharing, existed_member_users, non_existed_member_users
 
+    @staticmethod
+    def _delete_team(team):
+        """
+        Delete the sharing team with its ciphers, collections and groups. The deleted ciphers and collections are
+        recorded as tombstones, and all members of the team lose the access to it
+        :param team: (obj) The Team object
+        :return:
+        """
+        team_id = team.id
+        member_user_ids = list(team.team_members.values_list('user_id', flat=True))
+        deleted_ciphers = list(team.ciphers.values('id', 'user_id', 'team_id', 'created_by_id'))
+        deleted_collection_ids = list(team.collections.values_list('id', flat=True))
+        team.ciphers.all().delete()
+        team.collections.all().delete()
+        team.groups.all().delete()
+        team.delete()
+        SyncTombstone.create_multiple(SYNC_TOMBSTONE_CIPHER, *deleted_ciphers)
+        SyncTombstone.create_multiple(SYNC_TOMBSTONE_COLLECTION, *[
+            {"id": collection_id, "team_id": team_id} for collection_id in deleted_collection_ids
+        ])
+        SyncTombstone.create_access_revocations(team_id, *member_user_ids)
+        record_user_statistic_changes(
+            USER_STATISTIC_SOURCE_CIPHERS, *[deleted_cipher.get("created_by_id") for deleted_cipher in deleted_ciphers]
+        )
+
     def _share_cipher(self, cipher: Cipher, team_id, cipher_data):
         # Update the cipher object
         cipher.revision_date = now()
@@ -366,6 +396,7 @@ class SharingRepository(ISharingRepository):
         cipher.user_id = None
         cipher.team_id = team_id
         cipher.save()
+        UserCipherAccess.refresh_ciphers(cipher.id)
         return cipher
 
     def _stop_share_cipher(self, cipher: Cipher, user_id, cipher_data):
@@ -378,6 +409,7 @@ class SharingRepository(ISharingRepository):
         cipher.user_id = user_id
         cipher.team_id = None
         cipher.save()
+        UserCipherAccess.refresh_ciphers(cipher.id)
         return cipher
 
     def add_members(self, team, shared_collection, members, groups=None):
@@ -563,5 +595,9 @@ class SharingRepository(ISharingRepository):
         owners = TeamMember.objects.filter(
             team__key__isnull=False, role_id=MEMBER_ROLE_OWNER, team_id__in=shared_teams
         ).values_list('user_id', flat=True)
+        shared_team_ids = list(shared_teams)
         member_teams.delete()
+        for shared_team_id in shared_team_ids:
+            SyncTombstone.create_access_revocations(shared_team_id, user.user_id)
+            UserCipherAccess.refresh_team_members(shared_team_id, user.user_id)
         return owners
@@ -8,6 +8,8 @@ from shared.constants.members import *
 from shared.constants.token import TOKEN_EXPIRED_TIME_INVITE_MEMBER, TOKEN_TYPE_INVITE_MEMBER, TOKEN_PREFIX
 from shared.utils.app import now, diff_list
 from cystack_models.models.members.team_members import TeamMember
+from cystack_models.models.ciphers.sync_tombstones import SyncTombstone
+from cystack_models.models.ciphers.user_cipher_access import UserCipherAccess
 
 
 class TeamMemberRepository(ITeamMemberRepository):
@@ -63,10 +65,12 @@ class TeamMemberRepository(ITeamMemberRepository):
             # Delete all groups of this member
             member.groups_members.all().delete()
             collections = []
-        # Remove all old collections
-        member.collections_members.all().delete()
+        # Remove all old collections. The member may lose the access to some collections
+        if member.collections_members.all().delete()[0]:
+            SyncTombstone.create_access_revocations(member.team_id, member.user_id)
         # Create member collections
         member.collections_members.model.create_multiple(member, *collections)
+        UserCipherAccess.refresh_team_members(member.team_id, member.user_id)
         # Bump revision date
         bump_account_revision_date(user=member.user)
 
@@ -81,8 +85,10 @@ class TeamMemberRepository(ITeamMemberRepository):
             group_ids = []
         existed_groups = list(self.get_list_groups(member).values_list('group_id', flat=True))
         removed_groups = diff_list(existed_groups, group_ids)
-        member.groups_members.filter(group_id__in=removed_groups).delete()
+        if member.groups_members.filter(group_id__in=removed_groups).delete()[0]:
+            SyncTombstone.create_access_revocations(member.team_id, member.user_id)
         member.groups_members.model.create_multiple_by_member(member, *group_ids)
+        UserCipherAccess.refresh_team_members(member.team_id, member.user_id)
         # Bump account revision date
         bump_account_revision_date(team=member.team)
         return member
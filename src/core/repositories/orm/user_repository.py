@@ -9,6 +9,12 @@ from django.db.models import OuterRef, Subquery, Q
 
 from core.repositories import IUserRepository
 from core.utils.account_revision_date import bump_account_revision_date
+from core.utils.entitlements import UserEntitlements, CIPHER_TYPE_LIMIT_FIELDS
+from shared.caching.entitlements_cache import get_cached_entitlements, set_cached_entitlements, \
+    delete_plan_owner_entitlements_cache
+from shared.caching.auth_token_cache import revoke_auth_token_cache
+from shared.caching.user_statistic_changes import record_user_statistic_changes, USER_STATISTIC_SOURCE_CIPHERS, \
+    USER_STATISTIC_SOURCE_DEVICES
 from shared.constants.account import ACCOUNT_TYPE_ENTERPRISE, ACCOUNT_TYPE_PERSONAL
 from shared.constants.ciphers import *
 from shared.constants.members import *
@@ -21,6 +27,7 @@ from cystack_models.models.ciphers.ciphers import Cipher
 from cystack_models.models.users.device_access_tokens import DeviceAccessToken
 from cystack_models.models.teams.teams import Team
 from cystack_models.models.members.team_members import TeamMember
+from cystack_models.models.ciphers.sync_tombstones import SyncTombstone
 from cystack_models.models.enterprises.members.enterprise_members import EnterpriseMember
 from cystack_models.models.enterprises.groups.group_members import EnterpriseGroupMember
 from cystack_models.models.user_plans.pm_plans import PMPlan
@@ -291,24 +298,43 @@ class UserRepository(IUserRepository):
         return personal_plans
 
     def get_max_allow_cipher_type(self, user: User):
+        return self.get_user_entitlements(user=user).get_max_allow_cipher_type()
+
+    def get_user_entitlements(self, user: User) -> UserEntitlements:
+        """
+        Get the cached entitlements of the user. They are built from the plan of the user,
+        the plans of the primary admins of their active enterprises and the PM plans limits
+        :param user: (obj) User object
+        :return: (UserEntitlements) The immutable entitlements
+        """
+        entitlements = get_cached_entitlements(user_id=user.user_id)
+        if entitlements is None:
+            entitlements = self.build_user_entitlements(user=user)
+            set_cached_entitlements(user_id=user.user_id, entitlements=entitlements)
+        return entitlements
+
+    def build_user_entitlements(self, user: User) -> UserEntitlements:
+        current_plan = self.get_current_plan(user=user, scope=settings.SCOPE_PWD_MANAGER)
+        plan_obj = current_plan.get_plan_obj()
         personal_plans = self.get_personal_team_plans(user=user)
-        cipher_limits = PMPlan.objects.filter(id__in=personal_plans.values_list('pm_plan_id')).values(
-            'limit_password', 'limit_secure_note', 'limit_identity', 'limit_payment_card', 'limit_crypto_asset'
+        cipher_limits = PMPlan.objects.filter(
+            id__in=[personal_plan.pm_plan_id for personal_plan in personal_plans]
+        ).values(*{field for _, field in CIPHER_TYPE_LIMIT_FIELDS if field})
+        max_cipher_limits = []
+        for cipher_type, field in CIPHER_TYPE_LIMIT_FIELDS:
+            limits = [cipher_limit.get(field) for cipher_limit in cipher_limits] if field else [None]
+            max_cipher_limits.append((cipher_type, None if None in limits or not limits else max(limits)))
+        return UserEntitlements(
+            user_id=user.user_id,
+            plan_alias=plan_obj.get_alias(),
+            cipher_limits=tuple(max_cipher_limits),
+            sync_device=plan_obj.get_sync_device(),
+            is_active_enterprise_member=user.is_active_enterprise_member(),
+            relay_premium=plan_obj.allow_relay_premium(),
+            personal_share=plan_obj.allow_personal_share(),
+            emergency_access=plan_obj.allow_emergency_access(),
+            tools_data_breach=plan_obj.allow_tools_data_breach(),
         )
-        limit_password = [cipher_limit.get("limit_password") for cipher_limit in cipher_limits]
-        limit_secure_note = [cipher_limit.get("limit_secure_note") for cipher_limit in cipher_limits]
-        limit_identity = [cipher_limit.get("limit_identity") for cipher_limit in cipher_limits]
-        limit_payment_card = [cipher_limit.get("limit_payment_card") for cipher_limit in cipher_limits]
-        limit_crypto_asset = [cipher_limit.get("limit_crypto_asset") for cipher_limit in cipher_limits]
-        return {
-            CIPHER_TYPE_LOGIN: None if None in limit_password else max(limit_password),
-            CIPHER_TYPE_NOTE: None if None in limit_secure_note else max(limit_secure_note),
-            CIPHER_TYPE_IDENTITY: None if None in limit_identity else max(limit_identity),
-            CIPHER_TYPE_CARD: None if None in limit_payment_card else max(limit_payment_card),
-            CIPHER_TYPE_CRYPTO_ACCOUNT: None if None in limit_crypto_asset else max(limit_crypto_asset),
-            CIPHER_TYPE_CRYPTO_WALLET: None if None in limit_crypto_asset else max(limit_crypto_asset),
-            CIPHER_TYPE_TOTP: None
-        }
 
     def get_mobile_user_plan(self, pm_mobile_subscription):
         from cystack_models.models.user_plans.pm_user_plan import PMUserPlan
@@ -454,6 +480,7 @@ class UserRepository(IUserRepository):
                 user=user, scope=settings.SCOPE_PWD_MANAGER, payment_method=payment_method
             ).cancel_immediately_recurring_subscription()
             end_time = now()
+        delete_plan_owner_entitlements_cache(user.user_id)
         return end_time
 
     def add_to_family_sharing(self, family_user_plan, user_id: int = None, email: str = None):
@@ -711,6 +738,9 @@ class UserRepository(IUserRepository):
         user.public_key = None
         user.private_key = None
         user.save()
+        revoke_auth_token_cache(user.user_id)
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_CIPHERS, user.user_id)
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_DEVICES, user.user_id)
 
     def purge_account(self, user: User):
         # Delete all their folders
@@ -728,10 +758,17 @@ class UserRepository(IUserRepository):
             shared_member=Subquery(other_members.values('user_id')[:1])
         ).exclude(shared_member__isnull=True).values('id', 'shared_member')
         shared_ciphers.delete()
+        # The members of the deleted teams lose the access to them
+        team_members = TeamMember.objects.filter(team_id__in=team_ids, user_id__isnull=False)
+        SyncTombstone.create_multiple(SYNC_TOMBSTONE_ACCESS, *[
+            {"id": team_id, "user_id": member_user_id}
+            for team_id, member_user_id in team_members.values_list('team_id', 'user_id')
+        ])
         Team.objects.filter(id__in=team_ids).delete()
 
         # Bump revision date
         bump_account_revision_date(user=user)
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_CIPHERS, user.user_id)
         return list(shared_ciphers_members)
 
     def revoke_all_sessions(self, user: User, exclude_sso_token_ids=None):
@@ -739,6 +776,7 @@ class UserRepository(IUserRepository):
         if exclude_sso_token_ids:
             device_access_tokens = device_access_tokens.exclude(sso_token_id__in=exclude_sso_token_ids)
         device_access_tokens.delete()
+        revoke_auth_token_cache(user.user_id)
         return user
 
     def change_master_password_hash(self, user: User, new_master_password_hash: str, key: str, score: float = None,
@@ -751,3 +789,4 @@ class UserRepository(IUserRepository):
         if login_method:
             user.login_method = login_method
         user.save()
+        revoke_auth_token_cache(user.user_id)
@@ -1,31 +1,140 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
 from django.db.models import Q
 
 from shared.constants.members import PM_MEMBER_STATUS_CONFIRMED
 from shared.utils.app import now
 from cystack_models.models.users.users import User
+from cystack_models.models.members.team_members import TeamMember
+
+
+_current_bumper = ContextVar("revision_bumper", default=None)
+_counters_lock = threading.Lock()
+REVISION_BUMP_COUNTERS = {
+    "requested": 0,         # Number of bump_account_revision_date calls
+    "coalesced": 0,         # Number of calls which were merged into another flush
+    "flushes": 0,           # Number of UPDATE users statements
+    "flushed_users": 0,     # Number of user rows updated by the flushes
+}
+
+
+def get_revision_bump_counters():
+    with _counters_lock:
+        return dict(REVISION_BUMP_COUNTERS)
+
+
+def _incr_counters(**counters):
+    with _counters_lock:
+        for name, value in counters.items():
+            REVISION_BUMP_COUNTERS[name] += value
+
+
+def _get_team_member_user_ids(team_id, collection_ids=None, role_name=None, group_ids=None):
+    # Finding all members
+    team_members = TeamMember.objects.filter(team_id=team_id, status=PM_MEMBER_STATUS_CONFIRMED)
+    # Filter by collection ids
+    if collection_ids:
+        team_members = team_members.filter(
+            Q(role_id__in=role_name or []) | Q(collections_members__collection_id__in=collection_ids)
+        )
+    if group_ids:
+        team_members = team_members.filter(
+            groups_members__group__enterprise_group_id__in=group_ids
+        ).distinct()
+    return team_members.values_list('user_id', flat=True)
+
+
+class RevisionBumper:
+    """
+    Collect the users whose account revision date must be bumped during a request or a job,
+    then update all of them by one `UPDATE users ... WHERE user_id IN (...)` statement
+    """
+    def __init__(self):
+        self.user_ids = set()
+        self.team_ids = set()
+        self.filtered_teams = []
+        self.num_requested = 0
+
+    def add(self, user: User = None, team=None, **team_filters):
+        self.num_requested += 1
+        if team:
+            team_id = getattr(team, "id", team)
+            team_filters = {k: v for k, v in team_filters.items() if v}
+            if team_filters:
+                self.filtered_teams.append((team_id, team_filters))
+            else:
+                self.team_ids.add(team_id)
+        elif user:
+            self.user_ids.add(user.user_id)
+
+    def get_user_ids(self):
+        user_ids = set(self.user_ids)
+        # The teams without filters are resolved by one query
+        if self.team_ids:
+            user_ids.update(TeamMember.objects.filter(
+                team_id__in=self.team_ids, status=PM_MEMBER_STATUS_CONFIRMED, user_id__isnull=False
+            ).values_list('user_id', flat=True))
+        for team_id, team_filters in self.filtered_teams:
+            user_ids.update(_get_team_member_user_ids(team_id, **team_filters))
+        user_ids.discard(None)
+        return user_ids
+
+    def flush(self):
+        if not self.num_requested:
+            return 0
+        num_requested = self.num_requested
+        user_ids = self.get_user_ids()
+        self.user_ids, self.team_ids, self.filtered_teams, self.num_requested = set(), set(), [], 0
+        num_updated = 0
+        if user_ids:
+            num_updated = User.objects.filter(user_id__in=user_ids).update(revision_date=now())
+        _incr_counters(coalesced=num_requested - 1, flushes=1, flushed_users=num_updated)
+        return num_updated
+
+
+@contextmanager
+def revision_bumper():
+    """
+    Defer and coalesce all `bump_account_revision_date` calls of the block.
+    The nested blocks share the outermost bumper. If the block is inside a transaction,
+    the users are bumped when the transaction commits
+    """
+    if _current_bumper.get() is not None:
+        yield _current_bumper.get()
+        return
+    bumper = RevisionBumper()
+    token = _current_bumper.set(bumper)
+    try:
+        yield bumper
+    finally:
+        _current_bumper.reset(token)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(bumper.flush)
+        else:
+            bumper.flush()
 
 
 def bump_account_revision_date(user: User = None, team=None, **team_filters):
-    if team:
-        # Finding all members
-        team_members = team.team_members.filter(status=PM_MEMBER_STATUS_CONFIRMED)
-        collection_ids = team_filters.get("collection_ids", [])
-        role_name = team_filters.get("role_name", [])
-        group_ids = team_filters.get("group_ids", [])
-        # Filter by collection ids
-        if collection_ids:
-            team_members = team_members.filter(
-                Q(role_id__in=role_name) | Q(collections_members__collection_id__in=collection_ids)
-            )
-        if group_ids:
-            team_members = team_members.filter(
-                groups_members__group__enterprise_group_id__in=group_ids
-            ).distinct()
-
-        # Get list user ids and update revision date of them
-        member_user_ids = team_members.values_list('user_id', flat=True)
-        User.objects.filter(user_id__in=member_user_ids).update(revision_date=now())
-
-    elif user:
+    """
+    Bump the revision date of the user or the confirmed members of the team.
+    Inside a `revision_bumper` block, the bump is deferred to the end of the block
+    :param user: (obj) User object
+    :param team: (obj|str) Team object or team id
+    :param team_filters: (dict) {"collection_ids", "role_name", "group_ids"}
+    """
+    if not user and not team:
+        return
+    if user and not team:
+        # Keep the in-memory object consistent with the deferred update
         user.revision_date = now()
-        user.save()
+    _incr_counters(requested=1)
+    bumper = _current_bumper.get()
+    if bumper is not None:
+        bumper.add(user=user, team=team, **team_filters)
+        return
+    bumper = RevisionBumper()
+    bumper.add(user=user, team=team, **team_filters)
+    bumper.flush()
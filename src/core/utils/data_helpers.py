@@ -1,8 +1,53 @@
 import json
 import humps
+from collections.abc import Mapping
 from datetime import datetime
 
 
+# The translated keys are compiled into maps on first use. The response keys come from a finite set of
+# serializer fields and cipher data fields, so a key is translated by a dict lookup after its first request
+KEY_MAP_MAX_SIZE = 10000
+_camel_key_map = {}
+_snake_key_map = {}
+
+
+def _translate_key(key, key_map, translate):
+    if not isinstance(key, str):
+        return translate(key)
+    translated_key = key_map.get(key)
+    if translated_key is None:
+        translated_key = translate(key)
+        # The arbitrary keys are not kept when the map is full
+        if len(key_map) < KEY_MAP_MAX_SIZE:
+            key_map[key] = translated_key
+    return translated_key
+
+
+def _translate_keys(data, key_map, translate):
+    if isinstance(data, list):
+        return [_translate_keys(item, key_map, translate) for item in data]
+    if isinstance(data, Mapping):
+        return {
+            _translate_key(key, key_map, translate): _translate_keys(value, key_map, translate)
+            for key, value in data.items()
+        }
+    return data
+
+
+def camelize_keys(data):
+    """
+    Convert the keys of the dicts of the data from snake case to camel case, the same as `humps.camelize`
+    """
+    return _translate_keys(data, _camel_key_map, humps.camelize)
+
+
+def decamelize_keys(data):
+    """
+    Convert the keys of the dicts of the data from camel case to snake case, the same as `humps.decamelize`
+    """
+    return _translate_keys(data, _snake_key_map, humps.decamelize)
+
+
 def camel_snake_data(json_data, camel_to_snake=False, snake_to_camel=False):
     """
     Get JSON response data from HTTPResponse
@@ -12,10 +57,11 @@ def camel_snake_data(json_data, camel_to_snake=False, snake_to_camel=False):
     :return: (dict)
     """
     try:
+        # A single string is converted itself
         if camel_to_snake is True:
-            return humps.decamelize(json_data)
+            return humps.decamelize(json_data) if isinstance(json_data, str) else decamelize_keys(json_data)
         if snake_to_camel is True:
-            return humps.camelize(json_data)
+            return humps.camelize(json_data) if isinstance(json_data, str) else camelize_keys(json_data)
         return json_data
     except json.decoder.JSONDecodeError:
         return json_data
@@ -0,0 +1,53 @@
+from typing import NamedTuple, Optional, Tuple
+
+from shared.constants.ciphers import *
+
+
+# The cipher types which have a plan limit, with the PMPlan limit field of each type
+CIPHER_TYPE_LIMIT_FIELDS = [
+    (CIPHER_TYPE_LOGIN, "limit_password"),
+    (CIPHER_TYPE_NOTE, "limit_secure_note"),
+    (CIPHER_TYPE_IDENTITY, "limit_identity"),
+    (CIPHER_TYPE_CARD, "limit_payment_card"),
+    (CIPHER_TYPE_CRYPTO_ACCOUNT, "limit_crypto_asset"),
+    (CIPHER_TYPE_CRYPTO_WALLET, "limit_crypto_asset"),
+    (CIPHER_TYPE_TOTP, None),
+]
+
+
+class UserEntitlements(NamedTuple):
+    """
+    The resolved plan features of a user. This object is immutable, it is rebuilt when the plans
+    or the enterprise memberships of the user change
+    """
+    user_id: int
+    plan_alias: str
+    # Tuple of (cipher_type, max number of ciphers or None if unlimited)
+    cipher_limits: Tuple[Tuple[int, Optional[int]], ...]
+    sync_device: Optional[int]
+    is_active_enterprise_member: bool
+    relay_premium: bool
+    personal_share: bool
+    emergency_access: bool
+    tools_data_breach: bool
+
+    def get_max_allow_cipher_type(self):
+        """
+        :return: (dict) {cipher_type: max number of ciphers or None}. The dict is a new copy
+        """
+        return dict(self.cipher_limits)
+
+    def get_limit_cipher_type(self, cipher_type):
+        return dict(self.cipher_limits).get(cipher_type)
+
+    def allow_relay_premium(self):
+        return self.relay_premium or self.is_active_enterprise_member
+
+    def allow_personal_share(self):
+        return self.personal_share or self.is_active_enterprise_member
+
+    def allow_emergency_access(self):
+        return self.emergency_access or self.is_active_enterprise_member
+
+    def allow_tools_data_breach(self):
+        return self.tools_data_breach or self.is_active_enterprise_member
@@ -4,8 +4,7 @@ import schedule
 from django.db import close_old_connections
 
 from cron.task import Task
-from cystack_models.models.events.events import Event
-from shared.utils.app import now
+from shared.utils.retention import RetentionEngine, get_events_retention_policy
 
 
 class DeleteOldEvents(Task):
@@ -22,9 +21,9 @@ class DeleteOldEvents(Task):
     def real_run(self, *args):
         # Close old connections
         close_old_connections()
-        current_time = now()
-        # Delete old events if the creation date is less than 90 days
-        Event.objects.filter(creation_date__lte=current_time - 90 * 86400).delete()
+        # Delete the expired events by throttled chunks
+        result = RetentionEngine(policy=get_events_retention_policy()).run()
+        self.logger.info(f"[+] Retention events: {result}")
 
     def scheduling(self):
         schedule.every().day.at("17:00").do(self.run)
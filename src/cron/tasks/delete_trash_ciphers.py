@@ -4,8 +4,7 @@ import schedule
 from django.db import close_old_connections
 
 from cron.task import Task
-from cystack_models.models.ciphers.ciphers import Cipher
-from shared.utils.app import now
+from shared.utils.retention import RetentionEngine, get_trash_ciphers_retention_policies
 
 
 class DeleteTrashCiphers(Task):
@@ -22,9 +21,10 @@ class DeleteTrashCiphers(Task):
     def real_run(self, *args):
         # Close old connections
         close_old_connections()
-        current_time = now()
-        # Delete ciphers in trash if the deleted time is less than 30 days
-        Cipher.objects.filter(deleted_date__isnull=False).filter(deleted_date__lte=current_time - 30 * 86400).delete()
+        # Delete ciphers in trash and the expired tombstones of the delta sync by throttled chunks
+        for policy in get_trash_ciphers_retention_policies():
+            result = RetentionEngine(policy=policy).run()
+            self.logger.info(f"[+] Retention {policy.name}: {result}")
 
     def scheduling(self):
         schedule.every().day.at("17:00").do(self.run)
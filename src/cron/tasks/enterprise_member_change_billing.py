@@ -13,6 +13,8 @@ from cystack_models.factory.payment_method.payment_method_factory import Payment
 from cystack_models.models.events.events import Event
 from cystack_models.models.enterprises.enterprises import Enterprise
 from cystack_models.models.payments.payments import Payment
+from shared.caching.entitlements_cache import delete_entitlements_cache
+from shared.caching.login_policy_cache import delete_login_policy_snapshots
 from shared.constants.event import EVENT_E_MEMBER_CONFIRMED, EVENT_E_MEMBER_ENABLED
 from shared.constants.transactions import *
 from shared.utils.app import now
@@ -126,6 +128,8 @@ class EnterpriseMemberChangeBilling(Task):
                     disabled_members = enterprise.enterprise_members.filter(
                         user_id__in=added_user_ids
                     ).update(is_activated=False)
+                    delete_login_policy_snapshots(*added_user_ids)
+                    delete_entitlements_cache(*added_user_ids)
                     try:
                         PaymentMethodFactory.get_method(
                             user=enterprise.get_primary_admin_user(), scope=settings.SCOPE_PWD_MANAGER,
@@ -0,0 +1,31 @@
+import time
+import schedule
+
+from django.db import close_old_connections
+
+from cron.task import Task
+from shared.caching.relay_counters import flush_relay_counters
+
+
+class FlushRelayCounters(Task):
+    def __init__(self):
+        super(FlushRelayCounters, self).__init__()
+        self.job_id = 'flush_relay_counters'
+
+    def register_job(self):
+        pass
+
+    def log_job_execution(self, run_time: float, exception: str = None, tb: str = None):
+        pass
+
+    def real_run(self, *args):
+        # Close old connections
+        close_old_connections()
+        # Write the relay forwarded/spam counters which were accumulated in Redis
+        flush_relay_counters()
+
+    def scheduling(self):
+        schedule.every(1).minutes.do(self.run)
+        while True:
+            schedule.run_pending()
+            time.sleep(1)
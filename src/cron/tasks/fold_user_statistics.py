@@ -0,0 +1,34 @@
+import os
+import time
+import schedule
+
+from django.db import close_old_connections
+
+from cron.task import Task
+from locker_statistic.user_statistics_builder import fold_user_statistic_changes
+
+
+class FoldUserStatistics(Task):
+    def __init__(self):
+        super(FoldUserStatistics, self).__init__()
+        self.job_id = 'fold_user_statistics'
+
+    def register_job(self):
+        pass
+
+    def log_job_execution(self, run_time: float, exception: str = None, tb: str = None):
+        pass
+
+    def real_run(self, *args):
+        # Close old connections
+        close_old_connections()
+        # Refresh the statistics of the users whose ciphers, devices, relay addresses, payments or plans changed
+        fold_user_statistic_changes()
+
+    def scheduling(self):
+        # Only PROD
+        if os.getenv("PROD_ENV") == "prod":
+            schedule.every(10).minutes.do(self.run)
+            while True:
+                schedule.run_pending()
+                time.sleep(1)
@@ -0,0 +1,100 @@
+import random
+import time
+
+from django.core.management import BaseCommand
+from django.db.models import Q
+
+from cystack_models.models import *
+from shared.constants.event import *
+from shared.utils.app import now
+from shared.utils.keyset_pagination import KeysetPagination
+
+
+BENCHMARK_ENTERPRISE_ID = "benchmark_activity_logs"
+
+
+class Command(BaseCommand):
+    """
+    Compare the time of the activity log pages between the offset pagination and the keyset pagination
+    at several depths. The events are seeded into a fake enterprise, e.g. with --seed 1000000 or --seed 10000000
+    """
+    help = "Benchmark the enterprise activity log pagination, offset vs keyset"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Number of events to insert before the benchmark")
+        parser.add_argument("--size", type=int, default=10, help="Page size")
+        parser.add_argument("--depths", type=str, default="1,100,1000,10000,50000", help="Page numbers")
+        parser.add_argument("--users", type=int, default=200, help="Number of users of the seeded events")
+        parser.add_argument("--explain", action="store_true", help="Print the query plans")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the seeded events at the end")
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            self.seed(num_events=options["seed"], num_users=options["users"])
+        size = options["size"]
+        acting_user_ids = list(range(1, options["users"] // 10 + 2))
+        filters = {
+            "all": Q(),
+            "members": Q(acting_user_id__in=acting_user_ids) | Q(user_id__in=acting_user_ids),
+        }
+        for filter_name, filter_q in filters.items():
+            events = Event.objects.filter(team_id=BENCHMARK_ENTERPRISE_ID).filter(filter_q).order_by(
+                '-creation_date', '-id'
+            )
+            for depth in [int(depth) for depth in options["depths"].split(",") if depth.strip()]:
+                offset = (depth - 1) * size
+                offset_time, offset_page = self.measure(lambda: list(events[offset:offset + size]))
+                if not offset_page:
+                    self.stdout.write(f"[{filter_name}] Page {depth}: out of range")
+                    continue
+                # The cursor is the last row of the previous page, as the client sends it back
+                keyset_queryset = events
+                if offset:
+                    previous_event = events[offset - 1]
+                    cursor = KeysetPagination.encode_cursor([previous_event.creation_date, previous_event.id])
+                    keyset_queryset = KeysetPagination().filter_queryset_by_cursor(events, cursor)
+                keyset_time, keyset_page = self.measure(lambda: list(keyset_queryset[:size]))
+                if [e.id for e in keyset_page] != [e.id for e in offset_page]:
+                    self.stdout.write(f"[!] [{filter_name}] Page {depth}: the keyset page differs from the offset page")
+                self.stdout.write(f"[{filter_name}] Page {depth}: offset {offset_time * 1000:.2f}ms - "
+                                  f"keyset {keyset_time * 1000:.2f}ms")
+                if options["explain"]:
+                    self.stdout.write(events[offset:offset + size].explain())
+                    self.stdout.write(keyset_queryset[:size].explain())
+        if options["cleanup"]:
+            self.cleanup()
+
+    @staticmethod
+    def measure(run_query):
+        start_time = time.perf_counter()
+        result = run_query()
+        return time.perf_counter() - start_time, result
+
+    def seed(self, num_events, num_users, batch_size=5000):
+        current_time = now()
+        event_types = [EVENT_USER_LOGIN, EVENT_USER_LOGIN_FAILED, EVENT_E_MEMBER_CONFIRMED, EVENT_ITEM_SHARE_CREATED]
+        num_created = 0
+        while num_created < num_events:
+            events = []
+            for _ in range(min(batch_size, num_events - num_created)):
+                user_id = random.randint(1, num_users)
+                events.append(Event.build(
+                    type=random.choice(event_types),
+                    acting_user_id=user_id,
+                    user_id=user_id if random.random() < 0.5 else random.randint(1, num_users),
+                    team_id=BENCHMARK_ENTERPRISE_ID,
+                    creation_date=current_time - random.randint(0, 90 * 86400),
+                ))
+            Event.objects.bulk_create(events, batch_size=batch_size)
+            num_created += len(events)
+            self.stdout.write(f"Seeded {num_created}/{num_events} events")
+
+    def cleanup(self, batch_size=5000):
+        while True:
+            event_ids = list(
+                Event.objects.filter(team_id=BENCHMARK_ENTERPRISE_ID).values_list('id', flat=True)[:batch_size]
+            )
+            if not event_ids:
+                break
+            Event.objects.filter(id__in=event_ids).delete()
+        self.stdout.write("Deleted the seeded events")
@@ -0,0 +1,150 @@
+import time
+import uuid
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Q, Case, When, BooleanField
+
+from core.settings import CORE_CONFIG
+from cystack_models.models import *
+from shared.constants.ciphers import CIPHER_TYPE_LOGIN
+from shared.constants.members import *
+from shared.utils.app import now
+
+
+class Command(BaseCommand):
+    """
+    Compare the legacy and the current access resolution of `CipherRepository.get_multiple_by_user`.
+    The synthetic vaults are created in a transaction which is always rolled back
+    """
+    help = "Benchmark the cipher access resolution for users with 100, 10k and 100k reachable ciphers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=str, default="100,10000,100000")
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def handle(self, *args, **options):
+        cipher_repository = CORE_CONFIG["repositories"]["ICipherRepository"]()
+        sizes = [int(size) for size in options["sizes"].split(",") if size.strip()]
+        for size in sizes:
+            with transaction.atomic():
+                user = self.create_fixture(size=size)
+                legacy_time, legacy_result = self.timeit(
+                    lambda: self.legacy_get_multiple_by_user(user=user), repeat=options["repeat"]
+                )
+                current_time, current_result = self.timeit(
+                    lambda: cipher_repository.resolve_multiple_by_user(user=user), repeat=options["repeat"]
+                )
+                cipher_repository.rebuild_user_cipher_access(user=user)
+                indexed_time, indexed_result = self.timeit(
+                    lambda: cipher_repository.get_multiple_by_user(user=user), repeat=options["repeat"]
+                )
+                self.stdout.write(
+                    f"[{size} ciphers] legacy: {legacy_time:.3f}s - current: {current_time:.3f}s - "
+                    f"indexed: {indexed_time:.3f}s - "
+                    f"same result: {legacy_result == current_result == indexed_result}"
+                )
+                transaction.set_rollback(True)
+
+    @staticmethod
+    def timeit(get_ciphers, repeat=3):
+        best_time = None
+        result = None
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            result = set(get_ciphers().values_list('id', 'view_password'))
+            run_time = time.perf_counter() - start_time
+            best_time = run_time if best_time is None else min(best_time, run_time)
+        return best_time, result
+
+    @staticmethod
+    def create_fixture(size):
+        """
+        Create a user who reaches `size` ciphers: 10% personal, 40% in an owned team
+        and 50% in a hidden-password collection of a team where the user is a member
+        """
+        user = User.objects.create(user_id=int(time.time() * 1000) % 2 ** 31, creation_date=now())
+        owned_team = Team.create(name="Benchmark owned team")
+        shared_team = Team.create(name="Benchmark shared team")
+        TeamMember.create(team=owned_team, role_id=MEMBER_ROLE_OWNER, user=user, is_primary=True)
+        member = TeamMember.create(team=shared_team, role_id=MEMBER_ROLE_MEMBER, user=user)
+        reachable_collection = Collection.create(team=shared_team, name="Reachable")
+        unreachable_collection = Collection.create(team=shared_team, name="Unreachable")
+        CollectionMember.objects.create(collection=reachable_collection, member=member, hide_passwords=True)
+
+        def new_cipher(**data):
+            return Cipher(
+                id=str(uuid.uuid4()), creation_date=now(), revision_date=now(), type=CIPHER_TYPE_LOGIN,
+                data="{'name': 'benchmark'}", **data
+            )
+
+        personal_ciphers = [new_cipher(user=user, created_by=user) for _ in range(size // 10)]
+        owned_ciphers = [new_cipher(team=owned_team) for _ in range(size * 4 // 10)]
+        reachable_ciphers = [new_cipher(team=shared_team) for _ in range(size - len(personal_ciphers) - len(owned_ciphers))]
+        unreachable_ciphers = [new_cipher(team=shared_team) for _ in range(size // 10)]
+        Cipher.objects.bulk_create(
+            personal_ciphers + owned_ciphers + reachable_ciphers + unreachable_ciphers, batch_size=1000
+        )
+        CollectionCipher.objects.bulk_create(
+            [CollectionCipher(collection=reachable_collection, cipher=c) for c in reachable_ciphers] +
+            [CollectionCipher(collection=unreachable_collection, cipher=c) for c in unreachable_ciphers],
+            batch_size=1000
+        )
+        return user
+
+    @staticmethod
+    def legacy_get_multiple_by_user(user):
+        """
+        The multi-join access resolution which was replaced by `CipherRepository.get_user_team_access`
+        """
+        personal_ciphers = Cipher.objects.filter(user=user)
+        confirmed_team_members = user.team_members.filter(status=PM_MEMBER_STATUS_CONFIRMED)
+        confirmed_team_ids = confirmed_team_members.values_list('team_id', flat=True)
+        team_ciphers = Cipher.objects.filter(team_id__in=confirmed_team_ids).filter(
+            Q(
+                team__team_members__role_id__in=[MEMBER_ROLE_OWNER, MEMBER_ROLE_ADMIN],
+                team__team_members__user=user
+            ) |
+            Q(
+                team__groups__access_all=True,
+                team__groups__groups_members__member__user=user
+            ) |
+            Q(
+                collections_ciphers__collection__collections_members__member__in=confirmed_team_members,
+                team__team_members__user=user
+            ) |
+            Q(
+                team__personal_share=True,
+                team__team_members__user=user
+            )
+        ).distinct().annotate(
+            view_password=Case(
+                When(
+                    Q(
+                        team__team_members__role_id__in=[MEMBER_ROLE_MEMBER],
+                        team__team_members__user=user,
+                        collections_ciphers__collection__collections_members__hide_passwords=True
+                    ), then=False
+                ),
+                When(
+                    Q(
+                        team__team_members__role_id__in=[MEMBER_ROLE_MEMBER],
+                        team__team_members__user=user,
+                        team__personal_share=True,
+                        team__team_members__hide_passwords=True
+                    ), then=False
+                ),
+                default=True,
+                output_field=BooleanField()
+            )
+        )
+        hide_password_cipher_ids = team_ciphers.filter(view_password=False).values_list('id', flat=True)
+        return Cipher.objects.filter(
+            id__in=list(personal_ciphers.values_list('id', flat=True)) + list(team_ciphers.values_list('id', flat=True))
+        ).annotate(
+            view_password=Case(
+                When(id__in=hide_password_cipher_ids, then=False),
+                default=True,
+                output_field=BooleanField()
+            )
+        )
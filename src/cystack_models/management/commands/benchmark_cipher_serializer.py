@@ -0,0 +1,79 @@
+import time
+import uuid
+
+import humps
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from core.utils.data_helpers import camelize_keys
+from cystack_models.models import *
+from cystack_models.management.commands.migrate_json_text_fields import Command as MigrateJSONTextCommand
+from shared.constants.ciphers import CIPHER_TYPE_LOGIN
+from shared.utils.app import now
+from v1_0.sync.serializers import SyncCipherSerializer
+
+
+class Command(BaseCommand):
+    """
+    Time `SyncCipherSerializer` on ciphers stored as Python literals and as JSON text,
+    then the camel case conversion of the serialized ciphers by humps and by the compiled key maps.
+    The synthetic vault is created in a transaction which is always rolled back
+    """
+    help = "Benchmark the sync cipher serializer and the camel case conversion of its data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        size = options["size"]
+        with transaction.atomic():
+            user = User.objects.create(user_id=int(time.time() * 1000) % 2 ** 31, creation_date=now())
+            cipher_data = {
+                "name": "benchmark", "notes": None, "username": "benchmark@locker.io", "password": "x" * 64,
+                "totp": None, "uris": [{"match": None, "uri": "https://locker.io"}],
+                "fields": [{"name": "field", "type": 0, "value": "value"}], "autofill_on_page_load": False,
+            }
+            Cipher.objects.bulk_create([
+                Cipher(
+                    id=str(uuid.uuid4()), creation_date=now(), revision_date=now(), type=CIPHER_TYPE_LOGIN,
+                    user=user, created_by=user,
+                    # The legacy storage format
+                    data=str(cipher_data), favorites=str({user.user_id: True}), folders=str({user.user_id: None}),
+                ) for _ in range(size)
+            ], batch_size=1000)
+
+            legacy_time, _ = self.serialize(user=user)
+            ciphers = list(Cipher.objects.filter(user=user).order_by('pk'))
+            MigrateJSONTextCommand.convert_rows(Cipher, ["data", "favorites", "folders"], ciphers)
+            json_time, ciphers_data = self.serialize(user=user)
+
+            self.stdout.write(
+                f"[{size} ciphers] literal_eval: {legacy_time:.3f}s - json: {json_time:.3f}s"
+            )
+            humps_time, humps_data = self.timeit(lambda: humps.camelize(ciphers_data))
+            key_map_time, key_map_data = self.timeit(lambda: camelize_keys(ciphers_data))
+            self.stdout.write(
+                f"[{size} ciphers] camelize humps: {humps_time:.3f}s - key maps: {key_map_time:.3f}s - "
+                f"same result: {humps_data == key_map_data}"
+            )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def serialize(user):
+        ciphers = list(
+            Cipher.objects.filter(user=user).prefetch_related('collections_ciphers', 'cipher_user_states')
+        )
+        start_time = time.perf_counter()
+        ciphers_data = SyncCipherSerializer(ciphers, many=True, context={"user": user}).data
+        return time.perf_counter() - start_time, ciphers_data
+
+    @staticmethod
+    def timeit(convert, repeat=3):
+        best_time = None
+        result = None
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            result = convert()
+            run_time = time.perf_counter() - start_time
+            best_time = run_time if best_time is None else min(best_time, run_time)
+        return best_time, result
@@ -0,0 +1,94 @@
+import time
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.settings import CORE_CONFIG
+from cystack_models.models import *
+from shared.caching.entitlements_cache import delete_entitlements_cache
+from shared.constants.ciphers import *
+
+
+class Command(BaseCommand):
+    """
+    Compare the number of queries and the time of the plan checks of one request (the cipher limits, the relay premium
+    and the personal sharing checks) between the legacy resolution and the cached entitlements
+    """
+    help = "Benchmark the plan and limit resolution per request, before and after the entitlements cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user_ids", type=str, default="")
+        parser.add_argument("--limit", type=int, default=20)
+        parser.add_argument("--checks", type=int, default=3, help="Number of plan checks of one request")
+
+    def handle(self, *args, **options):
+        user_repository = CORE_CONFIG["repositories"]["IUserRepository"]()
+        if options["user_ids"]:
+            user_ids = [int(user_id) for user_id in options["user_ids"].split(",") if user_id.strip()]
+            users = User.objects.filter(user_id__in=user_ids)
+        else:
+            users = User.objects.filter(activated=True).order_by('user_id')[:options["limit"]]
+        users = list(users)
+        delete_entitlements_cache(*[user.user_id for user in users])
+
+        results = {"legacy": [0, 0.0], "cold": [0, 0.0], "warm": [0, 0.0]}
+        for user in users:
+            for name, run_checks in [
+                ("legacy", lambda: self.legacy_checks(user_repository, user, options["checks"])),
+                ("cold", lambda: self.entitlements_checks(user_repository, user, options["checks"])),
+                ("warm", lambda: self.entitlements_checks(user_repository, user, options["checks"])),
+            ]:
+                num_queries, run_time, result = self.measure(run_checks)
+                results[name][0] += num_queries
+                results[name][1] += run_time
+                if name == "legacy":
+                    legacy_result = result
+                elif result != legacy_result:
+                    self.stdout.write(f"[!] User {user.user_id}: {name} result {result} != legacy {legacy_result}")
+
+        num_users = len(users) or 1
+        for name, (num_queries, run_time) in results.items():
+            self.stdout.write(
+                f"[{name}] {num_queries / num_users:.1f} queries/request - {run_time * 1000 / num_users:.2f}ms/request"
+            )
+
+    @staticmethod
+    def measure(run_checks):
+        with CaptureQueriesContext(connection) as queries:
+            start_time = time.perf_counter()
+            result = run_checks()
+            run_time = time.perf_counter() - start_time
+        return len(queries.captured_queries), run_time, result
+
+    @staticmethod
+    def legacy_checks(user_repository, user, checks):
+        result = None
+        for _ in range(checks):
+            current_plan = user_repository.get_current_plan(user=user, scope=settings.SCOPE_PWD_MANAGER)
+            plan_obj = current_plan.get_plan_obj()
+            is_active_enterprise_member = user.is_active_enterprise_member()
+            personal_plans = user_repository.get_personal_team_plans(user=user)
+            cipher_limits = PMPlan.objects.filter(id__in=personal_plans.values_list('pm_plan_id')).values(
+                'limit_password', 'limit_secure_note', 'limit_identity', 'limit_payment_card', 'limit_crypto_asset'
+            )
+            limit_password = [cipher_limit.get("limit_password") for cipher_limit in cipher_limits]
+            result = (
+                None if None in limit_password else max(limit_password),
+                plan_obj.allow_relay_premium() or is_active_enterprise_member,
+                plan_obj.allow_personal_share() or is_active_enterprise_member,
+            )
+        return result
+
+    @staticmethod
+    def entitlements_checks(user_repository, user, checks):
+        result = None
+        for _ in range(checks):
+            entitlements = user_repository.get_user_entitlements(user=user)
+            result = (
+                entitlements.get_limit_cipher_type(CIPHER_TYPE_LOGIN),
+                entitlements.allow_relay_premium(),
+                entitlements.allow_personal_share(),
+            )
+        return result
@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.core.management import BaseCommand
+
+from cystack_models.models import *
+
+
+MIGRATE_CIPHER_USER_STATES_CHECKPOINT = "migrate_cipher_user_states"
+
+
+class Command(BaseCommand):
+    """
+    Backfill the CipherUserState rows from the legacy `Cipher.folders` and `Cipher.favorites` columns.
+    The existed states are kept (insert-ignore) and the folder ids which do not belong to the user are dropped.
+    The ciphers are scanned in primary key order and checkpointed, so the command can be resumed at any time
+    """
+    help = "Backfill cs_cipher_user_states from the legacy cipher folders/favorites columns"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch_size", type=int, default=1000)
+        parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+
+    def handle(self, *args, **options):
+        last_pk = None if options["restart"] else cache.get(MIGRATE_CIPHER_USER_STATES_CHECKPOINT)
+        num_states = 0
+        while True:
+            ciphers = Cipher.objects.order_by('pk').only('pk', 'favorites', 'folders')
+            if last_pk is not None:
+                ciphers = ciphers.filter(pk__gt=last_pk)
+            ciphers = list(ciphers[:options["batch_size"]])
+            if not ciphers:
+                break
+            num_states += self.migrate_ciphers(ciphers)
+            last_pk = ciphers[-1].pk
+            cache.set(MIGRATE_CIPHER_USER_STATES_CHECKPOINT, last_pk, None)
+            self.stdout.write(f"Created {num_states} states - checkpoint {last_pk}")
+        self.stdout.write(f"Done. Created {num_states} states")
+
+    @staticmethod
+    def migrate_ciphers(ciphers):
+        states_data = {}
+        for cipher in ciphers:
+            for user_id, favorite in cipher.get_parsed_field("favorites", int_keys=True).items():
+                states_data.setdefault((cipher.id, user_id), {})["favorite"] = bool(favorite)
+            for user_id, folder_id in cipher.get_parsed_field("folders", int_keys=True).items():
+                if folder_id:
+                    states_data.setdefault((cipher.id, user_id), {})["folder_id"] = str(folder_id)
+
+        # Only keep the folders which exist and belong to the user
+        folder_ids = {state.get("folder_id") for state in states_data.values() if state.get("folder_id")}
+        valid_folders = set(Folder.objects.filter(id__in=folder_ids).values_list('id', 'user_id'))
+        new_states = []
+        for (cipher_id, user_id), state in states_data.items():
+            if not isinstance(user_id, int):
+                continue
+            folder_id = state.get("folder_id")
+            if folder_id and (folder_id, user_id) not in valid_folders:
+                folder_id = None
+            if not folder_id and not state.get("favorite"):
+                continue
+            new_states.append({
+                "cipher_id": cipher_id, "user_id": user_id, "folder_id": folder_id, "favorite": state.get("favorite")
+            })
+        CipherUserState.create_multiple(*new_states)
+        return len(new_states)
@@ -0,0 +1,63 @@
+import json
+
+from django.core.cache import cache
+from django.core.management import BaseCommand
+
+from cystack_models.models import *
+from cystack_models.models.fields import parse_json_text, is_json_text
+
+
+MIGRATE_JSON_TEXT_CHECKPOINT = "migrate_json_text_fields:{}"
+MIGRATE_JSON_TEXT_MODELS = {
+    "cipher": (Cipher, ["data", "favorites", "folders"]),
+    "event": (Event, ["metadata"]),
+}
+
+
+class Command(BaseCommand):
+    """
+    Convert the Python-literal rows of the JSONTextField columns into JSON text.
+    The rows are converted in primary key order and the last converted key is checkpointed,
+    so the command can be stopped and resumed at any time
+    """
+    help = "Convert cipher data/favorites/folders and event metadata from Python literals to JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--models", type=str, default="cipher,event")
+        parser.add_argument("--batch_size", type=int, default=1000)
+        parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint")
+
+    def handle(self, *args, **options):
+        for model_name in options["models"].split(","):
+            model, fields = MIGRATE_JSON_TEXT_MODELS[model_name]
+            checkpoint_key = MIGRATE_JSON_TEXT_CHECKPOINT.format(model_name)
+            last_pk = None if options["restart"] else cache.get(checkpoint_key)
+            num_converted = 0
+            while True:
+                rows = model.objects.order_by('pk').only('pk', *fields)
+                if last_pk is not None:
+                    rows = rows.filter(pk__gt=last_pk)
+                rows = list(rows[:options["batch_size"]])
+                if not rows:
+                    break
+                num_converted += self.convert_rows(model, fields, rows)
+                last_pk = rows[-1].pk
+                cache.set(checkpoint_key, last_pk, None)
+                self.stdout.write(f"[{model_name}] Converted {num_converted} rows - checkpoint {last_pk}")
+            self.stdout.write(f"[{model_name}] Done. Converted {num_converted} rows")
+
+    @staticmethod
+    def convert_rows(model, fields, rows):
+        converted_rows = []
+        for row in rows:
+            is_converted = False
+            for field in fields:
+                value = getattr(row, field)
+                if is_json_text(value):
+                    continue
+                setattr(row, field, json.dumps(parse_json_text(value)))
+                is_converted = True
+            if is_converted:
+                converted_rows.append(row)
+        model.objects.bulk_update(converted_rows, fields, batch_size=len(rows))
+        return len(converted_rows)
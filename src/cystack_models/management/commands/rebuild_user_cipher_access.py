@@ -0,0 +1,37 @@
+from django.core.management import BaseCommand
+
+from core.settings import CORE_CONFIG
+from cystack_models.models import *
+
+
+class Command(BaseCommand):
+    help = "Repair the cipher access index (cs_user_cipher_access): rebuild it from scratch and verify it"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user_ids", type=str, default=None, help="Comma-separated user ids")
+        parser.add_argument("--verify_only", action="store_true", help="Only verify the current index")
+        parser.add_argument("--batch_size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        cipher_repository = CORE_CONFIG["repositories"]["ICipherRepository"]()
+        users = User.objects.filter(activated=True).order_by('user_id')
+        if options["user_ids"]:
+            users = users.filter(user_id__in=[int(user_id) for user_id in options["user_ids"].split(",")])
+        user_ids = list(users.values_list('user_id', flat=True))
+        batch_size = options["batch_size"]
+
+        num_indexed = 0
+        invalid_user_ids = []
+        for i in range(0, len(user_ids), batch_size):
+            for user in User.objects.filter(user_id__in=user_ids[i:i + batch_size]):
+                if not options["verify_only"]:
+                    num_indexed += cipher_repository.rebuild_user_cipher_access(user=user)
+                missing_access, redundant_access = cipher_repository.verify_user_cipher_access(user=user)
+                if missing_access or redundant_access:
+                    invalid_user_ids.append(user.user_id)
+                    self.stdout.write(
+                        f"[!] User {user.user_id}: {len(missing_access)} missing, {len(redundant_access)} redundant"
+                    )
+            self.stdout.write(f"Done {min(i + batch_size, len(user_ids))}/{len(user_ids)} users")
+
+        self.stdout.write(f"Indexed ciphers: {num_indexed}. Invalid users: {len(invalid_user_ids)}")
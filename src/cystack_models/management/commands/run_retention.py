@@ -0,0 +1,27 @@
+from django.core.management import BaseCommand
+
+from shared.utils.retention import RetentionEngine, RETENTION_CHUNK_SIZE, RETENTION_ROWS_PER_SECOND, \
+    get_retention_policies
+
+
+class Command(BaseCommand):
+    """
+    Run the retention policies of the cron tasks by hand. With --dry_run, only count the expired rows of each policy
+    """
+    help = "Delete (or count) the expired events, trashed ciphers and sync tombstones"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--policy", type=str, default="", help="Only run this policy")
+        parser.add_argument("--dry_run", action="store_true")
+        parser.add_argument("--chunk_size", type=int, default=RETENTION_CHUNK_SIZE)
+        parser.add_argument("--rows_per_second", type=int, default=RETENTION_ROWS_PER_SECOND)
+
+    def handle(self, *args, **options):
+        for policy in get_retention_policies():
+            if options["policy"] and policy.name != options["policy"]:
+                continue
+            engine = RetentionEngine(
+                policy=policy, chunk_size=options["chunk_size"], rows_per_second=options["rows_per_second"]
+            )
+            result = engine.run(dry_run=options["dry_run"])
+            self.stdout.write(f"[{policy.name}] {result}")
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.22 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cystack_models', '0114_promocode_only_plan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(max_length=16)),
+                ('object_id', models.CharField(max_length=128)),
+                ('user_id', models.IntegerField(null=True)),
+                ('team_id', models.CharField(max_length=128, null=True)),
+                ('deleted_date', models.FloatField()),
+            ],
+            options={
+                'db_table': 'cs_sync_tombstones',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['user_id', 'deleted_date'], name='cs_sync_tom_user_id_5f0c1e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='synctombstone',
+            index=models.Index(fields=['team_id', 'deleted_date'], name='cs_sync_tom_team_id_a3b7d2_idx'),
+        ),
+    ]
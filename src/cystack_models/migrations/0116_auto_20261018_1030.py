@@ -0,0 +1,34 @@
+# Generated by Django 3.2.22 on 2026-10-18 10:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cystack_models', '0115_synctombstone'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='cipher_access_date',
+            field=models.FloatField(default=None, null=True),
+        ),
+        migrations.CreateModel(
+            name='UserCipherAccess',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('can_edit', models.BooleanField(default=False)),
+                ('can_delete', models.BooleanField(default=False)),
+                ('view_password', models.BooleanField(default=True)),
+                ('cipher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_cipher_access', to='cystack_models.cipher')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_cipher_access', to='cystack_models.user')),
+            ],
+            options={
+                'db_table': 'cs_user_cipher_access',
+                'unique_together': {('user', 'cipher')},
+            },
+        ),
+    ]
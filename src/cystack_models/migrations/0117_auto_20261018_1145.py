@@ -0,0 +1,34 @@
+# Generated by Django 3.2.22 on 2026-10-18 11:45
+
+import cystack_models.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cystack_models', '0116_auto_20261018_1030'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cipher',
+            name='data',
+            field=cystack_models.models.fields.JSONTextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='cipher',
+            name='favorites',
+            field=cystack_models.models.fields.JSONTextField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='cipher',
+            name='folders',
+            field=cystack_models.models.fields.JSONTextField(blank=True, default='', null=True),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='metadata',
+            field=cystack_models.models.fields.JSONTextField(blank=True, default=None, max_length=512, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.22 on 2026-10-18 13:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cystack_models', '0117_auto_20261018_1145'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CipherUserState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('favorite', models.BooleanField(default=False)),
+                ('cipher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cipher_user_states', to='cystack_models.cipher')),
+                ('folder', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cipher_user_states', to='cystack_models.folder')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cipher_user_states', to='cystack_models.user')),
+            ],
+            options={
+                'db_table': 'cs_cipher_user_states',
+                'unique_together': {('cipher', 'user')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='cipheruserstate',
+            index=models.Index(fields=['user', 'folder'], name='cs_cipher_u_user_id_8d2f4b_idx'),
+        ),
+    ]
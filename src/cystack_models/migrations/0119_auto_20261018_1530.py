@@ -0,0 +1,21 @@
+# Generated by Django 3.2.22 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cystack_models', '0118_cipheruserstate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['creation_date'], name='cs_events_creatio_d29524_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cipher',
+            index=models.Index(fields=['deleted_date'], name='cs_ciphers_deleted_242398_idx'),
+        ),
+    ]
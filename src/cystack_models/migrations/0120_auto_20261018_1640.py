@@ -0,0 +1,25 @@
+# Generated by Django 3.2.22 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cystack_models', '0119_auto_20261018_1530'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['team_id', 'creation_date'], name='cs_events_team_id_b2398b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['team_id', 'acting_user_id', 'creation_date'], name='cs_events_team_id_ee73e6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['team_id', 'user_id', 'creation_date'], name='cs_events_team_id_88ef10_idx'),
+        ),
+    ]
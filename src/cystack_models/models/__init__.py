@@ -36,11 +36,14 @@ from cystack_models.models.payments.payments import Payment
 from cystack_models.models.payments.payment_items import PaymentItem
 
 from cystack_models.models.ciphers.folders import Folder
+from cystack_models.models.ciphers.sync_tombstones import SyncTombstone
 
 
 # ------------------------ Sharing Models ----------------------------- #
 from cystack_models.models.teams.teams import Team
 from cystack_models.models.ciphers.ciphers import Cipher
+from cystack_models.models.ciphers.user_cipher_access import UserCipherAccess
+from cystack_models.models.ciphers.cipher_user_states import CipherUserState
 from cystack_models.models.members.member_roles import MemberRole
 from cystack_models.models.members.team_members import TeamMember
 from cystack_models.models.teams.collections import Collection
@@ -0,0 +1,80 @@
+from django.db import models
+
+from cystack_models.models.users.users import User
+from cystack_models.models.ciphers.ciphers import Cipher
+from cystack_models.models.ciphers.folders import Folder
+
+
+class CipherUserState(models.Model):
+    """
+    The folder and the favorite flag of a cipher for each user who can access it.
+    It replaces the string-encoded `Cipher.folders` and `Cipher.favorites` dicts
+    """
+    cipher = models.ForeignKey(Cipher, on_delete=models.CASCADE, related_name="cipher_user_states")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="cipher_user_states")
+    folder = models.ForeignKey(Folder, on_delete=models.SET_NULL, related_name="cipher_user_states", null=True)
+    favorite = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'cs_cipher_user_states'
+        unique_together = ('cipher', 'user')
+        indexes = [
+            models.Index(fields=['user', 'folder']),
+        ]
+
+    @classmethod
+    def update_or_create_state(cls, cipher: Cipher, user_id, **state_data):
+        """
+        Update the state of the cipher for the user. The new state is initialized from the legacy columns
+        :param cipher: (obj) Cipher object
+        :param user_id: (int) The user id
+        :param state_data: (dict) {"folder_id", "favorite"}
+        :return:
+        """
+        if user_id is None:
+            return
+        if cls.objects.filter(cipher_id=cipher.id, user_id=user_id).update(**state_data):
+            return
+        folder_id = state_data.get("folder_id", cipher.get_folders().get(user_id))
+        if folder_id and not Folder.objects.filter(id=folder_id, user_id=user_id).exists():
+            folder_id = None
+        cls.objects.bulk_create([cls(
+            cipher_id=cipher.id,
+            user_id=user_id,
+            folder_id=folder_id,
+            favorite=state_data.get("favorite", cipher.get_favorites().get(user_id, False)) or False
+        )], ignore_conflicts=True)
+
+    @classmethod
+    def create_multiple(cls, *states_data):
+        """
+        Create the states of multiple ciphers. The existed states are kept
+        :param states_data: (list) List dict {"cipher_id", "user_id", "folder_id", "favorite"}
+        :return:
+        """
+        states = []
+        for state_data in states_data:
+            states.append(cls(
+                cipher_id=state_data.get("cipher_id"),
+                user_id=state_data.get("user_id"),
+                folder_id=state_data.get("folder_id"),
+                favorite=state_data.get("favorite", False) or False
+            ))
+        cls.objects.bulk_create(states, ignore_conflicts=True, batch_size=1000)
+
+    @classmethod
+    def bulk_set_folder(cls, user_id, cipher_ids, folder_id=None):
+        """
+        Move multiple ciphers of the user into the folder: a bulk insert of the missing states and one update
+        """
+        cls.create_multiple(*[
+            {"cipher_id": cipher_id, "user_id": user_id, "folder_id": folder_id} for cipher_id in cipher_ids
+        ])
+        cls.objects.filter(user_id=user_id, cipher_id__in=cipher_ids).update(folder_id=folder_id)
+
+    @classmethod
+    def bulk_set_favorite(cls, user_id, cipher_ids, favorite=False):
+        cls.create_multiple(*[
+            {"cipher_id": cipher_id, "user_id": user_id, "favorite": favorite} for cipher_id in cipher_ids
+        ])
+        cls.objects.filter(user_id=user_id, cipher_id__in=cipher_ids).update(favorite=favorite)
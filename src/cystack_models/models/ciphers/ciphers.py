@@ -1,13 +1,13 @@
-import ast
 import uuid
 
 from django.db import models
 
+from cystack_models.models.fields import JSONTextField, ParsedFieldsMixin
 from cystack_models.models.teams.teams import Team
 from cystack_models.models.users.users import User
 
 
-class Cipher(models.Model):
+class Cipher(ParsedFieldsMixin, models.Model):
     id = models.CharField(primary_key=True, max_length=128, default=uuid.uuid4)
     creation_date = models.FloatField()
     revision_date = models.FloatField()
@@ -18,9 +18,9 @@ class Cipher(models.Model):
 
     score = models.FloatField(default=0)
     type = models.IntegerField()
-    data = models.TextField(blank=True, null=True)
-    favorites = models.TextField(blank=True, null=True)
-    folders = models.TextField(blank=True, null=True, default="")
+    data = JSONTextField(blank=True, null=True)
+    favorites = JSONTextField(blank=True, null=True)
+    folders = JSONTextField(blank=True, null=True, default="")
 
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="ciphers", null=True)
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name="ciphers", null=True)
@@ -28,30 +28,33 @@ class Cipher(models.Model):
 
     class Meta:
         db_table = 'cs_ciphers'
+        indexes = [
+            models.Index(fields=['deleted_date']),
+        ]
 
     def get_data(self):
-        if not self.data:
-            return {}
-        return ast.literal_eval(str(self.data))
+        return self.get_parsed_field("data")
 
     def get_favorites(self):
-        if not self.favorites:
-            return {}
-        return ast.literal_eval(str(self.favorites))
+        """
+        The favorite flags of the users: the legacy `favorites` column overridden by the CipherUserState rows
+        """
+        favorites = dict(self.get_parsed_field("favorites", int_keys=True))
+        for state in self.cipher_user_states.all():
+            favorites[state.user_id] = state.favorite
+        return favorites
 
     def set_favorite(self, user_id, is_favorite=False):
-        favorites = self.get_favorites()
-        favorites[user_id] = is_favorite
-        self.favorites = favorites
-        self.save()
+        self.cipher_user_states.model.update_or_create_state(self, user_id, favorite=is_favorite)
 
     def get_folders(self):
-        if not self.folders:
-            return {}
-        return ast.literal_eval(str(self.folders))
+        """
+        The folder ids of the users: the legacy `folders` column overridden by the CipherUserState rows
+        """
+        folders = dict(self.get_parsed_field("folders", int_keys=True))
+        for state in self.cipher_user_states.all():
+            folders[state.user_id] = state.folder_id
+        return folders
 
     def set_folder(self, user_id, folder_id=None):
-        folders = self.get_folders()
-        folders[user_id] = folder_id
-        self.folders = folders
-        self.save()
+        self.cipher_user_states.model.update_or_create_state(self, user_id, folder_id=folder_id)
@@ -0,0 +1,66 @@
+from django.db import models
+
+from shared.constants.ciphers import SYNC_TOMBSTONE_ACCESS, SYNC_TOMBSTONE_ACCESS_GAIN
+from shared.utils.app import now
+
+
+class SyncTombstone(models.Model):
+    """
+    Records the hard-deleted ciphers, folders and collections, so the delta sync can tell clients to drop them.
+    The access tombstones record the users who lost or got the access to a team
+    """
+    object_type = models.CharField(max_length=16)
+    object_id = models.CharField(max_length=128)
+    user_id = models.IntegerField(null=True)
+    team_id = models.CharField(max_length=128, null=True)
+    deleted_date = models.FloatField()
+
+    class Meta:
+        db_table = 'cs_sync_tombstones'
+        indexes = [
+            models.Index(fields=['user_id', 'deleted_date']),
+            models.Index(fields=['team_id', 'deleted_date']),
+        ]
+
+    @classmethod
+    def create_multiple(cls, object_type: str, *objects_data):
+        """
+        Create tombstones of the deleted objects
+        :param object_type: (str) cipher, folder, collection
+        :param objects_data: (list) List dict {"id", "user_id", "team_id"}
+        :return:
+        """
+        deleted_date = now()
+        tombstones = []
+        for object_data in objects_data:
+            tombstones.append(cls(
+                object_type=object_type,
+                object_id=object_data.get("id"),
+                user_id=object_data.get("user_id"),
+                team_id=object_data.get("team_id"),
+                deleted_date=deleted_date
+            ))
+        cls.objects.bulk_create(tombstones, batch_size=1000)
+
+    @classmethod
+    def create_access_revocations(cls, team_id: str, *user_ids):
+        """
+        Record that the users lost the access to the team. The tombstones are bound to the users only (not to the team),
+        so the removed members still see them
+        :param team_id: (str) The team id
+        :param user_ids: (list) The user ids
+        """
+        cls.create_multiple(SYNC_TOMBSTONE_ACCESS, *[
+            {"id": team_id, "user_id": user_id} for user_id in set(user_ids) if user_id
+        ])
+
+    @classmethod
+    def create_access_grants(cls, team_id: str, *user_ids):
+        """
+        Record that the users got or changed the access to some ciphers of the team
+        :param team_id: (str) The team id
+        :param user_ids: (list) The user ids
+        """
+        cls.create_multiple(SYNC_TOMBSTONE_ACCESS_GAIN, *[
+            {"id": team_id, "user_id": user_id} for user_id in set(user_ids) if user_id
+        ])
@@ -0,0 +1,174 @@
+from django.db import models, transaction
+
+from shared.constants.members import *
+from cystack_models.models.users.users import User
+from cystack_models.models.ciphers.ciphers import Cipher
+
+
+class UserCipherAccess(models.Model):
+    """
+    The materialized index of the ciphers which a user can access.
+    The rows are updated at the write points which change the access: the cipher create/update/share, the team members,
+    their groups and collections. The rows of the deleted ciphers and users are deleted by cascade
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="user_cipher_access")
+    cipher = models.ForeignKey(Cipher, on_delete=models.CASCADE, related_name="user_cipher_access")
+    can_edit = models.BooleanField(default=False)
+    can_delete = models.BooleanField(default=False)
+    view_password = models.BooleanField(default=True)
+
+    class Meta:
+        db_table = 'cs_user_cipher_access'
+        unique_together = ('user', 'cipher')
+
+    @classmethod
+    def refresh_ciphers(cls, *cipher_ids):
+        """
+        Rebuild the access rows of the ciphers for all users, e.g. after a cipher is created, shared or moved
+        to other collections
+        :param cipher_ids: (list) The cipher ids
+        :return:
+        """
+        cipher_ids = list({cipher_id for cipher_id in cipher_ids if cipher_id})
+        if not cipher_ids:
+            return
+        user_cipher_access = []
+        team_cipher_ids = {}
+        ciphers = Cipher.objects.filter(id__in=cipher_ids).values_list('id', 'user_id', 'team_id')
+        for cipher_id, user_id, team_id in ciphers:
+            if team_id:
+                team_cipher_ids.setdefault(team_id, []).append(cipher_id)
+            elif user_id:
+                user_cipher_access.append(cls(
+                    user_id=user_id, cipher_id=cipher_id, can_edit=True, can_delete=True, view_password=True
+                ))
+        for team_id, ids in team_cipher_ids.items():
+            user_cipher_access += cls.build_team_access(team_id=team_id, cipher_ids=ids)
+        with transaction.atomic():
+            cls.objects.filter(cipher_id__in=cipher_ids).delete()
+            cls.objects.bulk_create(user_cipher_access, batch_size=1000, ignore_conflicts=True)
+
+    @classmethod
+    def refresh_team_members(cls, team_id, *user_ids):
+        """
+        Rebuild the access rows of the users to the ciphers of the team, e.g. after their membership, role, groups or
+        collections changed. The users who are not confirmed members of the team anymore lose their rows.
+        The users who got new or changed rows are recorded by the access gain tombstones, so their delta sync falls
+        back to the full sync
+        :param team_id: (str) The team id
+        :param user_ids: (list) The user ids
+        :return:
+        """
+        from cystack_models.models.ciphers.sync_tombstones import SyncTombstone
+
+        user_ids = list({user_id for user_id in user_ids if user_id})
+        if not team_id or not user_ids:
+            return
+        user_cipher_access = cls.build_team_access(team_id=team_id, user_ids=user_ids)
+        with transaction.atomic():
+            old_user_cipher_access = cls.objects.filter(user_id__in=user_ids, cipher__team_id=team_id)
+            old_permissions = {
+                (user_id, cipher_id): (can_edit, can_delete, view_password)
+                for user_id, cipher_id, can_edit, can_delete, view_password in old_user_cipher_access.values_list(
+                    'user_id', 'cipher_id', 'can_edit', 'can_delete', 'view_password'
+                )
+            }
+            gained_user_ids = {
+                access.user_id for access in user_cipher_access
+                if old_permissions.get((access.user_id, access.cipher_id)) !=
+                (access.can_edit, access.can_delete, access.view_password)
+            }
+            old_user_cipher_access.delete()
+            cls.objects.bulk_create(user_cipher_access, batch_size=1000, ignore_conflicts=True)
+            if gained_user_ids:
+                SyncTombstone.create_access_grants(team_id, *gained_user_ids)
+
+    @classmethod
+    def refresh_team(cls, team_id):
+        """
+        Rebuild the access rows of all members of the team, e.g. after a collection or a group of the team changed
+        :param team_id: (str) The team id
+        :return:
+        """
+        from cystack_models.models.members.team_members import TeamMember
+
+        user_ids = set(TeamMember.objects.filter(team_id=team_id).values_list('user_id', flat=True))
+        user_ids.update(cls.objects.filter(cipher__team_id=team_id).values_list('user_id', flat=True).distinct())
+        cls.refresh_team_members(team_id, *user_ids)
+
+    @classmethod
+    def build_team_access(cls, team_id, cipher_ids=None, user_ids=None):
+        """
+        Resolve the access rows of the confirmed members to the team ciphers by a fixed number of queries.
+        The rules are the same as `CipherRepository.get_user_team_access`
+        :param team_id: (str) The team id
+        :param cipher_ids: (list) Only these ciphers of the team. None => All ciphers
+        :param user_ids: (list) Only these members of the team. None => All members
+        :return: (list) List UserCipherAccess objects
+        """
+        from cystack_models.models.members.team_members import TeamMember
+        from cystack_models.models.teams.collections_ciphers import CollectionCipher
+        from cystack_models.models.teams.collections_members import CollectionMember
+        from cystack_models.models.teams.groups_members import GroupMember
+
+        members = TeamMember.objects.filter(team_id=team_id, status=PM_MEMBER_STATUS_CONFIRMED, user_id__isnull=False)
+        if user_ids is not None:
+            members = members.filter(user_id__in=list(user_ids))
+        members = list(members.values('id', 'user_id', 'role_id', 'hide_passwords', 'team__personal_share'))
+        if not members:
+            return []
+        ciphers = Cipher.objects.filter(team_id=team_id)
+        collection_ciphers = CollectionCipher.objects.filter(cipher__team_id=team_id)
+        if cipher_ids is not None:
+            ciphers = ciphers.filter(id__in=list(cipher_ids))
+            collection_ciphers = collection_ciphers.filter(cipher_id__in=list(cipher_ids))
+        team_cipher_ids = list(ciphers.values_list('id', flat=True))
+        if not team_cipher_ids:
+            return []
+
+        member_ids = [member["id"] for member in members]
+        access_all_member_ids = set(GroupMember.objects.filter(
+            member_id__in=member_ids, group__access_all=True
+        ).values_list('member_id', flat=True))
+        member_collections = {}
+        for member_id, collection_id, hide_passwords in CollectionMember.objects.filter(
+                member_id__in=member_ids).values_list('member_id', 'collection_id', 'hide_passwords'):
+            member_collections.setdefault(member_id, {})[collection_id] = hide_passwords
+        cipher_collections = {}
+        if member_collections:
+            for cipher_id, collection_id in collection_ciphers.values_list('cipher_id', 'collection_id'):
+                cipher_collections.setdefault(cipher_id, set()).add(collection_id)
+
+        # A user may have several memberships of the team, their permissions are merged
+        user_cipher_access = {}
+        for member in members:
+            role_id = member["role_id"]
+            personal_share = member["team__personal_share"] is True
+            full_access = role_id in [MEMBER_ROLE_OWNER, MEMBER_ROLE_ADMIN] or personal_share or \
+                member["id"] in access_all_member_ids
+            hide_team_passwords = role_id == MEMBER_ROLE_MEMBER and personal_share and member["hide_passwords"] is True
+            collections = member_collections.get(member["id"], {})
+            hide_password_collection_ids = {
+                collection_id for collection_id, hide_passwords in collections.items()
+                if hide_passwords is True and role_id == MEMBER_ROLE_MEMBER
+            }
+            for cipher_id in team_cipher_ids:
+                cipher_collection_ids = cipher_collections.get(cipher_id, set())
+                if not full_access and not cipher_collection_ids.intersection(collections):
+                    continue
+                view_password = not hide_team_passwords and not cipher_collection_ids & hide_password_collection_ids
+                access = user_cipher_access.get((member["user_id"], cipher_id))
+                if access is None:
+                    user_cipher_access[(member["user_id"], cipher_id)] = cls(
+                        user_id=member["user_id"], cipher_id=cipher_id,
+                        can_edit=role_id in [MEMBER_ROLE_OWNER, MEMBER_ROLE_ADMIN, MEMBER_ROLE_MANAGER],
+                        can_delete=role_id == MEMBER_ROLE_OWNER,
+                        view_password=view_password
+                    )
+                else:
+                    access.can_edit = access.can_edit or role_id in [
+                        MEMBER_ROLE_OWNER, MEMBER_ROLE_ADMIN, MEMBER_ROLE_MANAGER
+                    ]
+                    access.can_delete = access.can_delete or role_id == MEMBER_ROLE_OWNER
+                    access.view_password = access.view_password and view_password
+        return list(user_cipher_access.values())
@@ -1,6 +1,8 @@
 from django.db import models
 
 from cystack_models.models.events.events import Event
+from shared.caching.entitlements_cache import delete_enterprise_entitlements_cache
+from shared.caching.login_policy_cache import delete_enterprise_login_policy_snapshots
 from shared.constants.enterprise_members import E_MEMBER_STATUS_CONFIRMED
 from shared.constants.event import EVENT_E_MEMBER_CONFIRMED, EVENT_E_MEMBER_ENABLED, EVENT_E_MEMBER_REMOVED, \
     EVENT_E_MEMBER_DISABLED
@@ -90,6 +92,8 @@ class Enterprise(models.Model):
             self.init_seats = None
             self.init_seats_expired_time = None
         self.save()
+        delete_enterprise_login_policy_snapshots(self.id)
+        delete_enterprise_entitlements_cache(self.id)
 
     def delete_complete(self):
         enterprise_id = self.id
@@ -99,6 +103,8 @@ class Enterprise(models.Model):
         Event.objects.filter(team_id=enterprise_id).delete()
 
     def clear_data(self):
+        delete_enterprise_login_policy_snapshots(self.id)
+        delete_enterprise_entitlements_cache(self.id)
         self.enterprise_members.order_by('id').delete()
         self.policies.order_by('id').delete()
         self.domains.all().order_by('id').delete()
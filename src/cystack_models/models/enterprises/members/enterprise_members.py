@@ -5,6 +5,8 @@ import jwt
 from django.conf import settings
 from django.db import models
 
+from shared.caching.entitlements_cache import delete_entitlements_cache
+from shared.caching.login_policy_cache import delete_login_policy_snapshots
 from shared.constants.token import TOKEN_EXPIRED_TIME_INVITE_MEMBER, TOKEN_TYPE_INVITE_MEMBER, TOKEN_PREFIX
 from shared.utils.app import now
 from shared.constants.enterprise_members import *
@@ -35,6 +37,19 @@ class EnterpriseMember(models.Model):
         db_table = 'e_members'
         unique_together = ('user', 'enterprise', 'role')
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The login policies and the entitlements of the user depend on their memberships
+        delete_login_policy_snapshots(self.user_id)
+        delete_entitlements_cache(self.user_id)
+
+    def delete(self, *args, **kwargs):
+        user_id = self.user_id
+        result = super().delete(*args, **kwargs)
+        delete_login_policy_snapshots(user_id)
+        delete_entitlements_cache(user_id)
+        return result
+
     @classmethod
     def create_multiple(cls, enterprise: Enterprise, *members: [Dict]):
         for member in members:
@@ -1,13 +1,13 @@
-import ast
 import json
 import uuid
 
 from django.db import models
 
+from cystack_models.models.fields import JSONTextField, ParsedFieldsMixin
 from shared.utils.app import now
 
 
-class Event(models.Model):
+class Event(ParsedFieldsMixin, models.Model):
     id = models.CharField(primary_key=True, max_length=128, default=uuid.uuid4)
     type = models.CharField(max_length=16)
     acting_user_id = models.IntegerField(null=True)
@@ -24,14 +24,30 @@ class Event(models.Model):
     provider_id = models.CharField(max_length=128, null=True)
     team_provider_id = models.CharField(max_length=128, null=True)
     user_provider_id = models.CharField(max_length=128, null=True)
-    metadata = models.TextField(max_length=512, null=True, blank=True, default=None)
+    metadata = JSONTextField(max_length=512, null=True, blank=True, default=None)
 
     class Meta:
         db_table = 'cs_events'
+        indexes = [
+            models.Index(fields=['creation_date']),
+            # The activity logs of an enterprise are paged by (creation_date, id), the id is the implicit last column
+            models.Index(fields=['team_id', 'creation_date']),
+            models.Index(fields=['team_id', 'acting_user_id', 'creation_date']),
+            models.Index(fields=['team_id', 'user_id', 'creation_date']),
+        ]
 
     @classmethod
     def create(cls, **data):
-        new_event = cls(
+        new_event = cls.build(**data)
+        new_event.save()
+        return new_event
+
+    @classmethod
+    def build(cls, **data):
+        """
+        Init a new event object without saving it
+        """
+        return cls(
             type=data["type"],
             acting_user_id=data.get("acting_user_id", data.get("user_id")),
             user_id=data.get("user_id"),
@@ -48,8 +64,6 @@ class Event(models.Model):
             team_provider_id=data.get("team_provider_id"),
             user_provider_id=data.get("user_provider_id")
         )
-        new_event.save()
-        return new_event
 
     @classmethod
     def create_multiple_by_team_ids(cls, team_ids: list, **data):
@@ -123,9 +137,7 @@ class Event(models.Model):
         cls.objects.bulk_create(events, ignore_conflicts=True)
 
     def get_metadata(self):
-        if not self.metadata:
-            return {}
-        return ast.literal_eval(str(self.metadata))
+        return self.get_parsed_field("metadata")
 
     def get_normalizer_metadata(self):
         metadata = self.get_metadata()
@@ -0,0 +1,62 @@
+import ast
+import json
+
+from django.db import models
+
+
+def parse_json_text(value, int_keys=False):
+    """
+    Parse the value of a JSONTextField.
+    The legacy rows were stored as Python literals (`str(dict)`), so they are parsed by `ast.literal_eval`
+    until the `migrate_json_text_fields` command converts them
+    :param value: (str|dict|list) The raw value of the field
+    :param int_keys: (bool) Convert the digit keys to int. JSON objects only have string keys
+    :return: (dict|list)
+    """
+    if not value:
+        return {}
+    if isinstance(value, (dict, list)):
+        return value
+    try:
+        parsed_value = json.loads(value)
+    except ValueError:
+        parsed_value = ast.literal_eval(str(value))
+    if int_keys and isinstance(parsed_value, dict):
+        parsed_value = {int(k) if isinstance(k, str) and k.isdigit() else k: v for k, v in parsed_value.items()}
+    return parsed_value
+
+
+def is_json_text(value):
+    if not value or not isinstance(value, str):
+        return True
+    try:
+        json.loads(value)
+        return True
+    except ValueError:
+        return False
+
+
+class JSONTextField(models.TextField):
+    """
+    A TEXT column which stores dicts and lists as JSON
+    """
+    def get_prep_value(self, value):
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        return super().get_prep_value(value)
+
+
+class ParsedFieldsMixin:
+    """
+    Memoize the parsed values of the JSONTextField fields per instance.
+    The memo is dropped when the raw value of the field is re-assigned
+    """
+    def get_parsed_field(self, field_name, int_keys=False):
+        raw_value = getattr(self, field_name)
+        parsed_fields = self.__dict__.setdefault("_parsed_fields", {})
+        parsed_field = parsed_fields.get(field_name)
+        if parsed_field is not None and parsed_field[0] is raw_value:
+            return parsed_field[1]
+        parsed_value = parse_json_text(raw_value, int_keys=int_keys)
+        parsed_fields[field_name] = (raw_value, parsed_value)
+        return parsed_value
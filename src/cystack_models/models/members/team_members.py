@@ -5,6 +5,8 @@ from django.db import models
 
 from shared.utils.app import now
 from shared.constants.members import *
+from cystack_models.models.ciphers.sync_tombstones import SyncTombstone
+from cystack_models.models.ciphers.user_cipher_access import UserCipherAccess
 from cystack_models.models.users.users import User
 from cystack_models.models.teams.teams import Team
 from cystack_models.models.members.member_roles import MemberRole
@@ -34,6 +36,34 @@ class TeamMember(models.Model):
         db_table = 'cs_team_members'
         unique_together = ('user', 'team', 'role')
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        member = super().from_db(db, field_names, values)
+        # Keep the loaded access fields, so `save()` only refreshes the cipher access index when they change
+        member._loaded_access = member.get_access_fields()
+        return member
+
+    def get_access_fields(self):
+        return self.__dict__.get("user_id"), self.__dict__.get("status"), self.__dict__.get("role_id"), \
+            self.__dict__.get("hide_passwords")
+
+    def save(self, *args, **kwargs):
+        loaded_access = getattr(self, "_loaded_access", None)
+        super().save(*args, **kwargs)
+        access = self.get_access_fields()
+        if access != loaded_access:
+            self._loaded_access = access
+            user_ids = [access[0], loaded_access[0] if loaded_access else None]
+            UserCipherAccess.refresh_team_members(self.team_id, *user_ids)
+
+    def delete(self, *args, **kwargs):
+        team_id, user_id = self.team_id, self.user_id
+        result = super().delete(*args, **kwargs)
+        # The removed member must drop the team items on the next delta sync
+        SyncTombstone.create_access_revocations(team_id, user_id)
+        UserCipherAccess.refresh_team_members(team_id, user_id)
+        return result
+
     @classmethod
     def create_multiple(cls, team: Team, *members: [Dict]):
         """
@@ -5,6 +5,7 @@ from django.db import models
 from django.conf import settings
 from django.db.models import F
 
+from shared.caching.user_statistic_changes import record_user_statistic_changes, USER_STATISTIC_SOURCE_PAYMENTS
 from shared.constants.transactions import *
 from shared.utils.app import now
 from cystack_models.models.users.users import User
@@ -48,6 +49,10 @@ class Payment(models.Model):
             models.Index(fields=['status', ]),
         ]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_PAYMENTS, self.user_id)
+
     @classmethod
     def create(cls, **data):
         user = data["user"]
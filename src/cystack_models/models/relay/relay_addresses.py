@@ -7,6 +7,8 @@ from cystack_models.models.relay.relay_domains import RelayDomain
 from cystack_models.models.relay.relay_subdomains import RelaySubdomain
 from cystack_models.models.relay.deleted_relay_addresses import DeletedRelayAddress
 from cystack_models.models.users.users import User
+from shared.caching.user_statistic_changes import record_user_statistic_changes, \
+    USER_STATISTIC_SOURCE_RELAY_ADDRESSES
 from shared.constants.relay_address import DEFAULT_RELAY_DOMAIN, MAX_FREE_RElAY_DOMAIN
 from shared.constants.relay_blacklist import RELAY_BAD_WORDS, RELAY_BLOCKLISTED, RELAY_LOCKER_BLOCKED_CHARACTER
 from shared.utils.app import random_n_digit, now
@@ -38,6 +40,12 @@ class RelayAddress(models.Model):
     class Meta:
         db_table = 'cs_relay_addresses'
 
+    def save(self, *args, **kwargs):
+        is_created = self._state.adding
+        super().save(*args, **kwargs)
+        if is_created:
+            record_user_statistic_changes(USER_STATISTIC_SOURCE_RELAY_ADDRESSES, self.user_id)
+
     @property
     def full_address(self):
         if self.subdomain:
@@ -142,3 +150,4 @@ class RelayAddress(models.Model):
         deleted_address.save()
         # Remove relay address
         self.delete()
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_RELAY_ADDRESSES, self.user_id)
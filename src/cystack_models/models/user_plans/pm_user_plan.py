@@ -3,6 +3,8 @@ import stripe
 from django.conf import settings
 from django.db import models
 
+from shared.caching.entitlements_cache import delete_plan_owner_entitlements_cache
+from shared.caching.user_statistic_changes import record_user_statistic_changes, USER_STATISTIC_SOURCE_USER
 from shared.constants.transactions import *
 from shared.utils.app import now
 from cystack_models.interfaces.user_plans.user_plan import UserPlan
@@ -43,6 +45,12 @@ class PMUserPlan(UserPlan):
             models.Index(fields=['pm_mobile_subscription', ]),
         ]
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # The entitlements of the user and of their enterprise members depend on this plan
+        delete_plan_owner_entitlements_cache(self.user_id)
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_USER, self.user_id)
+
     @classmethod
     def update_or_create(cls, user, pm_plan_alias=PLAN_TYPE_PM_FREE, duration=DURATION_MONTHLY):
         """
@@ -2,6 +2,7 @@ import ast
 
 from django.db import models
 
+from shared.caching.user_statistic_changes import record_user_statistic_changes, USER_STATISTIC_SOURCE_DEVICES
 from shared.utils.app import now
 from cystack_models.models.users.users import User
 
@@ -40,6 +41,17 @@ class Device(models.Model):
         db_table = 'cs_devices'
         unique_together = ('device_identifier', 'user')
 
+    def save(self, *args, **kwargs):
+        is_created = self._state.adding
+        super().save(*args, **kwargs)
+        if is_created:
+            record_user_statistic_changes(USER_STATISTIC_SOURCE_DEVICES, self.user_id)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_DEVICES, self.user_id)
+        return result
+
     @classmethod
     def create(cls, user: User, **data):
         """
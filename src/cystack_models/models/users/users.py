@@ -8,6 +8,9 @@ from django.db import models
 from django.contrib.auth import password_validation
 from django.contrib.auth.hashers import check_password, is_password_usable, make_password
 
+from shared.caching.user_statistic_changes import record_user_statistic_changes, USER_STATISTIC_SOURCE_USER
+from shared.caching.user_profile_cache import get_cached_user_profiles, set_cached_user_profiles, \
+    USER_PROFILE_NAMESPACE, USER_PROFILE_BATCH_NAMESPACE
 from shared.constants.account import DEFAULT_KDF_ITERATIONS, LOGIN_METHOD_PASSWORD, LOGIN_METHOD_PASSWORDLESS, \
     DEFAULT_ONBOARDING_PROCESS
 from shared.constants.enterprise_members import E_MEMBER_STATUS_CONFIRMED
@@ -27,6 +30,8 @@ class User(models.Model):
     activated_date = models.FloatField(null=True)
     delete_account_date = models.FloatField(null=True)
     account_revision_date = models.FloatField(null=True)
+    # The time which the cipher access index of this user was built
+    cipher_access_date = models.FloatField(null=True, default=None)
     master_password = models.CharField(max_length=300, null=True)
     master_password_hint = models.CharField(max_length=128, blank=True, null=True, default="")
     master_password_score = models.FloatField(default=0)
@@ -80,6 +85,7 @@ class User(models.Model):
         if self._password is not None:
             password_validation.password_changed(self._password, self)
             self._password = None
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_USER, self.user_id)
 
     def set_master_password(self, raw_password):
         self.master_password = make_password(raw_password)
@@ -156,26 +162,47 @@ class User(models.Model):
 
     @classmethod
     def get_infor_by_user_ids(cls, user_ids):
+        """
+        Get the profiles of the users from the profile cache. Only the missing profiles are requested to API Gateway
+        :param user_ids: (list) List user ids
+        :return: (list) List profiles
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        cached_profiles = get_cached_user_profiles(USER_PROFILE_BATCH_NAMESPACE, user_ids)
+        missing_user_ids = [user_id for user_id in user_ids if user_id not in cached_profiles]
+        if not missing_user_ids:
+            return list(cached_profiles.values())
         url = "{}/micro_services/users".format(settings.GATEWAY_API)
         headers = {'Authorization': settings.MICRO_SERVICE_USER_AUTH}
-        data_send = {"ids": user_ids, "emails": []}
+        data_send = {"ids": missing_user_ids, "emails": []}
         res = requester(method="POST", url=url, headers=headers, data_send=data_send, retry=True)
-        if res.status_code == 200:
-            return res.json()
-        return []
+        if res.status_code != 200:
+            return list(cached_profiles.values())
+        profiles = res.json()
+        missing_user_ids_str = {str(user_id): user_id for user_id in missing_user_ids}
+        set_cached_user_profiles(USER_PROFILE_BATCH_NAMESPACE, {
+            missing_user_ids_str[str(profile.get("id"))]: profile for profile in profiles
+            if str(profile.get("id")) in missing_user_ids_str
+        })
+        return list(cached_profiles.values()) + profiles
 
     def get_from_cystack_id(self):
         """
-        Request to API Gateway to get user information
+        Get the user information from the profile cache or request to API Gateway
         :return:
         """
+        cached_profile = get_cached_user_profiles(USER_PROFILE_NAMESPACE, [self.user_id]).get(self.user_id)
+        if cached_profile is not None:
+            return cached_profile
         url = "{}/micro_services/users/{}".format(settings.GATEWAY_API, self.user_id)
         headers = {'Authorization': settings.MICRO_SERVICE_USER_AUTH}
         try:
             res = requester(method="GET", url=url, headers=headers)
             if res.status_code == 200:
                 try:
-                    return res.json()
+                    profile = res.json()
+                    set_cached_user_profiles(USER_PROFILE_NAMESPACE, {self.user_id: profile})
+                    return profile
                 except json.JSONDecodeError:
                     CyLog.error(**{"message": f"[!] User.get_from_cystack_id JSON Decode error: {res.url} {res.text}"})
                     return {}
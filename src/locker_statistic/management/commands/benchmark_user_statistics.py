@@ -0,0 +1,113 @@
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management import BaseCommand
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext
+
+from cystack_models.models.ciphers.ciphers import Cipher
+from cystack_models.models.users.devices import Device
+from cystack_models.models.users.users import User
+from locker_statistic.models.user_statistics import UserStatistic
+from locker_statistic.user_statistics_builder import CIPHER_TYPE_STATISTIC_FIELDS, USER_STATISTIC_BATCH_SIZE, \
+    build_users_statistic
+from shared.utils.app import now
+
+
+# The synthetic users are created from this user id, far from the real ones
+BENCHMARK_START_USER_ID = 1900000000
+
+
+class Command(BaseCommand):
+    """
+    Time the user statistics builder of the LockerStatistic cron on a synthetic dataset, e.g. --seed 1000000.
+    The profiles of the ID service are not requested, the statistics are built from the database only
+    """
+    help = "Benchmark the grouped aggregate user statistics builder"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Number of synthetic users to create")
+        parser.add_argument("--users", type=int, default=1000000, help="Number of synthetic users to benchmark")
+        parser.add_argument("--batch_size", type=int, default=USER_STATISTIC_BATCH_SIZE)
+        parser.add_argument("--workers", type=str, default="1,4,8")
+        parser.add_argument("--upsert", action="store_true", help="Also upsert the UserStatistic rows")
+        parser.add_argument("--cleanup", action="store_true", help="Delete the synthetic data at the end")
+
+    def handle(self, *args, **options):
+        if options["seed"]:
+            self.seed(num_users=options["seed"])
+        user_ids = list(User.objects.filter(
+            user_id__gte=BENCHMARK_START_USER_ID, user_id__lt=BENCHMARK_START_USER_ID + options["users"]
+        ).values_list('user_id', flat=True))
+        batch_size = options["batch_size"]
+        batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+        if not batches:
+            self.stdout.write("No synthetic users, run with --seed first")
+            return
+
+        with CaptureQueriesContext(connection) as queries:
+            self.build_batch(batches[0], upsert=False)
+        self.stdout.write(f"{len(queries.captured_queries)} queries/batch of {len(batches[0])} users")
+
+        for workers in [int(workers) for workers in options["workers"].split(",") if workers.strip()]:
+            start_time = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                num_users = sum(executor.map(lambda batch: self.build_batch(batch, options["upsert"]), batches))
+            run_time = time.perf_counter() - start_time
+            self.stdout.write(
+                f"[{workers} workers] {num_users} users in {run_time:.2f}s - {num_users / run_time:.0f} users/s"
+            )
+        if options["cleanup"]:
+            self.cleanup()
+
+    @staticmethod
+    def build_batch(user_ids, upsert):
+        try:
+            user_statistic_dicts = build_users_statistic(user_ids, users_from_id_dict={})
+            if upsert:
+                UserStatistic.bulk_update_or_create(
+                    common_keys={}, unique_key_name='user_id', unique_key_to_defaults=user_statistic_dicts,
+                    batch_size=500, ignore_conflicts=True
+                )
+            return len(user_statistic_dicts)
+        finally:
+            connections.close_all()
+
+    def seed(self, num_users, batch_size=5000):
+        current_time = now()
+        cipher_types = list(CIPHER_TYPE_STATISTIC_FIELDS)
+        device_clients = [("web", None), ("browser", None), ("desktop", None), ("mobile", 0), ("mobile", 1)]
+        for start in range(0, num_users, batch_size):
+            users, ciphers, devices = [], [], []
+            for user_id in range(BENCHMARK_START_USER_ID + start,
+                                 BENCHMARK_START_USER_ID + min(start + batch_size, num_users)):
+                users.append(User(user_id=user_id, creation_date=current_time, activated=True))
+                for _ in range(random.randint(0, 10)):
+                    ciphers.append(Cipher(
+                        id=str(uuid.uuid4()), creation_date=current_time, revision_date=current_time,
+                        type=random.choice(cipher_types), user_id=user_id, created_by_id=user_id
+                    ))
+                for client_id, device_type in random.sample(device_clients, random.randint(0, 3)):
+                    devices.append(Device(
+                        created_time=current_time, refresh_token=uuid.uuid4().hex, token_type="Bearer", scope="api",
+                        client_id=client_id, device_type=device_type, device_identifier=uuid.uuid4().hex,
+                        user_id=user_id
+                    ))
+            User.objects.bulk_create(users, batch_size=batch_size, ignore_conflicts=True)
+            Cipher.objects.bulk_create(ciphers, batch_size=batch_size)
+            Device.objects.bulk_create(devices, batch_size=batch_size)
+            self.stdout.write(f"Seeded {start + len(users)}/{num_users} users")
+
+    def cleanup(self, batch_size=5000):
+        synthetic_user_ids = User.objects.filter(user_id__gte=BENCHMARK_START_USER_ID).values_list('user_id', flat=True)
+        while True:
+            user_ids = list(synthetic_user_ids[:batch_size])
+            if not user_ids:
+                break
+            Cipher.objects.filter(created_by_id__in=user_ids).delete()
+            Device.objects.filter(user_id__in=user_ids).delete()
+            UserStatistic.objects.filter(user_id__in=user_ids).delete()
+            User.objects.filter(user_id__in=user_ids).delete()
+        self.stdout.write("Deleted the synthetic data")
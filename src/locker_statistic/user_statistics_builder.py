@@ -0,0 +1,349 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count, Sum, Min, Q
+
+from cystack_models.models.ciphers.ciphers import Cipher
+from cystack_models.models.payments.payments import Payment
+from cystack_models.models.relay.relay_addresses import RelayAddress
+from cystack_models.models.users.devices import Device
+from cystack_models.models.users.users import User
+from locker_statistic.models.user_statistics import UserStatistic
+from shared.caching.user_statistic_changes import *
+from shared.constants.ciphers import *
+from shared.constants.transactions import PAYMENT_STATUS_PAID
+from shared.external_request.requester import requester
+from shared.log.cylog import CyLog
+from shared.utils.app import datetime_from_ts
+
+
+USER_STATISTIC_BATCH_SIZE = 2000
+USER_STATISTIC_WORKERS = int(os.getenv("USER_STATISTIC_WORKERS", 4))
+USER_STATISTIC_RECONCILE_SAMPLE = int(os.getenv("USER_STATISTIC_RECONCILE_SAMPLE", 5000))
+
+# The UserStatistic field of the number of items of each cipher type
+CIPHER_TYPE_STATISTIC_FIELDS = {
+    CIPHER_TYPE_LOGIN: "num_password_items",
+    CIPHER_TYPE_NOTE: "num_note_items",
+    CIPHER_TYPE_IDENTITY: "num_identity_items",
+    CIPHER_TYPE_CARD: "num_card_items",
+    CIPHER_TYPE_CRYPTO_WALLET: "num_crypto_backup_items",
+    CIPHER_TYPE_TOTP: "num_totp_items",
+    CIPHER_TYPE_CRYPTO_ACCOUNT: "num_crypto_account_items",
+    CIPHER_TYPE_DRIVER_LICENSE: "num_driver_license_items",
+    CIPHER_TYPE_CITIZEN_ID: "num_citizen_id_items",
+    CIPHER_TYPE_PASSPORT: "num_passport_items",
+    CIPHER_TYPE_SOCIAL_SECURITY_NUMBER: "num_social_security_number_items",
+    CIPHER_TYPE_WIRELESS_ROUTER: "num_wireless_router",
+    CIPHER_TYPE_SERVER: "num_server_items",
+    CIPHER_TYPE_API: "num_api_items",
+    CIPHER_TYPE_DATABASE: "num_database_items",
+}
+
+
+def aggregate_cipher_statistics(user_ids):
+    """
+    Count the created ciphers of the users by type in one grouped query
+    :return: (dict) {user_id: {"total_items", "num_*_items"}}
+    """
+    statistics = {}
+    ciphers = Cipher.objects.filter(created_by_id__in=user_ids).order_by().values(
+        'created_by_id', 'type'
+    ).annotate(num_ciphers=Count('id'))
+    for cipher in ciphers:
+        user_statistics = statistics.setdefault(cipher["created_by_id"], {"total_items": 0})
+        user_statistics["total_items"] += cipher["num_ciphers"]
+        field = CIPHER_TYPE_STATISTIC_FIELDS.get(cipher["type"])
+        if field:
+            user_statistics[field] = cipher["num_ciphers"]
+    return statistics
+
+
+def aggregate_device_statistics(user_ids):
+    """
+    Find the platforms which the users used from their devices in one grouped query
+    :return: (dict) {user_id: {"use_web_app", "use_ios", "use_android", "use_extension", "use_desktop"}}
+    """
+    statistics = {}
+    devices = Device.objects.filter(user_id__in=user_ids).order_by().values(
+        'user_id', 'client_id', 'device_type'
+    ).distinct()
+    for device in devices:
+        user_statistics = statistics.setdefault(device["user_id"], {})
+        if device["client_id"] == "web":
+            user_statistics["use_web_app"] = True
+        elif device["client_id"] == "browser":
+            user_statistics["use_extension"] = True
+        elif device["client_id"] == "desktop":
+            user_statistics["use_desktop"] = True
+        if device["device_type"] == 1:
+            user_statistics["use_ios"] = True
+        elif device["device_type"] == 0:
+            user_statistics["use_android"] = True
+    return statistics
+
+
+def aggregate_payment_statistics(user_ids):
+    """
+    Sum the paid money, the first payment date and the paid platforms of the users in one grouped query
+    :return: (dict) {user_id: {"paid_money", "first_payment_date", "paid_platforms"}}
+    """
+    statistics = {}
+    payments = Payment.objects.filter(user_id__in=user_ids).order_by().values('user_id').annotate(
+        paid_money=Sum('total_price', filter=Q(status=PAYMENT_STATUS_PAID)),
+        first_payment_date=Min('created_time', filter=Q(total_price__gt=0, discount=0)),
+        web_paid_count=Count('id', filter=Q(status=PAYMENT_STATUS_PAID, stripe_invoice_id__isnull=False)),
+        ios_paid_count=Count('id', filter=Q(status=PAYMENT_STATUS_PAID, mobile_invoice_id__startswith="GPA.")),
+        android_paid_count=Count('id', filter=Q(status=PAYMENT_STATUS_PAID, mobile_invoice_id__regex=r'^\d+')),
+    )
+    for payment in payments:
+        paid_platforms = [
+            platform for platform in ["web", "ios", "android"] if payment[f"{platform}_paid_count"] > 0
+        ]
+        statistics[payment["user_id"]] = {
+            "paid_money": payment["paid_money"] or 0,
+            "first_payment_date": datetime_from_ts(payment["first_payment_date"]),
+            "paid_platforms": ",".join(paid_platforms),
+        }
+    return statistics
+
+
+def aggregate_private_email_statistics(user_ids):
+    """
+    :return: (dict) {user_id: {"num_private_emails"}}
+    """
+    relay_addresses = RelayAddress.objects.filter(user_id__in=user_ids).order_by().values('user_id').annotate(
+        num_private_emails=Count('id')
+    )
+    return {
+        relay_address["user_id"]: {"num_private_emails": relay_address["num_private_emails"]}
+        for relay_address in relay_addresses
+    }
+
+
+def get_users_from_id(user_ids):
+    """
+    Get the profiles of the users from the ID service
+    :return: (dict) {user_id: profile} or None if the request failed
+    """
+    url = "{}/micro_services/users".format(settings.GATEWAY_API)
+    headers = {'Authorization': settings.MICRO_SERVICE_USER_AUTH}
+    data_send = {"ids": list(user_ids), "emails": [], "lk_referral_count": True}
+    try:
+        res = requester(method="POST", url=url, headers=headers, data_send=data_send, timeout=180)
+        if res.status_code != 200:
+            CyLog.warning(**{"message": "[Cron] Get user data from ID error: {} {}".format(res.status_code, res.text)})
+            return None
+    except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout,
+            requests.exceptions.ReadTimeout):
+        CyLog.warning(**{"message": "[Cron] Get user data from ID error: REQUESTS exception"})
+        return None
+    users_from_id_data = res.json()
+    if not users_from_id_data or not isinstance(users_from_id_data, list):
+        return {}
+    return {u["id"]: u for u in users_from_id_data}
+
+
+def aggregate_user_statistics(user_ids):
+    """
+    The statistic fields of the user rows, their plans and their profiles from the ID service. If the ID service is not
+    available, the changes of the users are recorded again, so their profiles are refreshed by the next fold
+    :return: (dict) {user_id: the statistic fields of the user row, the plan and the profile}
+    """
+    users = User.objects.filter(user_id__in=user_ids).select_related('pm_user_plan__pm_plan')
+    users_from_id_dict = get_users_from_id(user_ids)
+    if users_from_id_dict is None:
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_USER, *user_ids)
+    statistics = {}
+    for user in users:
+        statistics[user.user_id] = get_user_statistic_fields(user)
+        if users_from_id_dict is not None:
+            statistics[user.user_id].update(get_user_profile_fields(user, users_from_id_dict.get(user.user_id) or {}))
+        elif user.delete_account_date:
+            statistics[user.user_id]["deleted_account"] = True
+    return statistics
+
+
+def get_user_profile_fields(user, user_from_id_data):
+    """
+    :param user_from_id_data: (dict) The profile of the user from the ID service
+    """
+    deleted_account = True if user.delete_account_date or user_from_id_data.get("is_deleting") \
+        or (not user_from_id_data.get("email")) else False
+    return {
+        "country": user_from_id_data.get("country"),
+        "verified": user_from_id_data.get("verified") or False,
+        "cs_created_date": datetime_from_ts(user_from_id_data.get("registered_time")),
+        "deleted_account": deleted_account,
+        "lk_referral_count": user_from_id_data.get("lk_referral_count") or 0,
+        "utm_source": user_from_id_data.get("utm_source"),
+    }
+
+
+def get_user_statistic_fields(user):
+    try:
+        pm_user_plan = user.pm_user_plan
+    except AttributeError:
+        pm_user_plan = None
+    return {
+        "created_master_password": user.activated,
+        "lk_created_date": datetime_from_ts(user.creation_date),
+        "lk_last_login": datetime_from_ts(user.last_request_login),
+        "lk_plan": pm_user_plan.pm_plan.name if pm_user_plan and pm_user_plan.pm_plan else "Free",
+        "personal_trial_mobile_applied": pm_user_plan.personal_trial_mobile_applied if pm_user_plan else False,
+        "personal_trial_web_applied": pm_user_plan.personal_trial_web_applied if pm_user_plan else False,
+    }
+
+
+CIPHER_STATISTIC_DEFAULTS = dict(total_items=0, **{field: 0 for field in CIPHER_TYPE_STATISTIC_FIELDS.values()})
+DEVICE_STATISTIC_DEFAULTS = {
+    "use_web_app": False, "use_android": False, "use_ios": False, "use_extension": False, "use_desktop": False
+}
+PAYMENT_STATISTIC_DEFAULTS = {"paid_money": 0, "first_payment_date": None, "paid_platforms": ""}
+PRIVATE_EMAIL_STATISTIC_DEFAULTS = {"num_private_emails": 0}
+
+# {source: (the grouped aggregate of the source, the statistic fields of the users who have no rows in the source)}
+USER_STATISTIC_AGGREGATES = {
+    USER_STATISTIC_SOURCE_CIPHERS: (aggregate_cipher_statistics, CIPHER_STATISTIC_DEFAULTS),
+    USER_STATISTIC_SOURCE_DEVICES: (aggregate_device_statistics, DEVICE_STATISTIC_DEFAULTS),
+    USER_STATISTIC_SOURCE_PAYMENTS: (aggregate_payment_statistics, PAYMENT_STATISTIC_DEFAULTS),
+    USER_STATISTIC_SOURCE_RELAY_ADDRESSES: (aggregate_private_email_statistics, PRIVATE_EMAIL_STATISTIC_DEFAULTS),
+}
+# The fields which are compared by the reconciliation to detect the changes which were not recorded
+RECONCILED_FIELDS = list(CIPHER_STATISTIC_DEFAULTS) + list(DEVICE_STATISTIC_DEFAULTS) + \
+    list(PRIVATE_EMAIL_STATISTIC_DEFAULTS) + ["paid_platforms", "lk_plan"]
+
+
+def build_users_statistic(user_ids, users_from_id_dict):
+    """
+    Build the statistic data of the users from one grouped query per source table, merged by user id
+    :param user_ids: (list) The user ids of the batch
+    :param users_from_id_dict: (dict) {user_id: profile} The profiles from the ID service
+    :return: (dict) {user_id: UserStatistic fields}
+    """
+    users = User.objects.filter(user_id__in=user_ids).select_related('pm_user_plan__pm_plan')
+    aggregated_statistics = [
+        (aggregate(user_ids), defaults) for aggregate, defaults in USER_STATISTIC_AGGREGATES.values()
+    ]
+
+    user_statistic_dicts = {}
+    for user in users:
+        user_statistic_data = get_user_profile_fields(user, users_from_id_dict.get(user.user_id) or {})
+        user_statistic_data.update(get_user_statistic_fields(user))
+        for statistics, defaults in aggregated_statistics:
+            user_statistic_data.update(defaults)
+            user_statistic_data.update(statistics.get(user.user_id, {}))
+        user_statistic_dicts[user.user_id] = user_statistic_data
+    return user_statistic_dicts
+
+
+def upsert_users_statistic(user_statistic_dicts):
+    if not user_statistic_dicts:
+        return
+    UserStatistic.bulk_update_or_create(
+        common_keys={},
+        unique_key_name='user_id',
+        unique_key_to_defaults=user_statistic_dicts,
+        batch_size=500,
+        ignore_conflicts=True
+    )
+
+
+def save_users_statistic(user_ids):
+    """
+    Build and upsert the statistics of a batch of users
+    :return: (int) Number of saved statistics
+    """
+    try:
+        users_from_id_dict = get_users_from_id(user_ids)
+        if users_from_id_dict is None:
+            return 0
+        user_statistic_dicts = build_users_statistic(user_ids, users_from_id_dict)
+        upsert_users_statistic(user_statistic_dicts)
+        return len(user_statistic_dicts)
+    finally:
+        # The worker threads open their own connections
+        connections.close_all()
+
+
+def save_all_users_statistic(user_ids, batch_size=USER_STATISTIC_BATCH_SIZE, max_workers=USER_STATISTIC_WORKERS):
+    """
+    Save the statistics of the users by batches. The batches are processed by parallel workers
+    :return: (int) Number of saved statistics
+    """
+    batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+    if max_workers <= 1:
+        return sum(save_users_statistic(batch_user_ids) for batch_user_ids in batches)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="user_statistic") as executor:
+        return sum(executor.map(save_users_statistic, batches))
+
+
+def fold_user_statistic_changes(batch_size=USER_STATISTIC_BATCH_SIZE):
+    """
+    Fold the recorded changes into the user statistics. Only the changed sources of the changed users are aggregated
+    again, by the same grouped queries restricted to these users. The users who have no statistics yet get a full build.
+    The user changes (e.g. a login) also refresh the profiles from the ID service
+    :return: (int) Number of changed users
+    """
+    changes = pop_user_statistic_changes()
+    if not changes:
+        return 0
+    changed_user_ids = sorted(set().union(*changes.values()))
+    existed_user_ids = set()
+    for i in range(0, len(changed_user_ids), batch_size):
+        existed_user_ids.update(UserStatistic.objects.filter(
+            user_id__in=changed_user_ids[i:i + batch_size]
+        ).values_list('user_id', flat=True))
+    save_all_users_statistic([user_id for user_id in changed_user_ids if user_id not in existed_user_ids])
+
+    aggregates = dict(USER_STATISTIC_AGGREGATES, **{USER_STATISTIC_SOURCE_USER: (aggregate_user_statistics, {})})
+    user_statistic_dicts = {}
+    for source, source_user_ids in changes.items():
+        if source not in aggregates:
+            continue
+        aggregate, defaults = aggregates[source]
+        source_user_ids = sorted(source_user_ids & existed_user_ids)
+        for i in range(0, len(source_user_ids), batch_size):
+            batch_user_ids = source_user_ids[i:i + batch_size]
+            statistics = aggregate(batch_user_ids)
+            for user_id in batch_user_ids:
+                user_statistic_data = user_statistic_dicts.setdefault(user_id, {})
+                user_statistic_data.update(defaults)
+                user_statistic_data.update(statistics.get(user_id, {}))
+    user_statistic_dicts = {user_id: data for user_id, data in user_statistic_dicts.items() if data}
+    user_ids = list(user_statistic_dicts)
+    for i in range(0, len(user_ids), batch_size):
+        upsert_users_statistic({user_id: user_statistic_dicts[user_id] for user_id in user_ids[i:i + batch_size]})
+    ack_user_statistic_changes()
+    return len(changed_user_ids)
+
+
+def reconcile_users_statistic(user_ids, batch_size=USER_STATISTIC_BATCH_SIZE):
+    """
+    Rebuild the statistics of a sample of users, e.g. to catch the cascade deletes which were not recorded
+    and the profile changes of the ID service
+    :return: (tuple) (number of rebuilt users, number of users whose statistics drifted)
+    """
+    num_rebuilt = 0
+    num_drifted = 0
+    for i in range(0, len(user_ids), batch_size):
+        batch_user_ids = user_ids[i:i + batch_size]
+        existed_statistics = {
+            statistic["user_id"]: statistic for statistic in UserStatistic.objects.filter(
+                user_id__in=batch_user_ids
+            ).values('user_id', *RECONCILED_FIELDS)
+        }
+        users_from_id_dict = get_users_from_id(batch_user_ids)
+        if users_from_id_dict is None:
+            continue
+        user_statistic_dicts = build_users_statistic(batch_user_ids, users_from_id_dict)
+        for user_id, user_statistic_data in user_statistic_dicts.items():
+            existed_statistic = existed_statistics.get(user_id)
+            if existed_statistic and any(existed_statistic[f] != user_statistic_data[f] for f in RECONCILED_FIELDS):
+                num_drifted += 1
+        upsert_users_statistic(user_statistic_dicts)
+        num_rebuilt += len(user_statistic_dicts)
+    return num_rebuilt, num_drifted
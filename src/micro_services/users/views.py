@@ -1,9 +1,10 @@
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError
 
 from cystack_models.models import User
 from micro_services.general_view import MicroServiceViewSet
+from shared.caching.user_profile_cache import delete_user_profile_cache
 from shared.permissions.micro_service_permissions.user_permissions import UserPermission
 from shared.utils.app import now
 
@@ -64,3 +65,18 @@ class UserViewSet(MicroServiceViewSet):
             })
         except User.DoesNotExist:
             raise NotFound
+
+    @action(methods=["post"], detail=False)
+    def profile_changed(self, request, *args, **kwargs):
+        """
+        The identity service notifies the changed profiles, so their cached profiles are invalidated
+        """
+        user_ids = request.data.get("user_ids")
+        if not isinstance(user_ids, list):
+            raise ValidationError(detail={"user_ids": ["This field must be a list of user ids"]})
+        try:
+            user_ids = [int(user_id) for user_id in user_ids]
+        except (TypeError, ValueError):
+            raise ValidationError(detail={"user_ids": ["This field must be a list of user ids"]})
+        delete_user_profile_cache(*user_ids)
+        return Response(status=200, data={"success": True})
@@ -1,4 +1,3 @@
-from django.conf import settings
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError, NotFound, PermissionDenied
@@ -6,6 +5,7 @@ from rest_framework.exceptions import ValidationError, NotFound, PermissionDenie
 from cystack_models.models.relay.relay_addresses import RelayAddress, MaxRelayAddressReachedException
 from relay.general_view import RelayViewSet
 from relay.relay_addresses.serializers import RelayAddressSerializer, UpdateRelayAddressSerializer
+from shared.caching.relay_cache import delete_relay_address_cache
 from shared.constants.relay_address import DEFAULT_RELAY_DOMAIN
 from shared.error_responses.error import gen_error
 from shared.permissions.relay_permissions.relay_address_permission import RelayAddressPermission
@@ -43,9 +43,7 @@ class RelayAddressViewSet(RelayViewSet):
 
     def allow_relay_premium(self) -> bool:
         user = self.request.user
-        current_plan = self.user_repository.get_current_plan(user=user, scope=settings.SCOPE_PWD_MANAGER)
-        plan_obj = current_plan.get_plan_obj()
-        return plan_obj.allow_relay_premium() or user.is_active_enterprise_member()
+        return self.user_repository.get_user_entitlements(user=user).allow_relay_premium()
 
     def list(self, request, *args, **kwargs):
         paging_param = self.request.query_params.get("paging", "1")
@@ -69,11 +67,14 @@ class RelayAddressViewSet(RelayViewSet):
             new_relay_address = RelayAddress.create_atomic(user_id=user.user_id, **validated_data)
         except MaxRelayAddressReachedException:
             raise ValidationError({"non_field_errors": [gen_error("8000")]})
+        # The new address may be cached as not found
+        delete_relay_address_cache(new_relay_address.full_address)
         return Response(status=201, data=self.get_serializer(new_relay_address).data)
 
     def update(self, request, *args, **kwargs):
         user = self.request.user
         relay_address = self.get_object()
+        old_full_address = relay_address.full_address
 
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -103,12 +104,15 @@ class RelayAddressViewSet(RelayViewSet):
         relay_address.description = description
         relay_address.updated_time = now()
         relay_address.save()
+        delete_relay_address_cache(old_full_address, relay_address.full_address)
         return Response(status=200, data={"id": relay_address.id})
 
     def destroy(self, request, *args, **kwargs):
         relay_address = self.get_object()
+        full_address = relay_address.full_address
         # Create deleted address
         relay_address.delete_permanently()
+        delete_relay_address_cache(full_address)
         return Response(status=204)
 
     @action(methods=["put"], detail=True)
@@ -119,6 +123,7 @@ class RelayAddressViewSet(RelayViewSet):
             raise ValidationError({"non_field_errors": [gen_error("7002")]})
         relay_address.block_spam = not relay_address.block_spam
         relay_address.save()
+        delete_relay_address_cache(relay_address.full_address)
         return Response(status=200, data={"id": relay_address.id, "block_spam": relay_address.block_spam})
 
     @action(methods=["put"], detail=True)
@@ -126,4 +131,5 @@ class RelayAddressViewSet(RelayViewSet):
         relay_address = self.get_object()
         relay_address.enabled = not relay_address.enabled
         relay_address.save()
+        delete_relay_address_cache(relay_address.full_address)
         return Response(status=200, data={"id": relay_address.id, "enabled": relay_address.enabled})
@@ -17,3 +17,16 @@ class StatisticSerializer(serializers.Serializer):
         if "type" in data:
             data["type"] = data["type"].lower()
         return super(StatisticSerializer, self).to_internal_value(data)
+
+
+class MultipleStatisticSerializer(serializers.Serializer):
+    statistics = StatisticSerializer(many=True, allow_empty=False)
+
+    def validate_statistics(self, statistics):
+        if len(statistics) > 1000:
+            raise serializers.ValidationError(detail=["The maximum number of statistics is 1000"])
+        return statistics
+
+
+class ResolveRelayAddressesSerializer(serializers.Serializer):
+    relay_addresses = serializers.ListField(child=serializers.CharField(max_length=128), max_length=1000)
@@ -2,7 +2,6 @@ import json
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import F
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied, NotFound, ValidationError
@@ -11,8 +10,10 @@ from rest_framework.decorators import action
 from cystack_models.models.relay.relay_addresses import RelayAddress
 from cystack_models.models.relay.reply import Reply
 from relay.general_view import RelayViewSet
-from relay.relay_hook.serializer import ReplySerializer, StatisticSerializer
-from shared.constants.relay_address import RELAY_STATISTIC_TYPE_FORWARDED, RELAY_STATISTIC_TYPE_BLOCKED_SPAM
+from relay.relay_hook.serializer import ReplySerializer, StatisticSerializer, MultipleStatisticSerializer, \
+    ResolveRelayAddressesSerializer
+from shared.caching.relay_cache import resolve_relay_address, resolve_multiple_relay_addresses, get_relay_cache_metrics
+from shared.caching.relay_counters import incr_relay_counter, incr_multiple_relay_counters
 from shared.log.cylog import CyLog
 from shared.services.rabbitmq.rabbitmq import RelayQueue
 
@@ -27,6 +28,10 @@ class RelayHookViewSet(RelayViewSet):
             self.serializer_class = ReplySerializer
         elif self.action == "statistics":
             self.serializer_class = StatisticSerializer
+        elif self.action == "multiple_statistics":
+            self.serializer_class = MultipleStatisticSerializer
+        elif self.action == "resolve":
+            self.serializer_class = ResolveRelayAddressesSerializer
         return super(RelayHookViewSet, self).get_serializer_class()
 
     def check_auth_token(self):
@@ -45,30 +50,19 @@ class RelayHookViewSet(RelayViewSet):
             raise PermissionDenied
 
     def allow_relay_premium(self, user) -> bool:
-        current_plan = self.user_repository.get_current_plan(user=user, scope=settings.SCOPE_PWD_MANAGER)
-        plan_obj = current_plan.get_plan_obj()
-        if plan_obj.allow_relay_premium():
-            return True
-        if user.is_active_enterprise_member():
-            return True
-        return False
+        return self.user_repository.get_user_entitlements(user=user).allow_relay_premium()
 
     @staticmethod
-    def get_relay_address_obj(email: str):
-        address = email.split("@")[0]
-        full_domain = email.split("@")[1]
-
-        if full_domain.count(".") == 1:
-            relay_address = RelayAddress.objects.get(
-                address=address, domain_id=full_domain, subdomain=None
-            )
-        else:
-            subdomain = full_domain.split(".")[0]
-            domain_id = full_domain.replace(f"{subdomain}.", "")
-            relay_address = RelayAddress.objects.get(
-                address=address, domain_id=domain_id, subdomain__subdomain=subdomain, subdomain__is_deleted=False
-            )
-        return relay_address
+    def get_relay_address_data(email: str):
+        """
+        Resolve the relay address from the relay address cache
+        :param email: (str) The full relay address
+        :return: (dict) {"id", "user_id", "enabled", "block_spam"}
+        """
+        relay_address_data = resolve_relay_address(email=email)
+        if not relay_address_data:
+            raise RelayAddress.DoesNotExist
+        return relay_address_data
 
     @staticmethod
     def get_receiver(mail_data):
@@ -96,14 +90,14 @@ class RelayHookViewSet(RelayViewSet):
 
         receiver = self.get_receiver(mail_data=mail_data)
         try:
-            relay_address = self.get_relay_address_obj(email=receiver)
-        except RelayAddress.DoesNotExist:
+            relay_address = self.get_relay_address_data(email=receiver)
+            user = self.user_repository.get_by_id(user_id=relay_address.get("user_id"))
+        except ObjectDoesNotExist:
             return Response(status=200, data={
                 "success": False,
                 "error": "The email {} does not exist".format(receiver)
             })
 
-        user = relay_address.user
         email = user.get_from_cystack_id().get("email")
         if not email:
             return Response(status=200, data={
@@ -111,9 +105,10 @@ class RelayHookViewSet(RelayViewSet):
                 "error": "The email of user {} does not exist".format(user.user_id)
             })
 
-        # Send to queue
+        # Send to queue. If the broker is unavailable, SendGrid retries the delivery on a non-2xx response
         mail_data["destination"] = email
-        RelayQueue().send(data=mail_data)
+        if not RelayQueue().send(data=mail_data):
+            return Response(status=503, data={"success": False, "error": "The relay queue is unavailable"})
 
         return Response(status=200, data={"success": True})
 
@@ -122,11 +117,35 @@ class RelayHookViewSet(RelayViewSet):
         self.check_auth_token()
         relay_address = self.request.query_params.get("relay_address")
         try:
-            relay_address = self.get_relay_address_obj(email=relay_address)
+            relay_address = self.get_relay_address_data(email=relay_address)
         except RelayAddress.DoesNotExist:
             # CyLog.debug(**{"message": "Can not get relay address destination: {}".format(relay_address)})
             raise NotFound
-        return Response(status=200, data={"user_id": relay_address.user_id})
+        return Response(status=200, data={"user_id": relay_address.get("user_id")})
+
+    @action(methods=["post"], detail=False)
+    def resolve(self, request, *args, **kwargs):
+        """
+        Resolve multiple relay addresses for the mail server by one call
+        """
+        self.check_auth_token()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        relay_addresses = serializer.validated_data.get("relay_addresses")
+        relay_addresses_data = resolve_multiple_relay_addresses(emails=relay_addresses)
+        return Response(status=200, data={
+            email: {
+                "user_id": relay_address_data.get("user_id"),
+                "enabled": relay_address_data.get("enabled"),
+                "block_spam": relay_address_data.get("block_spam"),
+            } if relay_address_data else None
+            for email, relay_address_data in relay_addresses_data.items()
+        })
+
+    @action(methods=["get"], detail=False)
+    def cache_metrics(self, request, *args, **kwargs):
+        self.check_auth_token()
+        return Response(status=200, data=get_relay_cache_metrics())
 
     @action(methods=["post"], detail=False)
     def reply(self, request, *args, **kwargs):
@@ -174,14 +193,15 @@ class RelayHookViewSet(RelayViewSet):
             })
 
         try:
-            relay_address_obj = self.get_relay_address_obj(email=relay_address_param)
-            is_premium = self.allow_relay_premium(user=relay_address_obj.user)
+            relay_address_data = self.get_relay_address_data(email=relay_address_param)
+            user = self.user_repository.get_by_id(user_id=relay_address_data.get("user_id"))
+            is_premium = self.allow_relay_premium(user=user)
             return Response(status=200, data={
                 "is_premium": is_premium,
-                "block_spam": relay_address_obj.block_spam if is_premium is True else False,
-                "enabled": relay_address_obj.enabled
+                "block_spam": relay_address_data.get("block_spam") if is_premium is True else False,
+                "enabled": relay_address_data.get("enabled")
             })
-        except RelayAddress.DoesNotExist:
+        except ObjectDoesNotExist:
             CyLog.debug(**{"message": "Can not get plan of address destination: {}".format(relay_address_param)})
             raise NotFound
 
@@ -196,14 +216,34 @@ class RelayHookViewSet(RelayViewSet):
         amount = validated_data.get("amount", 1)
 
         try:
-            relay_address = self.get_relay_address_obj(email=relay_address)
+            relay_address = self.get_relay_address_data(email=relay_address)
         except RelayAddress.DoesNotExist:
             CyLog.debug(**{"message": "Can not statistics relay address destination: {}".format(relay_address)})
             raise ValidationError(detail={"relay_address": ["The relay address does not exist"]})
 
-        if statistic_type == RELAY_STATISTIC_TYPE_FORWARDED:
-            relay_address.num_forwarded = F('num_forwarded') + amount
-        elif statistic_type == RELAY_STATISTIC_TYPE_BLOCKED_SPAM:
-            relay_address.num_spam = F('num_spam') + amount
-        relay_address.save()
+        incr_relay_counter(relay_address_id=relay_address.get("id"), statistic_type=statistic_type, amount=amount)
         return Response(status=200, data={"success": True})
+
+    @action(methods=["post"], detail=False)
+    def multiple_statistics(self, request, *args, **kwargs):
+        """
+        Receive the statistics of multiple relay addresses by one call
+        """
+        self.check_auth_token()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        statistics = serializer.validated_data.get("statistics")
+        relay_addresses_data = resolve_multiple_relay_addresses(
+            emails=[statistic.get("relay_address") for statistic in statistics]
+        )
+        counters = {}
+        not_found_addresses = []
+        for statistic in statistics:
+            relay_address_data = relay_addresses_data.get(statistic.get("relay_address"))
+            if not relay_address_data:
+                not_found_addresses.append(statistic.get("relay_address"))
+                continue
+            counter_key = (relay_address_data.get("id"), statistic.get("type"))
+            counters[counter_key] = counters.get(counter_key, 0) + statistic.get("amount", 1)
+        incr_multiple_relay_counters(counters=counters)
+        return Response(status=200, data={"success": True, "not_found": list(set(not_found_addresses))})
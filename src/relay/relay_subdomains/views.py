@@ -1,7 +1,6 @@
 import json
 import os
 
-from django.conf import settings
 from django.db.models import Sum
 from rest_framework.response import Response
 from rest_framework.decorators import action
@@ -9,6 +8,7 @@ from rest_framework.exceptions import ValidationError, NotFound
 
 from cystack_models.models.relay.relay_subdomains import RelaySubdomain, MaxRelaySubdomainReachedException
 from relay.general_view import RelayViewSet
+from shared.caching.relay_cache import delete_relay_address_cache
 from shared.error_responses.error import gen_error
 from shared.permissions.relay_permissions.relay_address_permission import RelayAddressPermission
 from shared.services.sqs.sqs import sqs_service
@@ -44,11 +44,10 @@ class RelaySubdomainViewSet(RelayViewSet):
 
     def allow_relay_premium(self):
         user = self.request.user
-        current_plan = self.user_repository.get_current_plan(user=user, scope=settings.SCOPE_PWD_MANAGER)
-        plan_obj = current_plan.get_plan_obj()
-        if plan_obj.allow_relay_premium() is False and user.is_active_enterprise_member() is False:
+        entitlements = self.user_repository.get_user_entitlements(user=user)
+        if entitlements.allow_relay_premium() is False:
             raise ValidationError({"non_field_errors": [gen_error("7002")]})
-        return current_plan
+        return entitlements
 
     def list(self, request, *args, **kwargs):
         paging_param = self.request.query_params.get("paging", "0")
@@ -117,9 +116,12 @@ class RelaySubdomainViewSet(RelayViewSet):
         old_subdomain = subdomain_obj.subdomain
         if subdomain != old_subdomain:
             # Delete all relay addresses of this subdomain
-            relay_addresses = subdomain_obj.relay_addresses.all()
+            relay_addresses = subdomain_obj.relay_addresses.all().select_related('subdomain')
+            deleted_full_addresses = []
             for relay_address in relay_addresses:
+                deleted_full_addresses.append(relay_address.full_address)
                 relay_address.delete_permanently()
+            delete_relay_address_cache(*deleted_full_addresses)
 
             # Create deletion SQS job
             if os.getenv("PROD_ENV") == "prod":
@@ -144,9 +146,12 @@ class RelaySubdomainViewSet(RelayViewSet):
         subdomain_obj = self.get_object()
 
         # Delete all relay addresses of this subdomain
-        relay_addresses = subdomain_obj.relay_addresses.all()
+        relay_addresses = subdomain_obj.relay_addresses.all().select_related('subdomain')
+        deleted_full_addresses = []
         for relay_address in relay_addresses:
+            deleted_full_addresses.append(relay_address.full_address)
             relay_address.delete_permanently()
+        delete_relay_address_cache(*deleted_full_addresses)
 
         # Create deletion SQS job
         if os.getenv("PROD_ENV") == "prod":
@@ -183,6 +183,8 @@ try:
         'django.middleware.csrf.CsrfViewMiddleware',
         'corsheaders.middleware.CorsPostCsrfMiddleware',
         # 'shared.middlewares.tenant_db_middleware.TenantDBMiddleware',
+        'shared.middlewares.event_buffer_middleware.EventBufferMiddleware',
+        'shared.middlewares.revision_bumper_middleware.RevisionBumperMiddleware',
         'shared.middlewares.error_response_middleware.ErrorResponseMiddleware',
         'shared.middlewares.queries_debug_middleware.QueriesDebugMiddleware',
     ]
@@ -19,6 +19,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'corsheaders.middleware.CorsPostCsrfMiddleware',
+    'shared.middlewares.event_buffer_middleware.EventBufferMiddleware',
+    'shared.middlewares.revision_bumper_middleware.RevisionBumperMiddleware',
     'shared.middlewares.error_response_middleware.ErrorResponseMiddleware',
 ]
 
@@ -1,10 +1,11 @@
 import jwt
 
-from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 
 from core.settings import CORE_CONFIG
 from shared.authentications.general_auth import AppGeneralAuthentication
+from shared.authentications.user_principal import UserPrincipal, USER_PRINCIPAL_FIELDS
+from shared.caching.auth_token_cache import decode_auth_token, get_token_principal, set_token_principal
 from shared.constants.token import TOKEN_PREFIX, TOKEN_TYPE_AUTHENTICATION
 
 
@@ -20,7 +21,7 @@ class LockerTokenAuthentication(AppGeneralAuthentication):
         non_prefix_token = token_value[len(TOKEN_PREFIX):]
 
         try:
-            payload = jwt.decode(non_prefix_token, settings.SECRET_KEY, algorithms=['HS256'])
+            payload = decode_auth_token(non_prefix_token)
             token_type = payload.get('token_type', None)
             user_id = payload.get('user_id', None)
 
@@ -30,7 +31,16 @@ class LockerTokenAuthentication(AppGeneralAuthentication):
 
             # Get profile in token
             user_id = int(user_id)
+            # The cached principal answers the permission checks, the User row is loaded only if the view needs it
+            principal = get_token_principal(non_prefix_token)
+            if principal is not None:
+                user = UserPrincipal(
+                    user_id=user_id, principal=principal,
+                    load_user=lambda: self.user_repository.retrieve_or_create_by_id(user_id=user_id)
+                )
+                return user, token_value
             user = self.user_repository.retrieve_or_create_by_id(user_id=user_id)
+            set_token_principal(non_prefix_token, {field: getattr(user, field) for field in USER_PRINCIPAL_FIELDS})
             return user, token_value
 
         except (jwt.InvalidSignatureError, jwt.DecodeError, jwt.InvalidAlgorithmError, ValueError, ObjectDoesNotExist):
@@ -0,0 +1,38 @@
+from django.utils.functional import SimpleLazyObject, empty
+
+
+# The fields which are answered without loading the User row
+USER_PRINCIPAL_FIELDS = ["activated"]
+
+
+class UserPrincipal(SimpleLazyObject):
+    """
+    The authenticated user of a request. The principal fields come from the token cache,
+    the User row is loaded by `load_user` on the first access to another field
+    """
+    def __init__(self, user_id, principal, load_user):
+        super().__init__(load_user)
+        principal = {field: principal.get(field) for field in USER_PRINCIPAL_FIELDS}
+        principal.update({"user_id": user_id, "pk": user_id})
+        self.__dict__["_principal"] = principal
+
+    def __getattr__(self, name):
+        if self.__dict__.get("_wrapped", empty) is empty:
+            principal = self.__dict__.get("_principal", {})
+            if name in principal:
+                return principal[name]
+            if name == "_meta":
+                return self.__class__._meta
+        return super().__getattr__(name)
+
+    @property
+    def __class__(self):
+        # isinstance() and the queryset lookups do not need the row
+        if self.__dict__.get("_wrapped", empty) is empty:
+            from cystack_models.models.users.users import User
+            return User
+        return self._wrapped.__class__
+
+    @property
+    def is_loaded(self):
+        return self.__dict__.get("_wrapped", empty) is not empty
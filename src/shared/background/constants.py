@@ -3,3 +3,5 @@ BG_EVENT = "bg_event"
 BG_CIPHER = "bg_cipher"
 BG_DOMAIN = "bg_domain"
 BG_ENTERPRISE_GROUP = "bg_enterprise_group"
+BG_PM_SYNC = "bg_pm_sync"
+BG_FCM = "bg_fcm"
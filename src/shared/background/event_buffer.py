@@ -0,0 +1,216 @@
+import atexit
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+
+from django.db import close_old_connections, connections, router
+
+from cystack_models.models.events.events import Event
+from shared.log.cylog import CyLog
+
+
+EVENT_BUFFER_FLUSH_SIZE = int(os.getenv("EVENT_BUFFER_FLUSH_SIZE", 200))
+EVENT_BUFFER_FLUSH_INTERVAL = int(os.getenv("EVENT_BUFFER_FLUSH_INTERVAL", 5))         # Seconds
+EVENT_BUFFER_MAX_SIZE = int(os.getenv("EVENT_BUFFER_MAX_SIZE", 5000))                # Events kept in memory
+EVENT_BUFFER_SPOOL_DIR = os.getenv("EVENT_BUFFER_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "locker_events"))
+EVENT_BUFFER_MAX_SPOOL_SIZE = int(os.getenv("EVENT_BUFFER_MAX_SPOOL_SIZE", 100 * 1024 * 1024))    # Bytes
+EVENT_BUFFER_BATCH_SIZE = 500
+
+
+class EventBuffer:
+    """
+    Accumulate the Event rows of the process and insert them by `bulk_create`.
+    The buffer is flushed when it reaches the flush size, every flush interval, at the end of the requests
+    and when the process exits. If the memory ceiling is reached or the database is unavailable,
+    the events are spooled to disk (up to the max spool size) and inserted by the next flush.
+    If a batch is rejected while the database is available, its rows are inserted one by one and the rows which still
+    fail are moved to a dead-letter file, so they do not block the spool
+    """
+    def __init__(self, flush_size=EVENT_BUFFER_FLUSH_SIZE, flush_interval=EVENT_BUFFER_FLUSH_INTERVAL,
+                 max_size=EVENT_BUFFER_MAX_SIZE, spool_dir=EVENT_BUFFER_SPOOL_DIR,
+                 max_spool_size=EVENT_BUFFER_MAX_SPOOL_SIZE):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.spool_dir = spool_dir
+        self.max_spool_size = max_spool_size
+        self.events = []
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.flush_signal = threading.Event()
+        self.flusher = None
+        self.metrics = {
+            "buffered": 0, "inserted": 0, "flushes": 0, "spooled": 0, "replayed": 0, "dead_lettered": 0, "dropped": 0
+        }
+
+    def add(self, *events: Event):
+        self._start_flusher()
+        overflow_events = []
+        with self.lock:
+            self.events.extend(events)
+            self.metrics["buffered"] += len(events)
+            if len(self.events) > self.max_size:
+                overflow_events, self.events = self.events, []
+            num_events = len(self.events)
+        if overflow_events:
+            self.spool(overflow_events)
+        if num_events >= self.flush_size:
+            self.flush_signal.set()
+
+    def flush(self):
+        """
+        Insert the buffered events and the spooled events. Only one flush runs at a time in the process
+        """
+        if not self.flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self.lock:
+                events, self.events = self.events, []
+            num_inserted = self.insert(events) if events else 0
+            num_inserted += self.replay_spool()
+            return num_inserted
+        finally:
+            self.flush_lock.release()
+
+    def insert(self, events):
+        """
+        :return: (int) The number of inserted events. 0 if the database is unavailable and the events are spooled
+        """
+        try:
+            Event.objects.bulk_create(events, batch_size=EVENT_BUFFER_BATCH_SIZE, ignore_conflicts=True)
+        except Exception:
+            CyLog.error(**{"message": "[EventBuffer] Insert events error: {}".format(traceback.format_exc())})
+            if not self.is_database_available():
+                self.spool(events)
+                return 0
+            # The database rejected some rows of the batch
+            return self.insert_one_by_one(events)
+        with self.lock:
+            self.metrics["inserted"] += len(events)
+            self.metrics["flushes"] += 1
+        return len(events)
+
+    def insert_one_by_one(self, events):
+        num_inserted = 0
+        for index, event in enumerate(events):
+            try:
+                Event.objects.bulk_create([event], ignore_conflicts=True)
+                num_inserted += 1
+            except Exception:
+                if not self.is_database_available():
+                    self.spool(events[index:])
+                    break
+                self.dead_letter(event, error=traceback.format_exc())
+        with self.lock:
+            self.metrics["inserted"] += num_inserted
+            self.metrics["flushes"] += 1
+        return num_inserted
+
+    @staticmethod
+    def is_database_available():
+        connection = connections[router.db_for_write(Event)]
+        try:
+            connection.close_if_unusable_or_obsolete()
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except Exception:
+            return False
+
+    def spool(self, events):
+        """
+        Write the events into a new JSON-lines file of the spool directory.
+        The events are dropped if the spool directory reaches its max size
+        """
+        os.makedirs(self.spool_dir, exist_ok=True)
+        spool_size = sum(
+            os.path.getsize(spool_path) for spool_path in glob.glob(os.path.join(self.spool_dir, "events-*.jsonl*"))
+        )
+        if spool_size >= self.max_spool_size:
+            CyLog.error(**{"message": "[EventBuffer] The spool is full ({} bytes). Drop {} events".format(
+                spool_size, len(events)
+            )})
+            with self.lock:
+                self.metrics["dropped"] += len(events)
+            return
+        spool_path = os.path.join(self.spool_dir, "events-{}-{}.jsonl".format(os.getpid(), time.time_ns()))
+        self._write_events(spool_path, events)
+        with self.lock:
+            self.metrics["spooled"] += len(events)
+
+    def dead_letter(self, event, error):
+        """
+        Move an event which the database rejects into a dead-letter file. It is not replayed
+        """
+        os.makedirs(self.spool_dir, exist_ok=True)
+        dead_letter_path = os.path.join(self.spool_dir, "dead-events-{}-{}.jsonl".format(os.getpid(), time.time_ns()))
+        self._write_events(dead_letter_path, [event])
+        CyLog.error(**{"message": "[EventBuffer] Event {} is moved to {}: {}".format(
+            event.id, dead_letter_path, error
+        )})
+        with self.lock:
+            self.metrics["dead_lettered"] += 1
+
+    @staticmethod
+    def _write_events(path, events):
+        with open(path + ".tmp", "w") as events_file:
+            for event in events:
+                event_data = {field.attname: getattr(event, field.attname) for field in Event._meta.concrete_fields}
+                events_file.write(json.dumps(event_data, default=str) + "\n")
+        os.rename(path + ".tmp", path)
+
+    def replay_spool(self):
+        num_replayed = 0
+        for spool_path in sorted(glob.glob(os.path.join(self.spool_dir, "events-*.jsonl"))):
+            # Claim the file, so the other processes do not replay it again
+            claimed_path = "{}.{}.replaying".format(spool_path, os.getpid())
+            try:
+                os.rename(spool_path, claimed_path)
+            except OSError:
+                continue
+            with open(claimed_path) as spool_file:
+                events = [Event(**json.loads(line)) for line in spool_file if line.strip()]
+            os.remove(claimed_path)
+            num_inserted = self.insert(events)
+            if events and not num_inserted and not self.is_database_available():
+                # The database is still unavailable. The events are spooled again
+                break
+            num_replayed += num_inserted
+        if num_replayed:
+            with self.lock:
+                self.metrics["replayed"] += num_replayed
+        return num_replayed
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics["pending"] = len(self.events)
+        return metrics
+
+    def _run_flusher(self):
+        while True:
+            self.flush_signal.wait(timeout=self.flush_interval)
+            self.flush_signal.clear()
+            try:
+                self.flush()
+            except Exception:
+                CyLog.error(**{"message": "[EventBuffer] Flush error: {}".format(traceback.format_exc())})
+            finally:
+                close_old_connections()
+
+    def _start_flusher(self):
+        if self.flusher is not None:
+            return
+        with self.lock:
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self._run_flusher, name="event-buffer-flusher")
+                self.flusher.daemon = True
+                self.flusher.start()
+
+
+event_buffer = EventBuffer()
+atexit.register(event_buffer.flush)
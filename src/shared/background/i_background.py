@@ -1,29 +1,35 @@
-import threading
 import traceback
 
 from django.db import connection
 
+from core.utils.account_revision_date import revision_bumper
+from shared.background.job_queue import BG_JOB_QUEUE_DEFAULT, submit_background_job, enqueue_locker_background_job
 from shared.log.cylog import CyLog
 
 
 class BackgroundThread:
-    def __init__(self, task, interval=1, **kwargs):
+    """
+    Run the task in the bounded worker pool of the queue instead of a new thread per call
+    """
+    def __init__(self, task, interval=1, queue_name=BG_JOB_QUEUE_DEFAULT, **kwargs):
         self.task = task
         self.interval = interval
-
-        self.thread = threading.Thread(target=self.task, kwargs=kwargs)
-        self.thread.daemon = True
-        self.thread.start()
+        submit_background_job(self.task, queue_name=queue_name, **kwargs)
 
 
 def background_exception_wrapper(func):
+    """
+    Log the error of the background task, then re-raise it so the job queue retries the task
+    """
     def wrap(*args, **kwargs):
         try:
-            result = func(*args, **kwargs)
+            with revision_bumper():
+                result = func(*args, **kwargs)
             return result
         except Exception as e:
             tb = traceback.format_exc()
             CyLog.error(**{"message": f"{func.__name__} error: {tb}"})
+            raise
         finally:
             connection.close()
     return wrap
@@ -31,6 +37,8 @@ def background_exception_wrapper(func):
 
 
 class ILockerBackground:
+    bg_name = BG_JOB_QUEUE_DEFAULT
+
     def __init__(self, background=True, **kwargs):
         self.background = background
 
@@ -43,7 +51,7 @@ class ILockerBackground:
             raise Exception("Func name {} is not callable".format(func_name))
         # Run background or not this function
         if self.background:
-            BackgroundThread(task=func, **kwargs)
+            enqueue_locker_background_job(self, func_name, **kwargs)
         else:
             return func(**kwargs)
 
@@ -1,11 +1,13 @@
 from django.db import connection
 
 from core.settings import CORE_CONFIG
+from shared.background.constants import BG_CIPHER
 from shared.background.i_background import ILockerBackground
 from shared.services.pm_sync import PwdSync, SYNC_EVENT_CIPHER_DELETE, SYNC_EVENT_CIPHER_RESTORE
 
 
 class CipherBackground(ILockerBackground):
+    bg_name = BG_CIPHER
     team_repository = CORE_CONFIG["repositories"]["ITeamRepository"]()
     cipher_repository = CORE_CONFIG["repositories"]["ICipherRepository"]()
 
@@ -22,6 +24,8 @@ class CipherBackground(ILockerBackground):
             )
         except Exception as e:
             self.log_error(func_name="multiple_delete")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -39,6 +43,8 @@ class CipherBackground(ILockerBackground):
             )
         except Exception as e:
             self.log_error(func_name="multiple_restore")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -3,7 +3,10 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.db import connection
 
 
+from shared.background.constants import BG_DOMAIN
 from shared.background.i_background import ILockerBackground
+from shared.caching.entitlements_cache import delete_entitlements_cache
+from shared.caching.login_policy_cache import delete_login_policy_snapshots
 from shared.constants.enterprise_members import *
 from shared.constants.event import EVENT_E_MEMBER_CONFIRMED
 from shared.constants.transactions import PAYMENT_METHOD_CARD
@@ -22,6 +25,8 @@ HEADERS = {
 
 
 class DomainBackground(ILockerBackground):
+    bg_name = BG_DOMAIN
+
     def domain_verified(self, owner_user_id: int, domain):
         try:
             url = API_NOTIFY_DOMAIN + "/verified"
@@ -59,10 +64,13 @@ class DomainBackground(ILockerBackground):
                         )
                     )
                 new_members_obj = EnterpriseMember.objects.bulk_create(members, ignore_conflicts=True, batch_size=50)
+                delete_login_policy_snapshots(*[user.user_id for user in users])
                 return len(new_members_obj)
 
         except Exception as e:
             self.log_error(func_name="domain_verified")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -94,6 +102,8 @@ class DomainBackground(ILockerBackground):
                 )
         except Exception as e:
             self.log_error(func_name="domain_unverified")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -131,11 +141,16 @@ class DomainBackground(ILockerBackground):
                 except (PaymentMethodNotSupportException, ObjectDoesNotExist):
                     pass
             # Auto accept all requested members
+            approved_user_ids = list(members.values_list('user_id', flat=True))
             members.update(status=E_MEMBER_STATUS_CONFIRMED)
+            delete_login_policy_snapshots(*approved_user_ids)
+            delete_entitlements_cache(*approved_user_ids)
             # Log events
             Event.create_multiple_by_enterprise_members(member_events_data)
         except Exception as e:
             self.log_error(func_name="domain_auto_approve")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -4,6 +4,7 @@ from django.db import connection
 from django.core.exceptions import ObjectDoesNotExist
 
 from core.settings import CORE_CONFIG
+from shared.background.constants import BG_ENTERPRISE_GROUP
 from shared.background.i_background import ILockerBackground
 from shared.background.implements import NotifyBackground
 from shared.external_request.requester import requester
@@ -13,6 +14,7 @@ from shared.services.fcm.fcm_sender import FCMSenderService
 
 
 class EnterpriseGroupBackground(ILockerBackground):
+    bg_name = BG_ENTERPRISE_GROUP
     sharing_repository = CORE_CONFIG["repositories"]["ISharingRepository"]()
     device_repository = CORE_CONFIG["repositories"]["IDeviceRepository"]()
     team_repository = CORE_CONFIG["repositories"]["ITeamRepository"]()
@@ -93,6 +95,8 @@ class EnterpriseGroupBackground(ILockerBackground):
 
         except Exception as e:
             self.log_error(func_name="add_group_member_to_share")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -1,10 +1,12 @@
 from django.db import connection
 
 from core.settings import CORE_CONFIG
+from shared.background.constants import BG_EVENT
 from shared.background.i_background import ILockerBackground
 
 
 class EventBackground(ILockerBackground):
+    bg_name = BG_EVENT
     event_repository = CORE_CONFIG["repositories"]["IEventRepository"]()
 
     def create(self, **data):
@@ -12,6 +14,8 @@ class EventBackground(ILockerBackground):
             self.event_repository.save_new_event(**data)
         except Exception as e:
             self.log_error(func_name="create")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -24,6 +28,8 @@ class EventBackground(ILockerBackground):
                 self.create(**data)
         except Exception as e:
             self.log_error(func_name="create_by_team_ids")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -36,6 +42,8 @@ class EventBackground(ILockerBackground):
                 self.create(**data)
         except Exception as e:
             self.log_error(func_name="create_by_enterprise_ids")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -48,6 +56,8 @@ class EventBackground(ILockerBackground):
                 self.create(**data)
         except Exception as e:
             self.log_error(func_name="create_by_ciphers")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
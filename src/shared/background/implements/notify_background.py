@@ -5,6 +5,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.db import connection
 
 from core.settings import CORE_CONFIG
+from shared.background.constants import BG_NOTIFY
 from shared.background.i_background import ILockerBackground
 from shared.constants.transactions import PAYMENT_STATUS_PAID
 from shared.external_request.requester import requester, RequesterError
@@ -19,6 +20,8 @@ HEADERS = {
 
 
 class NotifyBackground(ILockerBackground):
+    bg_name = BG_NOTIFY
+
     def downgrade_plan(self, user_id, old_plan, downgrade_time, scope, **metadata):
         try:
             user_repository = CORE_CONFIG["repositories"]["IUserRepository"]()
@@ -43,6 +46,8 @@ class NotifyBackground(ILockerBackground):
             requester(method="POST", url=url, headers=HEADERS, data_send=notification_data)
         except RequesterError:
             self.log_error(func_name="downgrade_plan")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -59,6 +64,8 @@ class NotifyBackground(ILockerBackground):
             requester(method="POST", url=url, headers=HEADERS, data_send=notification_data)
         except RequesterError:
             self.log_error(func_name="cancel_plan")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -80,6 +87,8 @@ class NotifyBackground(ILockerBackground):
             requester(method="POST", url=url, headers=HEADERS, data_send=notification_data)
         except RequesterError:
             self.log_error(func_name="banking_expiring")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -97,6 +106,8 @@ class NotifyBackground(ILockerBackground):
             requester(method="POST", url=url, headers=HEADERS, data_send=notification_data)
         except RequesterError:
             self.log_error(func_name="trial_successfully")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -108,6 +119,8 @@ class NotifyBackground(ILockerBackground):
             requester(method="POST", url=url, headers=HEADERS, data_send=notification_data)
         except RequesterError:
             self.log_error(func_name="trial_enterprise_successfully")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -161,6 +174,8 @@ class NotifyBackground(ILockerBackground):
 
         except Exception:
             self.log_error(func_name="notify_pay_successfully")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -180,6 +195,8 @@ class NotifyBackground(ILockerBackground):
             requester(method="POST", url=url, headers=HEADERS, data_send=notification_data)
         except Exception:
             self.log_error(func_name="notify_pay_failed")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -194,6 +211,8 @@ class NotifyBackground(ILockerBackground):
             )
         except Exception:
             self.log_error(func_name="notify_tutorial")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -207,6 +226,8 @@ class NotifyBackground(ILockerBackground):
             )
         except Exception:
             self.log_error(func_name="notify_tutorial")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -220,6 +241,8 @@ class NotifyBackground(ILockerBackground):
             )
         except Exception:
             self.log_error(func_name="notify_enterprise_next_cycle")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -233,6 +256,8 @@ class NotifyBackground(ILockerBackground):
             )
         except Exception:
             self.log_error(func_name="notify_enterprise_export")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -243,6 +268,8 @@ class NotifyBackground(ILockerBackground):
             requester(method="POST", url=url, headers=HEADERS, data_send=data, retry=True, max_retries=3, timeout=5)
         except Exception:
             self.log_error(func_name="notify_locker_mail")
+            if self.background:
+                raise
         finally:
             if self.background:
                 connection.close()
@@ -0,0 +1,220 @@
+import os
+import queue
+import threading
+import time
+import traceback
+
+from django.db import close_old_connections
+
+from core.utils.account_revision_date import revision_bumper
+from shared.log.cylog import CyLog
+
+
+BG_JOB_BACKEND_LOCAL = "local"
+BG_JOB_BACKEND_RQ = "rq"
+
+BG_JOB_BACKEND = os.getenv("BACKGROUND_JOB_BACKEND", BG_JOB_BACKEND_LOCAL)
+BG_JOB_QUEUE_DEFAULT = "bg_default"
+BG_JOB_MAX_WORKERS = int(os.getenv("BACKGROUND_JOB_MAX_WORKERS", 4))
+BG_JOB_MAX_QUEUE_SIZE = int(os.getenv("BACKGROUND_JOB_MAX_QUEUE_SIZE", 500))
+BG_JOB_SUBMIT_TIMEOUT = 1               # Seconds to wait for a free slot before the job overflows
+BG_JOB_MAX_RETRIES = 2
+BG_JOB_RETRY_BACKOFF = 1                # Seconds, doubled after each retry
+
+
+class BackgroundJob:
+    def __init__(self, task, kwargs, max_retries=BG_JOB_MAX_RETRIES):
+        self.task = task
+        self.kwargs = kwargs
+        self.max_retries = max_retries
+        self.submit_time = time.monotonic()
+
+
+class BackgroundJobQueue:
+    """
+    A bounded queue which is consumed by a fixed number of worker threads.
+    When the queue is full, the caller waits for a slot. If the queue is still full, the job is spilled to the rq queue
+    when the rq backend is configured, otherwise the caller keeps waiting (backpressure). A job is never dropped.
+    A job which raises is retried with an exponential backoff
+    """
+    def __init__(self, name, max_workers=BG_JOB_MAX_WORKERS, max_size=BG_JOB_MAX_QUEUE_SIZE):
+        self.name = name
+        self.max_workers = max_workers
+        self.jobs = queue.Queue(maxsize=max_size)
+        self.workers = []
+        self.lock = threading.Lock()
+        self.metrics = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "retried": 0,
+            "overflowed": 0,        # The jobs which did not get a slot in time
+            "spilled": 0,           # The overflowed jobs which were enqueued to rq
+            "wait_time": 0.0,       # Total seconds the jobs waited in the queue
+            "max_wait_time": 0.0,
+            "run_time": 0.0,        # Total seconds the jobs ran
+        }
+
+    def submit(self, task, max_retries=BG_JOB_MAX_RETRIES, **kwargs):
+        self._start_workers()
+        job = BackgroundJob(task=task, kwargs=kwargs, max_retries=max_retries)
+        self._incr_metrics(submitted=1)
+        try:
+            self.jobs.put(job, timeout=BG_JOB_SUBMIT_TIMEOUT)
+        except queue.Full:
+            self._incr_metrics(overflowed=1)
+            if self._spill(job):
+                self._incr_metrics(spilled=1)
+                return
+            CyLog.warning(**{"message": "[BACKGROUND] The queue {} is full. Wait for a slot for the job {}".format(
+                self.name, getattr(task, "__name__", task)
+            )})
+            self.jobs.put(job)
+
+    def execute(self, job: BackgroundJob):
+        wait_time = time.monotonic() - job.submit_time
+        attempt = 0
+        while True:
+            start_time = time.monotonic()
+            try:
+                with revision_bumper():
+                    job.task(**job.kwargs)
+                self._incr_metrics(completed=1, run_time=time.monotonic() - start_time, wait_time=wait_time)
+                return
+            except Exception:
+                if attempt >= job.max_retries:
+                    self._incr_metrics(failed=1, run_time=time.monotonic() - start_time, wait_time=wait_time)
+                    CyLog.error(**{"message": "[BACKGROUND] Job {} of the queue {} error: {}".format(
+                        getattr(job.task, "__name__", job.task), self.name, traceback.format_exc()
+                    )})
+                    return
+                self._incr_metrics(retried=1)
+                time.sleep(BG_JOB_RETRY_BACKOFF * 2 ** attempt)
+                attempt += 1
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+        finished = metrics["completed"] + metrics["failed"]
+        metrics.update({
+            "name": self.name,
+            "depth": self.jobs.qsize(),
+            "workers": len(self.workers),
+            "avg_wait_time": metrics["wait_time"] / finished if finished else 0,
+            "avg_run_time": metrics["run_time"] / finished if finished else 0,
+        })
+        return metrics
+
+    def _spill(self, job: BackgroundJob):
+        """
+        Enqueue the overflowed job to rq, it is run by the rq workers
+        :return: (bool) False if the rq backend is not configured or the job can not be enqueued
+        """
+        if BG_JOB_BACKEND != BG_JOB_BACKEND_RQ:
+            return False
+        try:
+            import django_rq
+            from rq import Retry
+            django_rq.get_queue("default").enqueue(
+                run_background_job, args=(job.task, ), kwargs=job.kwargs,
+                retry=Retry(
+                    max=job.max_retries, interval=[BG_JOB_RETRY_BACKOFF * 2 ** i for i in range(job.max_retries)]
+                ) if job.max_retries else None
+            )
+            return True
+        except Exception:
+            # The Redis is not available or the task is not picklable
+            CyLog.warning(**{"message": "[BACKGROUND] Can not spill the job {} of the queue {}: {}".format(
+                getattr(job.task, "__name__", job.task), self.name, traceback.format_exc()
+            )})
+            return False
+
+    def _work(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                self.execute(job)
+            finally:
+                self.jobs.task_done()
+                close_old_connections()
+
+    def _start_workers(self):
+        if len(self.workers) >= self.max_workers:
+            return
+        with self.lock:
+            while len(self.workers) < self.max_workers:
+                worker = threading.Thread(target=self._work, name=f"{self.name}-{len(self.workers)}")
+                worker.daemon = True
+                worker.start()
+                self.workers.append(worker)
+
+    def _incr_metrics(self, **metrics):
+        with self.lock:
+            for name, value in metrics.items():
+                self.metrics[name] += value
+            if metrics.get("wait_time", 0) > self.metrics["max_wait_time"]:
+                self.metrics["max_wait_time"] = metrics.get("wait_time")
+
+
+_job_queues = {}
+_job_queues_lock = threading.Lock()
+
+
+def get_job_queue(name=BG_JOB_QUEUE_DEFAULT) -> BackgroundJobQueue:
+    job_queue = _job_queues.get(name)
+    if job_queue is None:
+        with _job_queues_lock:
+            job_queue = _job_queues.setdefault(name, BackgroundJobQueue(name=name))
+    return job_queue
+
+
+def get_job_queue_metrics():
+    return [job_queue.get_metrics() for job_queue in list(_job_queues.values())]
+
+
+def submit_background_job(task, queue_name=BG_JOB_QUEUE_DEFAULT, max_retries=BG_JOB_MAX_RETRIES, **kwargs):
+    get_job_queue(queue_name).submit(task, max_retries=max_retries, **kwargs)
+
+
+def run_background_job(task, **kwargs):
+    """
+    The entry point of the local jobs which are spilled to django_rq
+    """
+    with revision_bumper():
+        task(**kwargs)
+
+
+def run_locker_background_job(bg_name, func_name, **kwargs):
+    """
+    The entry point of the background jobs which are dispatched to django_rq
+    """
+    from shared.background.background_factory import LockerBackgroundFactory
+    # The function runs as a job (background=True), so it re-raises its errors and rq retries it
+    background = LockerBackgroundFactory.get_background(bg_name=bg_name, background=True)
+    with revision_bumper():
+        getattr(background, func_name)(**kwargs)
+
+
+def enqueue_locker_background_job(background, func_name, **kwargs):
+    """
+    Dispatch a function of a Locker background. The job is durable if the backend is django_rq,
+    otherwise it runs in the bounded local worker pool of the background
+    :param background: (obj) ILockerBackground object
+    :param func_name: (str) The function name of the background
+    """
+    if BG_JOB_BACKEND == BG_JOB_BACKEND_RQ:
+        import django_rq
+        from django.conf import settings
+        queue_name = background.bg_name if background.bg_name in getattr(settings, "RQ_QUEUES", {}) else "default"
+        from rq import Retry
+        django_rq.get_queue(queue_name).enqueue(
+            run_locker_background_job,
+            args=(background.bg_name, func_name),
+            kwargs=kwargs,
+            retry=Retry(
+                max=BG_JOB_MAX_RETRIES,
+                interval=[BG_JOB_RETRY_BACKOFF * 2 ** i for i in range(BG_JOB_MAX_RETRIES)]
+            )
+        )
+        return
+    submit_background_job(getattr(background, func_name), queue_name=background.bg_name, **kwargs)
@@ -0,0 +1,26 @@
+from django.core.cache import cache
+
+
+# The state of an export is kept while its job can be retried
+ACTIVITY_EXPORT_STATE_TIMEOUT = 24 * 60 * 60
+
+ACTIVITY_EXPORT_STATUS_PENDING = "pending"
+ACTIVITY_EXPORT_STATUS_RUNNING = "running"
+ACTIVITY_EXPORT_STATUS_DONE = "done"
+ACTIVITY_EXPORT_STATUS_FAILED = "failed"
+
+
+def get_activity_export_state_key(export_id):
+    return f"activity_export:{export_id}"
+
+
+def get_activity_export_state(export_id):
+    """
+    :return: (dict) The progress and the resume checkpoint of the export: enterprise_id, status, rows, total, s3_path,
+    upload_id, parts, position, gzip
+    """
+    return cache.get(get_activity_export_state_key(export_id))
+
+
+def set_activity_export_state(export_id, state):
+    cache.set(get_activity_export_state_key(export_id), state, ACTIVITY_EXPORT_STATE_TIMEOUT)
@@ -0,0 +1,158 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+
+
+AUTH_TOKEN_CACHE_SIZE = 10000
+# The principal of an entry may be stale after this time (e.g. the user is activated by another process)
+AUTH_TOKEN_CACHE_MAX_AGE = 10 * 60
+
+_metrics_lock = threading.Lock()
+AUTH_TOKEN_CACHE_METRICS = {"hits": 0, "principal_hits": 0, "misses": 0, "revoked": 0}
+
+
+def get_auth_token_hash(token: str):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def get_auth_revoked_cache_key(user_id):
+    return f"auth_token_revoked:{user_id}"
+
+
+def _incr_metrics(**metrics):
+    with _metrics_lock:
+        for name, value in metrics.items():
+            AUTH_TOKEN_CACHE_METRICS[name] += value
+
+
+def get_auth_token_cache_metrics():
+    with _metrics_lock:
+        metrics = dict(AUTH_TOKEN_CACHE_METRICS)
+    total = metrics["hits"] + metrics["misses"]
+    metrics["hit_rate"] = metrics["hits"] / total if total else 0
+    metrics["size"] = len(verified_token_cache.data)
+    return metrics
+
+
+class VerifiedTokenCache:
+    """
+    A thread-safe LRU cache of the verified tokens of the process, keyed by the token hash.
+    An entry expires at the `exp` claim of its token, and at most `AUTH_TOKEN_CACHE_MAX_AGE` seconds after it is cached
+    """
+    def __init__(self, max_size=AUTH_TOKEN_CACHE_SIZE, max_age=AUTH_TOKEN_CACHE_MAX_AGE):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, token_hash):
+        with self.lock:
+            entry = self.data.get(token_hash)
+            if entry is None:
+                return None
+            if entry["expired_time"] <= time.time():
+                self.data.pop(token_hash, None)
+                return None
+            self.data.move_to_end(token_hash)
+            return entry
+
+    def set(self, token_hash, payload):
+        current_time = time.time()
+        expired_time = current_time + self.max_age
+        if payload.get("exp") is not None:
+            expired_time = min(expired_time, float(payload.get("exp")))
+        entry = {"payload": payload, "expired_time": expired_time, "principal": None, "principal_time": None}
+        with self.lock:
+            self.data[token_hash] = entry
+            self.data.move_to_end(token_hash)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+        return entry
+
+    def set_principal(self, token_hash, principal):
+        with self.lock:
+            entry = self.data.get(token_hash)
+            if entry is not None:
+                entry["principal"] = principal
+                entry["principal_time"] = time.time()
+
+    def delete_principal(self, token_hash):
+        with self.lock:
+            entry = self.data.get(token_hash)
+            if entry is not None:
+                entry["principal"] = None
+                entry["principal_time"] = None
+
+    def delete_user(self, user_id):
+        with self.lock:
+            for entry in self.data.values():
+                if entry["payload"].get("user_id") is not None and str(entry["payload"].get("user_id")) == str(user_id):
+                    entry["principal"] = None
+                    entry["principal_time"] = None
+
+
+verified_token_cache = VerifiedTokenCache()
+
+
+def decode_auth_token(token: str):
+    """
+    Verify the token (without the `cs.` prefix) and return its payload. The verified tokens are cached in the process,
+    so a token is decoded once until it expires
+    :return: (dict) The payload
+    :raise: jwt.InvalidSignatureError, jwt.DecodeError, jwt.InvalidAlgorithmError
+    """
+    token_hash = get_auth_token_hash(token)
+    entry = verified_token_cache.get(token_hash)
+    if entry is not None:
+        _incr_metrics(hits=1)
+        return entry["payload"]
+    _incr_metrics(misses=1)
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+    verified_token_cache.set(token_hash, payload)
+    return payload
+
+
+def get_token_principal(token: str):
+    """
+    Get the cached principal of the token. The principal is dropped if the sessions of its user were revoked after it
+    was cached, by any process
+    :return: (dict) The principal fields or None
+    """
+    token_hash = get_auth_token_hash(token)
+    entry = verified_token_cache.get(token_hash)
+    if entry is None or entry["principal"] is None:
+        return None
+    revoked_time = cache.get(get_auth_revoked_cache_key(entry["payload"].get("user_id")))
+    if revoked_time is not None and float(revoked_time) >= entry["principal_time"]:
+        verified_token_cache.delete_principal(token_hash)
+        _incr_metrics(revoked=1)
+        return None
+    _incr_metrics(principal_hits=1)
+    return entry["principal"]
+
+
+def set_token_principal(token: str, principal):
+    """
+    :param principal: (dict) The principal fields of the user of the token
+    """
+    verified_token_cache.set_principal(get_auth_token_hash(token), principal)
+
+
+def revoke_auth_token_cache(*user_ids):
+    """
+    Drop the cached principals of the users. The other processes see the revocation marker, it lives as long as
+    the entries which it invalidates
+    """
+    if not user_ids:
+        return
+    for user_id in user_ids:
+        verified_token_cache.delete_user(user_id)
+    revoked_time = time.time()
+    cache.set_many(
+        {get_auth_revoked_cache_key(user_id): revoked_time for user_id in user_ids}, AUTH_TOKEN_CACHE_MAX_AGE
+    )
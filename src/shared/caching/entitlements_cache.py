@@ -0,0 +1,52 @@
+from django.core.cache import cache
+
+
+# The entitlements are deleted when the plans or the memberships change, the timeout is a safety net
+ENTITLEMENTS_CACHE_TIMEOUT = 10 * 60
+
+
+def get_entitlements_cache_key(user_id):
+    return f"entitlements:{user_id}"
+
+
+def get_cached_entitlements(user_id):
+    return cache.get(get_entitlements_cache_key(user_id))
+
+
+def set_cached_entitlements(user_id, entitlements):
+    cache.set(get_entitlements_cache_key(user_id), entitlements, ENTITLEMENTS_CACHE_TIMEOUT)
+
+
+def delete_entitlements_cache(*user_ids):
+    keys = [get_entitlements_cache_key(user_id) for user_id in user_ids if user_id]
+    if keys:
+        cache.delete_many(keys=keys)
+
+
+def delete_enterprise_entitlements_cache(*enterprise_ids):
+    """
+    Delete the entitlements of all members of the enterprises
+    """
+    from cystack_models.models.enterprises.members.enterprise_members import EnterpriseMember
+
+    if not enterprise_ids:
+        return
+    user_ids = EnterpriseMember.objects.filter(
+        enterprise_id__in=enterprise_ids, user_id__isnull=False
+    ).values_list('user_id', flat=True)
+    delete_entitlements_cache(*set(user_ids))
+
+
+def delete_plan_owner_entitlements_cache(user_id):
+    """
+    The cipher limits of the enterprise members come from the plan of their primary admin.
+    Delete the entitlements of the user and of the members of the enterprises which the user is the primary admin
+    """
+    from cystack_models.models.enterprises.members.enterprise_members import EnterpriseMember
+    from shared.constants.enterprise_members import E_MEMBER_ROLE_PRIMARY_ADMIN
+
+    enterprise_ids = EnterpriseMember.objects.filter(
+        user_id=user_id, role_id=E_MEMBER_ROLE_PRIMARY_ADMIN
+    ).values_list('enterprise_id', flat=True)
+    delete_entitlements_cache(user_id)
+    delete_enterprise_entitlements_cache(*enterprise_ids)
@@ -0,0 +1,115 @@
+from django.core.cache import cache
+
+from shared.constants.enterprise_members import E_MEMBER_STATUS_CONFIRMED, E_MEMBER_STATUS_REQUESTED, \
+    E_MEMBER_STATUS_INVITED, E_MEMBER_ROLE_ADMIN, E_MEMBER_ROLE_PRIMARY_ADMIN
+from shared.constants.policy import POLICY_TYPE_BLOCK_FAILED_LOGIN, POLICY_TYPE_2FA
+
+
+# The snapshots are deleted when the memberships or the policies change, the timeout is a safety net
+LOGIN_POLICY_CACHE_TIMEOUT = 10 * 60
+
+
+def get_login_policy_cache_key(user_id):
+    return f"login_policy:{user_id}"
+
+
+def build_login_policy_snapshot(user_id):
+    """
+    Compile the enterprise login policies of the user by a constant number of queries
+    :param user_id: (int) The user id
+    :return: (dict) The snapshot:
+        - enterprise_ids: The ids of the confirmed enterprises
+        - inactive_member: The user is deactivated in a confirmed enterprise
+        - pending_domain_member: The user is invited or requested by a domain of an enterprise
+        - locked_enterprise: A confirmed enterprise is locked
+        - require_2fa: A 2FA policy applies to the user
+        - failed_login_policy: The strictest failed login policy or None
+    """
+    from cystack_models.models.enterprises.members.enterprise_members import EnterpriseMember
+    from cystack_models.models.enterprises.policy.policy import EnterprisePolicy
+
+    members = list(EnterpriseMember.objects.filter(user_id=user_id).values(
+        'enterprise_id', 'status', 'role_id', 'is_activated', 'domain_id', 'enterprise__locked'
+    ))
+    confirmed_members = {m.get("enterprise_id"): m for m in members if m.get("status") == E_MEMBER_STATUS_CONFIRMED}
+    snapshot = {
+        "enterprise_ids": list(confirmed_members.keys()),
+        "inactive_member": any(m.get("is_activated") is False for m in confirmed_members.values()),
+        "pending_domain_member": any(
+            m.get("status") in [E_MEMBER_STATUS_REQUESTED, E_MEMBER_STATUS_INVITED] and m.get("domain_id") is not None
+            for m in members
+        ),
+        "locked_enterprise": any(m.get("enterprise__locked") is True for m in confirmed_members.values()),
+        "require_2fa": False,
+        "failed_login_policy": None,
+    }
+    if not confirmed_members:
+        return snapshot
+
+    policies = EnterprisePolicy.objects.filter(
+        enterprise_id__in=list(confirmed_members.keys()), enabled=True,
+        policy_type__in=[POLICY_TYPE_BLOCK_FAILED_LOGIN, POLICY_TYPE_2FA]
+    ).values(
+        'enterprise_id', 'policy_type', 'policy_2fa__only_admin',
+        'policy_failed_login__failed_login_attempts', 'policy_failed_login__failed_login_duration',
+        'policy_failed_login__failed_login_block_time', 'policy_failed_login__failed_login_owner_email',
+    ).order_by('id')
+    failed_login_policies = []
+    for policy in policies:
+        if policy.get("policy_type") == POLICY_TYPE_2FA:
+            member_role = confirmed_members[policy.get("enterprise_id")].get("role_id")
+            only_admin = policy.get("policy_2fa__only_admin")
+            if only_admin is False or \
+                    (only_admin and member_role in [E_MEMBER_ROLE_ADMIN, E_MEMBER_ROLE_PRIMARY_ADMIN]):
+                snapshot["require_2fa"] = True
+        elif policy.get("policy_failed_login__failed_login_attempts") and \
+                policy.get("policy_failed_login__failed_login_duration"):
+            failed_login_policies.append(policy)
+
+    if failed_login_policies:
+        # The strictest policy has the lowest rate of allowed failed attempts
+        policy = min(failed_login_policies, key=lambda p: (
+            p.get("policy_failed_login__failed_login_attempts") * 1.0 /
+            p.get("policy_failed_login__failed_login_duration")
+        ))
+        owner = EnterpriseMember.objects.filter(
+            enterprise_id=policy.get("enterprise_id"), is_primary=True
+        ).values_list('user_id', flat=True).first()
+        snapshot["failed_login_policy"] = {
+            "enterprise_id": policy.get("enterprise_id"),
+            "failed_login_attempts": policy.get("policy_failed_login__failed_login_attempts"),
+            "failed_login_duration": policy.get("policy_failed_login__failed_login_duration"),
+            "failed_login_block_time": policy.get("policy_failed_login__failed_login_block_time"),
+            "failed_login_owner_email": policy.get("policy_failed_login__failed_login_owner_email"),
+            "owner": owner,
+        }
+    return snapshot
+
+
+def get_login_policy_snapshot(user_id):
+    cache_key = get_login_policy_cache_key(user_id)
+    snapshot = cache.get(cache_key)
+    if snapshot is None:
+        snapshot = build_login_policy_snapshot(user_id=user_id)
+        cache.set(cache_key, snapshot, LOGIN_POLICY_CACHE_TIMEOUT)
+    return snapshot
+
+
+def delete_login_policy_snapshots(*user_ids):
+    keys = [get_login_policy_cache_key(user_id) for user_id in user_ids if user_id]
+    if keys:
+        cache.delete_many(keys=keys)
+
+
+def delete_enterprise_login_policy_snapshots(*enterprise_ids):
+    """
+    Delete the snapshots of all members of the enterprises
+    """
+    from cystack_models.models.enterprises.members.enterprise_members import EnterpriseMember
+
+    if not enterprise_ids:
+        return
+    user_ids = EnterpriseMember.objects.filter(
+        enterprise_id__in=enterprise_ids, user_id__isnull=False
+    ).values_list('user_id', flat=True)
+    delete_login_policy_snapshots(*set(user_ids))
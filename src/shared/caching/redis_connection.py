@@ -0,0 +1,18 @@
+try:
+    from redis.exceptions import RedisError
+except ImportError:
+    class RedisError(Exception):
+        pass
+
+
+def get_redis_connection():
+    """
+    Get the raw Redis client of the default cache. Unlike the cache, the raw client does not ignore the Redis errors
+    (IGNORE_EXCEPTIONS), so the callers catch `RedisError`
+    :return: The Redis client or None if the default cache is not Redis
+    """
+    try:
+        from django_redis import get_redis_connection as get_django_redis_connection
+        return get_django_redis_connection("default")
+    except (ImportError, NotImplementedError):
+        return None
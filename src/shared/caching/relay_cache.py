@@ -0,0 +1,119 @@
+import threading
+
+from django.core.cache import cache
+
+
+RELAY_ADDRESS_CACHE_TIMEOUT = 10 * 60               # 10 minutes
+RELAY_ADDRESS_NEGATIVE_CACHE_TIMEOUT = 60           # 1 minute
+RELAY_ADDRESS_NOT_FOUND = "not_found"
+
+_metrics_lock = threading.Lock()
+RELAY_CACHE_METRICS = {"hits": 0, "negative_hits": 0, "misses": 0}
+
+
+def get_relay_address_cache_key(email: str):
+    return f"relay_address:{email.lower()}"
+
+
+def parse_relay_email(email: str):
+    """
+    Split a relay email into (address, domain_id, subdomain). The subdomain is None if the email does not use it
+    """
+    try:
+        address, full_domain = email.lower().split("@")
+    except (AttributeError, ValueError):
+        return None
+    if full_domain.count(".") == 1:
+        return address, full_domain, None
+    subdomain = full_domain.split(".")[0]
+    return address, full_domain.replace(f"{subdomain}.", "", 1), subdomain
+
+
+def _incr_metrics(**metrics):
+    with _metrics_lock:
+        for name, value in metrics.items():
+            RELAY_CACHE_METRICS[name] += value
+
+
+def get_relay_cache_metrics():
+    with _metrics_lock:
+        metrics = dict(RELAY_CACHE_METRICS)
+    total = metrics["hits"] + metrics["negative_hits"] + metrics["misses"]
+    metrics["hit_rate"] = (metrics["hits"] + metrics["negative_hits"]) / total if total else 0
+    return metrics
+
+
+def _query_relay_addresses(emails):
+    from cystack_models.models.relay.relay_addresses import RelayAddress
+    parsed_emails = {email: parse_relay_email(email) for email in emails}
+    addresses = [parsed[0] for parsed in parsed_emails.values() if parsed]
+    # The address is unique, so one query resolves all emails. The domain and the subdomain are checked here
+    relay_addresses = RelayAddress.objects.filter(address__in=addresses).values(
+        'id', 'address', 'user_id', 'domain_id', 'enabled', 'block_spam', 'subdomain__subdomain', 'subdomain__is_deleted'
+    )
+    relay_addresses_dict = {relay_address.get("address").lower(): relay_address for relay_address in relay_addresses}
+    results = {}
+    for email, parsed in parsed_emails.items():
+        relay_address = relay_addresses_dict.get(parsed[0]) if parsed else None
+        if not relay_address or relay_address.get("domain_id") != parsed[1]:
+            results[email] = None
+            continue
+        subdomain = relay_address.get("subdomain__subdomain")
+        if parsed[2] != (subdomain.lower() if subdomain else None) or relay_address.get("subdomain__is_deleted"):
+            results[email] = None
+            continue
+        results[email] = {
+            "id": relay_address.get("id"),
+            "user_id": relay_address.get("user_id"),
+            "enabled": relay_address.get("enabled"),
+            "block_spam": relay_address.get("block_spam"),
+        }
+    return results
+
+
+def resolve_multiple_relay_addresses(emails):
+    """
+    Resolve the relay emails from the cache, the missed emails are resolved by one query and cached.
+    The unknown emails are cached as not found for a short time
+    :param emails: (list) List relay emails
+    :return: (dict) {email: {"id", "user_id", "enabled", "block_spam"} or None}
+    """
+    emails = list(dict.fromkeys(email for email in emails if email))
+    cache_keys = {get_relay_address_cache_key(email): email for email in emails}
+    cached_data = cache.get_many(list(cache_keys.keys()))
+    results = {}
+    for cache_key, value in cached_data.items():
+        results[cache_keys[cache_key]] = None if value == RELAY_ADDRESS_NOT_FOUND else value
+    missed_emails = [email for email in emails if email not in results]
+    _incr_metrics(
+        hits=len([v for v in results.values() if v is not None]),
+        negative_hits=len([v for v in results.values() if v is None]),
+        misses=len(missed_emails)
+    )
+    if missed_emails:
+        queried_results = _query_relay_addresses(missed_emails)
+        found_data = {get_relay_address_cache_key(e): v for e, v in queried_results.items() if v is not None}
+        not_found_data = {
+            get_relay_address_cache_key(e): RELAY_ADDRESS_NOT_FOUND for e, v in queried_results.items() if v is None
+        }
+        if found_data:
+            cache.set_many(found_data, RELAY_ADDRESS_CACHE_TIMEOUT)
+        if not_found_data:
+            cache.set_many(not_found_data, RELAY_ADDRESS_NEGATIVE_CACHE_TIMEOUT)
+        results.update(queried_results)
+    return results
+
+
+def resolve_relay_address(email: str):
+    """
+    :return: (dict) {"id", "user_id", "enabled", "block_spam"} or None if the relay address does not exist
+    """
+    if not email:
+        return None
+    return resolve_multiple_relay_addresses([email]).get(email)
+
+
+def delete_relay_address_cache(*emails):
+    keys = [get_relay_address_cache_key(email) for email in emails if email]
+    if keys:
+        cache.delete_many(keys=keys)
@@ -0,0 +1,87 @@
+from django.db.models import F, Case, When, Value, IntegerField
+
+from shared.caching.redis_connection import RedisError, get_redis_connection
+from shared.constants.relay_address import RELAY_STATISTIC_TYPE_FORWARDED, RELAY_STATISTIC_TYPE_BLOCKED_SPAM
+from shared.log.cylog import CyLog
+
+
+RELAY_COUNTERS_PENDING_KEY = "relay_counters:pending"
+RELAY_COUNTERS_PROCESSING_KEY = "relay_counters:processing"
+RELAY_COUNTER_FIELDS = {
+    RELAY_STATISTIC_TYPE_FORWARDED: "num_forwarded",
+    RELAY_STATISTIC_TYPE_BLOCKED_SPAM: "num_spam",
+}
+
+
+def _update_relay_counters(counters):
+    """
+    Add the counters to the relay addresses by one UPDATE statement per counter field
+    :param counters: (dict) {(relay_address_id, statistic_type): amount}
+    """
+    from cystack_models.models.relay.relay_addresses import RelayAddress
+    for statistic_type, field_name in RELAY_COUNTER_FIELDS.items():
+        amounts = {
+            relay_address_id: amount for (relay_address_id, s_type), amount in counters.items()
+            if s_type == statistic_type and amount
+        }
+        if not amounts:
+            continue
+        RelayAddress.objects.filter(id__in=list(amounts.keys())).update(**{
+            field_name: F(field_name) + Case(
+                *[When(id=relay_address_id, then=Value(amount)) for relay_address_id, amount in amounts.items()],
+                default=Value(0), output_field=IntegerField()
+            )
+        })
+
+
+def incr_multiple_relay_counters(counters):
+    """
+    Accumulate the relay statistics in Redis. They are written to the database by `flush_relay_counters`.
+    If Redis is not available, the counters are written to the database directly
+    :param counters: (dict) {(relay_address_id, statistic_type): amount}
+    """
+    counters = {key: amount for key, amount in counters.items() if key[1] in RELAY_COUNTER_FIELDS and amount}
+    if not counters:
+        return
+    redis_connection = get_redis_connection()
+    if redis_connection is None:
+        _update_relay_counters(counters)
+        return
+    try:
+        pipeline = redis_connection.pipeline(transaction=False)
+        for (relay_address_id, statistic_type), amount in counters.items():
+            pipeline.hincrby(RELAY_COUNTERS_PENDING_KEY, f"{relay_address_id}:{statistic_type}", amount)
+        pipeline.execute()
+    except RedisError as e:
+        CyLog.warning(**{"message": f"[incr_multiple_relay_counters] Write the counters to the database: {e}"})
+        _update_relay_counters(counters)
+
+
+def incr_relay_counter(relay_address_id, statistic_type, amount=1):
+    incr_multiple_relay_counters({(relay_address_id, statistic_type): amount})
+
+
+def flush_relay_counters():
+    """
+    Move the pending counters to the processing hash, write them by bulk updates, then delete the hash.
+    A processing hash left by a failed flush is written first
+    :return: (int) Number of flushed counters
+    """
+    redis_connection = get_redis_connection()
+    if redis_connection is None:
+        return 0
+    if not redis_connection.exists(RELAY_COUNTERS_PROCESSING_KEY):
+        if not redis_connection.exists(RELAY_COUNTERS_PENDING_KEY):
+            return 0
+        redis_connection.rename(RELAY_COUNTERS_PENDING_KEY, RELAY_COUNTERS_PROCESSING_KEY)
+    counters = {}
+    for field, amount in redis_connection.hgetall(RELAY_COUNTERS_PROCESSING_KEY).items():
+        field = field.decode() if isinstance(field, bytes) else field
+        try:
+            relay_address_id, statistic_type = field.split(":", 1)
+            counters[(int(relay_address_id), statistic_type)] = int(amount)
+        except ValueError:
+            CyLog.warning(**{"message": f"[flush_relay_counters] Invalid counter {field}"})
+    _update_relay_counters(counters)
+    redis_connection.delete(RELAY_COUNTERS_PROCESSING_KEY)
+    return len(counters)
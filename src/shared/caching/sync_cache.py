@@ -1,15 +1,112 @@
+import threading
+import time
+
 from django.core.cache import cache
 
+from shared.caching.redis_connection import RedisError, get_redis_connection
+from shared.log.cylog import CyLog
+
 
 SYNC_CACHE_TIMEOUT = 24 * 60 * 60        # 24 hours
 
+# The sync endpoints which cache their responses
+SYNC_CACHE_ENDPOINT_SYNC = "sync"
+
+# The metrics are counted in a Redis hash {"<endpoint>:hits", "<endpoint>:misses", "invalidations"}, so they cover
+# all workers. Without Redis, they are counted by the current process only
+SYNC_CACHE_METRICS_KEY = "sync_cache:metrics"
+_metrics_lock = threading.Lock()
+SYNC_CACHE_METRICS = {"endpoints": {}, "invalidations": 0}
+
+
+def get_sync_version_key(user_id):
+    return f"sync_version:{user_id}"
+
+
+def get_sync_version(user_id):
+    """
+    Get the sync version of the user. The cached sync pages embed this version, so increasing it invalidates them.
+    A missing version starts from the current time, so it does not reuse the versions of the evicted pages
+    """
+    version_key = get_sync_version_key(user_id)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, int(time.time() * 1000), timeout=None)
+        version = cache.get(version_key)
+    return version
+
 
-def get_sync_cache_key(user_id, page, size=100):
-    return f"sync:{user_id}:{size}:{page}"
+def get_sync_cache_key(user_id, page, size=100, version=None):
+    if version is None:
+        version = get_sync_version(user_id=user_id)
+    return f"sync:{user_id}:{version}:{size}:{page}"
+
+
+def incr_sync_cache_metrics(endpoint, hit: bool):
+    redis_connection = get_redis_connection()
+    if redis_connection is not None:
+        try:
+            redis_connection.hincrby(SYNC_CACHE_METRICS_KEY, "{}:{}".format(endpoint, "hits" if hit else "misses"), 1)
+        except RedisError:
+            # The metrics are not worth failing the sync
+            pass
+        return
+    with _metrics_lock:
+        endpoint_metrics = SYNC_CACHE_METRICS["endpoints"].setdefault(endpoint, {"hits": 0, "misses": 0})
+        endpoint_metrics["hits" if hit else "misses"] += 1
+
+
+def get_sync_cache_metrics():
+    redis_connection = get_redis_connection()
+    if redis_connection is not None:
+        metrics = {"endpoints": {}, "invalidations": 0}
+        for field, value in redis_connection.hgetall(SYNC_CACHE_METRICS_KEY).items():
+            field = field.decode() if isinstance(field, bytes) else field
+            if field == "invalidations":
+                metrics["invalidations"] = int(value)
+                continue
+            endpoint, name = field.rsplit(":", 1)
+            metrics["endpoints"].setdefault(endpoint, {"hits": 0, "misses": 0})[name] = int(value)
+    else:
+        with _metrics_lock:
+            metrics = {
+                "endpoints": {endpoint: dict(m) for endpoint, m in SYNC_CACHE_METRICS["endpoints"].items()},
+                "invalidations": SYNC_CACHE_METRICS["invalidations"]
+            }
+    for endpoint_metrics in metrics["endpoints"].values():
+        total = endpoint_metrics["hits"] + endpoint_metrics["misses"]
+        endpoint_metrics["hit_rate"] = endpoint_metrics["hits"] / total if total else 0
+    return metrics
 
 
 def delete_sync_cache_data(user_id):
-    keys = cache.keys(f"sync:{user_id}:*")
-    if not keys:
+    return delete_multiple_sync_cache_data(user_ids=[user_id])
+
+
+def delete_multiple_sync_cache_data(user_ids):
+    """
+    Invalidate the sync cache of multiple users by increasing their sync versions in one pipeline.
+    The pages of the old versions are not read anymore, they expire by the cache timeout. If Redis is not available,
+    the invalidation is skipped: the writes do not fail by it, and the stale pages expire by the cache timeout
+    """
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+    redis_connection = get_redis_connection()
+    if redis_connection is not None:
+        try:
+            pipeline = redis_connection.pipeline(transaction=False)
+            for user_id in user_ids:
+                pipeline.incr(cache.make_key(get_sync_version_key(user_id)))
+            pipeline.hincrby(SYNC_CACHE_METRICS_KEY, "invalidations", len(user_ids))
+            pipeline.execute()
+        except RedisError as e:
+            CyLog.warning(**{"message": f"[delete_multiple_sync_cache_data] Cannot invalidate the sync cache: {e}"})
         return
-    return cache.delete_many(keys=keys)
+    for user_id in user_ids:
+        try:
+            cache.incr(get_sync_version_key(user_id))
+        except ValueError:
+            cache.add(get_sync_version_key(user_id), int(time.time() * 1000), timeout=None)
+    with _metrics_lock:
+        SYNC_CACHE_METRICS["invalidations"] += len(user_ids)
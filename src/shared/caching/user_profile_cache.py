@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+
+USER_PROFILE_CACHE_TIMEOUT = 60 * 60            # 1 hour in Redis
+USER_PROFILE_LOCAL_CACHE_TIMEOUT = 30           # 30 seconds in the process
+USER_PROFILE_LOCAL_CACHE_SIZE = 2048
+
+# The single profile endpoint and the batch endpoint return different profile shapes
+USER_PROFILE_NAMESPACE = "user_profile"
+USER_PROFILE_BATCH_NAMESPACE = "user_profile_batch"
+USER_PROFILE_NAMESPACES = [USER_PROFILE_NAMESPACE, USER_PROFILE_BATCH_NAMESPACE]
+
+
+class LocalTTLCache:
+    """
+    A small thread-safe LRU cache of the process. The entries expire after `timeout` seconds
+    """
+    def __init__(self, max_size=USER_PROFILE_LOCAL_CACHE_SIZE, timeout=USER_PROFILE_LOCAL_CACHE_TIMEOUT):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                self.data.pop(key, None)
+                return None
+            self.data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = (time.monotonic() + self.timeout, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+
+
+local_profile_cache = LocalTTLCache()
+
+
+def get_user_profile_cache_key(namespace, user_id):
+    return f"{namespace}:{user_id}"
+
+
+def get_cached_user_profiles(namespace, user_ids):
+    """
+    Get the cached profiles from the local cache, then from Redis
+    :return: (dict) {user_id: profile} of the cached user ids
+    """
+    profiles = {}
+    redis_keys = {}
+    for user_id in user_ids:
+        cache_key = get_user_profile_cache_key(namespace, user_id)
+        profile = local_profile_cache.get(cache_key)
+        if profile is not None:
+            profiles[user_id] = profile
+        else:
+            redis_keys[cache_key] = user_id
+    if redis_keys:
+        for cache_key, profile in cache.get_many(list(redis_keys.keys())).items():
+            local_profile_cache.set(cache_key, profile)
+            profiles[redis_keys[cache_key]] = profile
+    return profiles
+
+
+def set_cached_user_profiles(namespace, profiles):
+    """
+    :param profiles: (dict) {user_id: profile}
+    """
+    if not profiles:
+        return
+    cache_data = {}
+    for user_id, profile in profiles.items():
+        cache_key = get_user_profile_cache_key(namespace, user_id)
+        local_profile_cache.set(cache_key, profile)
+        cache_data[cache_key] = profile
+    cache.set_many(cache_data, USER_PROFILE_CACHE_TIMEOUT)
+
+
+def delete_user_profile_cache(*user_ids):
+    """
+    Invalidate the cached profiles of the users. The local caches of the other processes expire by their short timeout
+    """
+    cache_keys = [
+        get_user_profile_cache_key(namespace, user_id) for namespace in USER_PROFILE_NAMESPACES for user_id in user_ids
+    ]
+    for cache_key in cache_keys:
+        local_profile_cache.delete(cache_key)
+    if cache_keys:
+        cache.delete_many(keys=cache_keys)
@@ -0,0 +1,74 @@
+import os
+
+from shared.caching.redis_connection import RedisError, get_redis_connection
+from shared.log.cylog import CyLog
+
+
+# The user statistics are only built on production, so the changes are not recorded elsewhere
+USER_STATISTIC_CHANGES_ENABLED = os.getenv("PROD_ENV") == "prod"
+USER_STATISTIC_CHANGES_PENDING_KEY = "user_statistic_changes:pending"
+USER_STATISTIC_CHANGES_PROCESSING_KEY = "user_statistic_changes:processing"
+
+# The sources of the user statistics. A change of a source refreshes its statistic fields of the user
+USER_STATISTIC_SOURCE_USER = "user"
+USER_STATISTIC_SOURCE_CIPHERS = "ciphers"
+USER_STATISTIC_SOURCE_DEVICES = "devices"
+USER_STATISTIC_SOURCE_PAYMENTS = "payments"
+USER_STATISTIC_SOURCE_RELAY_ADDRESSES = "relay_addresses"
+USER_STATISTIC_SOURCES = [
+    USER_STATISTIC_SOURCE_USER, USER_STATISTIC_SOURCE_CIPHERS, USER_STATISTIC_SOURCE_DEVICES,
+    USER_STATISTIC_SOURCE_PAYMENTS, USER_STATISTIC_SOURCE_RELAY_ADDRESSES
+]
+
+
+def record_user_statistic_changes(source, *user_ids):
+    """
+    Record that a statistic source of the users changed. The change log is a Redis hash {"<source>:<user_id>": count},
+    so many changes of a user are folded into one entry. If Redis is not available, the error is only logged, so the
+    writes of the users never fail by it. The missed changes are caught up by the daily reconciliation
+    :param source: (str) One of USER_STATISTIC_SOURCES
+    :param user_ids: (list) The changed users
+    """
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids or not USER_STATISTIC_CHANGES_ENABLED:
+        return
+    redis_connection = get_redis_connection()
+    if redis_connection is None:
+        return
+    try:
+        pipeline = redis_connection.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipeline.hincrby(USER_STATISTIC_CHANGES_PENDING_KEY, f"{source}:{user_id}", 1)
+        pipeline.execute()
+    except RedisError as e:
+        CyLog.warning(**{"message": f"[record_user_statistic_changes] Cannot record the {source} changes: {e}"})
+
+
+def pop_user_statistic_changes():
+    """
+    Move the pending changes to the processing hash and read them. A processing hash left by a failed fold is read
+    again. The caller deletes it by `ack_user_statistic_changes` when the changes are folded
+    :return: (dict) {source: set of user ids}
+    """
+    redis_connection = get_redis_connection()
+    if redis_connection is None:
+        return {}
+    if not redis_connection.exists(USER_STATISTIC_CHANGES_PROCESSING_KEY):
+        if not redis_connection.exists(USER_STATISTIC_CHANGES_PENDING_KEY):
+            return {}
+        redis_connection.rename(USER_STATISTIC_CHANGES_PENDING_KEY, USER_STATISTIC_CHANGES_PROCESSING_KEY)
+    changes = {}
+    for field in redis_connection.hkeys(USER_STATISTIC_CHANGES_PROCESSING_KEY):
+        field = field.decode() if isinstance(field, bytes) else field
+        try:
+            source, user_id = field.split(":", 1)
+            changes.setdefault(source, set()).add(int(user_id))
+        except ValueError:
+            CyLog.warning(**{"message": f"[user_statistic_changes] Invalid change {field}"})
+    return changes
+
+
+def ack_user_statistic_changes():
+    redis_connection = get_redis_connection()
+    if redis_connection is not None:
+        redis_connection.delete(USER_STATISTIC_CHANGES_PROCESSING_KEY)
@@ -73,3 +73,16 @@ LIST_CUSTOM_FIELD_TYPE = [
     CUSTOM_FIELD_TYPE_URL, CUSTOM_FIELD_TYPE_EMAIL, CUSTOM_FIELD_TYPE_ADDRESS,
     CUSTOM_FIELD_TYPE_DATE, CUSTOM_FIELD_TYPE_MONTH_YEAR, CUSTOM_FIELD_TYPE_PHONE
 ]
+
+
+# Delta sync: the kinds of hard-deleted objects are recorded as tombstones
+SYNC_TOMBSTONE_CIPHER = "cipher"
+SYNC_TOMBSTONE_FOLDER = "folder"
+SYNC_TOMBSTONE_COLLECTION = "collection"
+# A user lost the access to a team (or to some of its collections) => Their delta sync falls back to the full sync
+SYNC_TOMBSTONE_ACCESS = "access"
+# A user got (or changed) the access to some ciphers of a team. These ciphers keep their revision dates, so they are
+# not in the delta => The delta sync falls back to the full sync too
+SYNC_TOMBSTONE_ACCESS_GAIN = "access_gain"
+# Tombstones older than this are purged, so the delta requests older than it fall back to the full sync
+SYNC_TOMBSTONE_RETENTION = 30 * 86400           # 30 days
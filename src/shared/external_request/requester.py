@@ -1,8 +1,14 @@
+import http.cookiejar
 import json
 import os
+import random
+import threading
 import urllib3
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 from requests import Response
+from requests.adapters import HTTPAdapter
 import time
 
 from django.conf import settings
@@ -14,6 +20,115 @@ from shared.error_responses.error import refer_error, gen_error
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
+REQUESTER_POOL_CONNECTIONS = 10         # Number of hosts which have a connection pool
+REQUESTER_POOL_MAXSIZE = 10             # Number of kept-alive connections per host
+REQUESTER_GATEWAY_POOL_MAXSIZE = int(os.getenv("REQUESTER_GATEWAY_POOL_MAXSIZE", 30))
+REQUESTER_BACKOFF_BASE = 0.5            # Seconds
+REQUESTER_BACKOFF_MAX = 10              # Seconds
+REQUESTER_BREAKER_THRESHOLD = 5         # Consecutive failures to open the circuit of an endpoint
+REQUESTER_BREAKER_COOLDOWN = 30         # Seconds before a trial request is allowed on an open circuit
+REQUESTER_BREAKER_MAX_ENDPOINTS = 1000  # The stale endpoints are pruned beyond this number
+REQUESTER_BATCH_MAX_WORKERS = 10
+REQUESTER_METHODS = ["get", "post", "put", "delete"]
+
+
+def _create_session():
+    session = requests.Session()
+    session.verify = False
+    # The session is shared by all callers and hosts, so it must not keep the cookies of a response for later calls
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    session.mount("http://", HTTPAdapter(pool_connections=REQUESTER_POOL_CONNECTIONS, pool_maxsize=REQUESTER_POOL_MAXSIZE))
+    session.mount("https://", HTTPAdapter(pool_connections=REQUESTER_POOL_CONNECTIONS, pool_maxsize=REQUESTER_POOL_MAXSIZE))
+    # Most of the calls go to the gateway, so it has a larger pool
+    gateway_api = getattr(settings, "GATEWAY_API", None)
+    if gateway_api:
+        session.mount(gateway_api, HTTPAdapter(pool_connections=1, pool_maxsize=REQUESTER_GATEWAY_POOL_MAXSIZE))
+    return session
+
+
+session = _create_session()
+
+
+class CircuitBreaker:
+    """
+    Count the consecutive failures of each endpoint (method + scheme + host). The paths are not a part of the endpoint,
+    so the paths with ids (e.g. `/users/<id>`) share the breaker of their host.
+    The circuit is open after `REQUESTER_BREAKER_THRESHOLD` failures: the requests fail fast until
+    the cooldown is over, then one trial request decides to close or to re-open the circuit.
+    The failures older than the cooldown are not consecutive anymore, they are reset and pruned
+    """
+    def __init__(self, threshold=REQUESTER_BREAKER_THRESHOLD, cooldown=REQUESTER_BREAKER_COOLDOWN,
+                 max_endpoints=REQUESTER_BREAKER_MAX_ENDPOINTS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_endpoints = max_endpoints
+        self.lock = threading.Lock()
+        self.failures = {}          # {endpoint: (number of consecutive failures, time of the last failure)}
+        self.opened_at = {}
+
+    @staticmethod
+    def get_endpoint(method, url):
+        split_url = urlsplit(url)
+        return "{} {}://{}".format(method.upper(), split_url.scheme, split_url.netloc)
+
+    def allow(self, endpoint):
+        with self.lock:
+            opened_at = self.opened_at.get(endpoint)
+            if opened_at is None:
+                return True
+            if time.monotonic() - opened_at < self.cooldown:
+                return False
+            # Half-open: let this request try, the others wait for a new cooldown
+            self.opened_at[endpoint] = time.monotonic()
+            return True
+
+    def record_success(self, endpoint):
+        with self.lock:
+            self.failures.pop(endpoint, None)
+            self.opened_at.pop(endpoint, None)
+
+    def record_failure(self, endpoint):
+        current_time = time.monotonic()
+        with self.lock:
+            number_failures, last_failure_at = self.failures.get(endpoint, (0, current_time))
+            if current_time - last_failure_at >= self.cooldown:
+                number_failures = 0
+            self.failures[endpoint] = (number_failures + 1, current_time)
+            if number_failures + 1 >= self.threshold:
+                self.opened_at[endpoint] = current_time
+            if len(self.failures) > self.max_endpoints:
+                self._prune(current_time)
+
+    def _prune(self, current_time):
+        for endpoint, (number_failures, last_failure_at) in list(self.failures.items()):
+            if current_time - last_failure_at >= self.cooldown and endpoint not in self.opened_at:
+                self.failures.pop(endpoint, None)
+        # Still too many endpoints: keep the latest failures
+        if len(self.failures) > self.max_endpoints:
+            latest_endpoints = sorted(self.failures, key=lambda e: self.failures[e][1])[-self.max_endpoints:]
+            self.failures = {endpoint: self.failures[endpoint] for endpoint in latest_endpoints}
+            self.opened_at = {
+                endpoint: opened_at for endpoint, opened_at in self.opened_at.items() if endpoint in self.failures
+            }
+
+
+circuit_breaker = CircuitBreaker()
+
+
+def get_backoff(number_retries):
+    """
+    Exponential backoff with full jitter
+    """
+    return random.uniform(0, min(REQUESTER_BACKOFF_MAX, REQUESTER_BACKOFF_BASE * 2 ** number_retries))
+
+
+def _error_response(error_code):
+    res = Response()
+    res.status_code = 400
+    res._content = json.dumps(refer_error(gen_error(error_code))).encode('utf-8')
+    return res
+
+
 def requester(method, url, headers=None, data_send=None, retry=False, max_retries=10, timeout=10):
     if data_send is None:
         data_send = dict()
@@ -29,45 +144,45 @@ def requester(method, url, headers=None, data_send=None, retry=False, max_retrie
 
     if isinstance(data_send, dict) is False and isinstance(data_send, list) is False:
         # Invalid Json data
-        res = Response()
-        res.status_code = 400
-        res._content = json.dumps(refer_error(gen_error("0004"))).encode('utf-8')
-        return res
+        return _error_response("0004")
+    if method.lower() not in REQUESTER_METHODS:
+        return _error_response("0008")
 
+    endpoint = CircuitBreaker.get_endpoint(method, url)
     number_retries = 0
     while True:
+        if not circuit_breaker.allow(endpoint):
+            return _error_response("0009")
         try:
-            res = None
             if method.lower() == "get":
-                res = requests.get(headers=headers, url=url, verify=False, timeout=timeout)
-            elif method.lower() == "post":
-                res = requests.post(headers=headers, url=url, json=data_send, verify=False, timeout=timeout)
-            elif method.lower() == "put":
-                res = requests.put(headers=headers, url=url, json=data_send, verify=False, timeout=timeout)
-            elif method.lower() == "delete":
-                res = requests.delete(headers=headers, url=url, json=data_send, verify=False, timeout=timeout)
-            if res is None:
-                res = Response()
-                res.status_code = 400
-                res._content = json.dumps(refer_error(gen_error("0008"))).encode('utf-8')
-                return res
+                res = session.get(headers=headers, url=url, timeout=timeout)
+            else:
+                res = session.request(method.upper(), headers=headers, url=url, json=data_send, timeout=timeout)
+            if res.status_code >= 500:
+                circuit_breaker.record_failure(endpoint)
+            else:
+                circuit_breaker.record_success(endpoint)
             return res
         except (requests.exceptions.ConnectionError, requests.exceptions.ReadTimeout):
+            circuit_breaker.record_failure(endpoint)
             number_retries += 1
-            if retry:
-                if number_retries <= max_retries:
-                    time.sleep(3)
-                    continue
-                else:
-                    res = Response()
-                    res.status_code = 400
-                    res._content = json.dumps(refer_error(gen_error("0009"))).encode('utf-8')
-                    return res
-            else:
-                res = Response()
-                res.status_code = 400
-                res._content = json.dumps(refer_error(gen_error("0009"))).encode('utf-8')
-                return res
+            if retry and number_retries <= max_retries:
+                time.sleep(get_backoff(number_retries))
+                continue
+            return _error_response("0009")
+
+
+def requester_batch(requests_data, max_workers=REQUESTER_BATCH_MAX_WORKERS):
+    """
+    Send multiple requests concurrently through the shared connection pool
+    :param requests_data: (list) List dict of the `requester` arguments: {"method", "url", "headers", "data_send", ...}
+    :param max_workers: (int) Maximum number of the concurrent requests
+    :return: (list) The responses in the same order of `requests_data`
+    """
+    if not requests_data:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(requests_data))) as executor:
+        return list(executor.map(lambda request_data: requester(**request_data), requests_data))
 
 
 class RequesterError(requests.ConnectionError):
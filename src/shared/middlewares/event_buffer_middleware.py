@@ -0,0 +1,15 @@
+from shared.background.event_buffer import event_buffer
+
+
+class EventBufferMiddleware(object):
+    """
+    Flush the buffered audit events at the end of each request
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if event_buffer.get_metrics().get("pending"):
+            event_buffer.flush()
+        return response
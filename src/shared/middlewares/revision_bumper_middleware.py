@@ -0,0 +1,14 @@
+from core.utils.account_revision_date import revision_bumper
+
+
+class RevisionBumperMiddleware(object):
+    """
+    Coalesce all account revision date bumps of a request into one update at the end of the request
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with revision_bumper():
+            response = self.get_response(request)
+        return response
@@ -1,10 +1,10 @@
 import contextvars
 import jwt
 
-from django.conf import settings
 from django.utils.encoding import smart_text
 from rest_framework.authentication import get_authorization_header
 
+from shared.caching.auth_token_cache import decode_auth_token
 from shared.constants.token import TOKEN_PREFIX
 
 
@@ -59,7 +59,8 @@ class TenantDBMiddleware(object):
             token_value = token_value[len(TOKEN_PREFIX):]
 
         try:
-            payload = jwt.decode(token_value, settings.SECRET_KEY, algorithms=['HS256'])
+            # The verified token is cached, so the authentication does not decode it again
+            payload = decode_auth_token(token_value)
             user_id = payload.get('user_id', None)
 
             # Get profile in token
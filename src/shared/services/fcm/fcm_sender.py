@@ -6,6 +6,7 @@ from firebase_admin import messaging
 
 from shared.services.fcm.fcm_request_entity import FCMRequestEntity
 from shared.log.cylog import CyLog
+from shared.background.constants import BG_FCM
 from shared.background.i_background import BackgroundThread
 
 
@@ -29,7 +30,7 @@ class FCMSenderService:
 
         # Run background or not this function
         if self.is_background:
-            BackgroundThread(task=func, **kwargs)
+            BackgroundThread(task=func, queue_name=BG_FCM, **kwargs)
         else:
             func(**kwargs)
 
@@ -1,11 +1,19 @@
+import atexit
+import json
+import threading
+import traceback
+
 import requests
 
 from django.conf import settings
+from django.db import close_old_connections
 
+from shared.background.constants import BG_PM_SYNC
 from shared.background.i_background import BackgroundThread, background_exception_wrapper
-from shared.caching.sync_cache import delete_sync_cache_data
+from shared.caching.sync_cache import delete_multiple_sync_cache_data
 from shared.constants.members import PM_MEMBER_STATUS_CONFIRMED
-from shared.external_request.requester import requester
+from shared.external_request.requester import requester, requester_batch
+from shared.log.cylog import CyLog
 from shared.services.pm_sync import LIST_DELETE_SYNC_CACHE_EVENTS
 
 API_SYNC = "{}/micro_services/cystack_platform/pm/sync".format(settings.GATEWAY_API)
@@ -13,6 +21,7 @@ HEADERS = {
     'User-agent': 'CyStack Locker',
     "Authorization": settings.MICRO_SERVICE_USER_AUTH
 }
+SYNC_AGGREGATE_WINDOW = 1           # Seconds
 
 
 class PwdSync:
@@ -25,29 +34,45 @@ class PwdSync:
 
     def send(self, data=None, is_background=True):
         if is_background:
-            BackgroundThread(task=self.real_send, **{"data": data})
+            sync_aggregator.add(pwd_sync=self, data=data)
         else:
             self.real_send(data)
 
+    def get_team_ids(self):
+        if self.team:
+            return [self.team.id]
+        if self.teams:
+            return [getattr(team, "id", team) for team in self.teams]
+        return []
+
+    def get_user_ids(self, team_members):
+        """
+        Get the recipients of the event
+        :param team_members: (list) List tuple (team_id, user_id, status) of the members of `get_team_ids()`
+        :return: (list) The user ids
+        """
+        user_ids = list(self.user_ids or [])
+        team_ids = self.get_team_ids()
+        if not team_ids:
+            return user_ids
+        team_user_ids = [
+            user_id for team_id, user_id, status in team_members
+            # All members of `team` are notified, only the confirmed members of `teams` are notified
+            if team_id in team_ids and (self.team or status == PM_MEMBER_STATUS_CONFIRMED)
+        ]
+        return user_ids + team_user_ids if self.add_all else team_user_ids
+
     @background_exception_wrapper
     def real_send(self, data):
-        user_ids = []
-        if self.team:
-            team_user_ids = list(self.team.team_members.values_list('user_id', flat=True))
-            user_ids = user_ids + team_user_ids if self.add_all else team_user_ids
-        elif self.teams:
-            from cystack_models.models.members.team_members import TeamMember
-            teams_user_ids = list(TeamMember.objects.filter(
-                team__in=self.teams, status=PM_MEMBER_STATUS_CONFIRMED
-            ).values_list('user_id', flat=True).distinct())
-            user_ids = user_ids + teams_user_ids if self.add_all else teams_user_ids
-        else:
-            user_ids = user_ids + self.user_ids if self.add_all else self.user_ids
+        from cystack_models.models.members.team_members import TeamMember
+        team_members = list(TeamMember.objects.filter(
+            team_id__in=self.get_team_ids()
+        ).values_list('team_id', 'user_id', 'status')) if self.get_team_ids() else []
+        user_ids = self.get_user_ids(team_members=team_members)
         try:
             # Clear all sync cache data
             if self.event in LIST_DELETE_SYNC_CACHE_EVENTS:
-                for user_id in user_ids:
-                    delete_sync_cache_data(user_id=user_id)
+                delete_multiple_sync_cache_data(user_ids=user_ids)
             requester(method="POST", url=API_SYNC, headers=HEADERS, timeout=10, data_send={
                 "event": self.event,
                 "user_ids": list(set(user_ids)),
@@ -55,4 +80,109 @@ class PwdSync:
             })
         except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout,
                 requests.exceptions.ReadTimeout):
-            pass
\ No newline at end of file
+            pass
+
+
+class SyncAggregator:
+    """
+    Collect the sync events for a short window, then push them together:
+    - The recipients of all events are resolved by one team members query
+    - The identical events (same type and data) are merged, their recipient sets are unioned.
+      The `{"ids": [...]}` payloads of the same type are merged into one list
+    - The sync cache of all recipients is deleted by one batch
+    - The merged events are sent concurrently through the pooled requester
+    """
+    def __init__(self, window=SYNC_AGGREGATE_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.pending = []
+        self.timer = None
+        self.metrics = {"raw_events": 0, "pushes": 0, "merged": 0}
+
+    def add(self, pwd_sync: PwdSync, data=None):
+        with self.lock:
+            # Evaluate the teams now, the querysets may change before the flush
+            pwd_sync.teams = [getattr(team, "id", team) for team in pwd_sync.teams] if pwd_sync.teams else pwd_sync.teams
+            self.pending.append((pwd_sync, data))
+            self.metrics["raw_events"] += 1
+            if self.timer is None:
+                self.timer = threading.Timer(self.window, self.flush_background)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush_background(self):
+        pending = self.pop_pending()
+        if pending:
+            BackgroundThread(task=self.push, queue_name=BG_PM_SYNC, pending=pending)
+
+    def flush(self):
+        pending = self.pop_pending()
+        if not pending:
+            return
+        try:
+            self.push(pending)
+        except Exception:
+            CyLog.error(**{"message": "[SyncAggregator] Flush error: {}".format(traceback.format_exc())})
+
+    def pop_pending(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+            self.timer = None
+        return pending
+
+    def push(self, pending):
+        """
+        Push the pending events. The errors are raised, so the job queue retries the push with the same events
+        """
+        try:
+            pushes = self.merge(pending)
+            cache_user_ids = set()
+            for push in pushes:
+                if push["event"] in LIST_DELETE_SYNC_CACHE_EVENTS:
+                    cache_user_ids.update(push["user_ids"])
+            delete_multiple_sync_cache_data(user_ids=cache_user_ids)
+            requester_batch([{
+                "method": "POST", "url": API_SYNC, "headers": HEADERS, "timeout": 10, "data_send": push
+            } for push in pushes])
+            with self.lock:
+                self.metrics["pushes"] += len(pushes)
+                self.metrics["merged"] += len(pending) - len(pushes)
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def merge(pending):
+        from cystack_models.models.members.team_members import TeamMember
+        team_ids = set()
+        for pwd_sync, data in pending:
+            team_ids.update(pwd_sync.get_team_ids())
+        team_members = list(TeamMember.objects.filter(
+            team_id__in=team_ids
+        ).values_list('team_id', 'user_id', 'status')) if team_ids else []
+
+        pushes = {}
+        for pwd_sync, data in pending:
+            user_ids = {user_id for user_id in pwd_sync.get_user_ids(team_members=team_members) if user_id}
+            if not user_ids:
+                continue
+            if isinstance(data, dict) and list(data.keys()) == ["ids"] and isinstance(data["ids"], list):
+                push_key = (pwd_sync.event, "ids", frozenset(user_ids))
+            else:
+                push_key = (pwd_sync.event, json.dumps(data, sort_keys=True, default=str), None)
+            push = pushes.setdefault(push_key, {"event": pwd_sync.event, "user_ids": set(), "data": data})
+            push["user_ids"].update(user_ids)
+            if push_key[1] == "ids" and push["data"] is not data:
+                push["data"] = {"ids": list(dict.fromkeys(push["data"]["ids"] + data["ids"]))}
+        for push in pushes.values():
+            push["user_ids"] = list(push["user_ids"])
+        return list(pushes.values())
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.metrics)
+            metrics["pending"] = len(self.pending)
+        return metrics
+
+
+sync_aggregator = SyncAggregator()
+atexit.register(sync_aggregator.flush)
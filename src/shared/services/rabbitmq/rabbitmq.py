@@ -1,3 +1,7 @@
+import os
+import queue
+import threading
+
 import pika
 import json
 
@@ -6,6 +10,10 @@ from django.conf import settings
 from shared.services.rabbitmq.exceptions import *
 
 
+RABBITMQ_MAX_CHANNELS = int(os.getenv("RABBITMQ_MAX_CHANNELS", 4))
+RABBITMQ_CHECKOUT_TIMEOUT = 5           # Seconds to wait for a free channel
+
+
 class MessageBroker(object):
     def send(self, *args, **kwargs):
         raise NotImplementedError
@@ -57,12 +65,164 @@ class RabbitMQ(MessageBroker):
             self.connection.close()
 
 
-class RelayQueue(RabbitMQ):
+class PublisherChannel:
+    """
+    A connection with its confirmed channel. pika connections are not thread-safe,
+    so a channel is used by one thread at a time through the publisher pool
+    """
+    def __init__(self, url_connection, queue_name):
+        self.connection = RabbitMQ.connect(url_connection=url_connection)
+        self.channel = self.connection.channel()
+        self.channel.confirm_delivery()
+        self.channel.queue_declare(queue=queue_name, durable=True)
+
+    @property
+    def is_open(self):
+        return self.connection.is_open and self.channel.is_open
+
+    def is_alive(self):
+        """
+        Process the pending I/O of the connection without blocking: the heartbeats are answered and a connection closed
+        by the broker is detected here, before a message is published on it
+        """
+        if not self.is_open:
+            return False
+        try:
+            self.connection.process_data_events(time_limit=0)
+        except Exception:
+            return False
+        return self.is_open
+
+    def publish(self, queue_name, body):
+        # With the publisher confirms, this raises NackError/UnroutableError if the broker does not accept the message
+        self.channel.basic_publish(
+            exchange='',
+            routing_key=queue_name,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2         # make message persistent
+            ),
+            mandatory=True
+        )
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except Exception:
+            pass
+
+
+class RabbitMQPublisher(object):
+    """
+    A long-lived publisher of a queue. The channels are opened lazily, kept in a pool and reopened when they are broken.
+    If the broker is down, the publish fails and the caller must make its upstream retry the delivery
+    """
+    def __init__(self, url_connection, queue_name, max_channels=RABBITMQ_MAX_CHANNELS):
+        self.url_connection = url_connection
+        self.queue_name = queue_name
+        self.max_channels = max_channels
+        self.channels = queue.LifoQueue()
+        self.num_channels = 0
+        self.lock = threading.Lock()
+
+    def publish_multiple(self, messages):
+        """
+        Publish the messages on one pooled channel. The channel is reopened once if it is broken, then only the messages
+        which were not confirmed yet are published again
+        :param messages: (list) List str messages
+        :return: (bool) True if the broker confirmed the messages, False if the broker is unavailable
+        """
+        from shared.log.cylog import CyLog
+
+        # The publish of a confirmed channel returns when the broker confirmed the message
+        num_confirmed = 0
+        for attempt in range(2):
+            if num_confirmed >= len(messages):
+                break
+            publisher_channel = None
+            try:
+                publisher_channel = self._checkout()
+                for message in messages[num_confirmed:]:
+                    publisher_channel.publish(queue_name=self.queue_name, body=message)
+                    num_confirmed += 1
+                self._checkin(publisher_channel)
+            except (Exception, RabbitMQException):
+                self._discard(publisher_channel)
+                if attempt == 1:
+                    CyLog.error(**{"message": "[RabbitMQ] Can not publish {} of {} messages to {}".format(
+                        len(messages) - num_confirmed, len(messages), self.queue_name
+                    )})
+                    return False
+        return True
+
+    def publish(self, message):
+        return self.publish_multiple([message])
+
+    def _checkout(self) -> PublisherChannel:
+        # Reuse a pooled channel if its connection is still alive, the dead ones are discarded
+        while True:
+            try:
+                publisher_channel = self.channels.get_nowait()
+            except queue.Empty:
+                break
+            if publisher_channel.is_alive():
+                return publisher_channel
+            self._discard(publisher_channel)
+        with self.lock:
+            can_open = self.num_channels < self.max_channels
+            if can_open:
+                self.num_channels += 1
+        if can_open:
+            try:
+                return PublisherChannel(url_connection=self.url_connection, queue_name=self.queue_name)
+            except (Exception, RabbitMQException):
+                with self.lock:
+                    self.num_channels -= 1
+                raise
+        try:
+            publisher_channel = self.channels.get(timeout=RABBITMQ_CHECKOUT_TIMEOUT)
+        except queue.Empty:
+            raise RabbitConnectionError
+        if not publisher_channel.is_alive():
+            self._discard(publisher_channel)
+            raise RabbitConnectionError
+        return publisher_channel
+
+    def _checkin(self, publisher_channel: PublisherChannel):
+        if publisher_channel.is_open:
+            self.channels.put(publisher_channel)
+        else:
+            self._discard(publisher_channel)
+
+    def _discard(self, publisher_channel):
+        if publisher_channel is None:
+            return
+        publisher_channel.close()
+        with self.lock:
+            self.num_channels -= 1
+
+
+_publishers = {}
+_publishers_lock = threading.Lock()
+
+
+def get_publisher(url_connection, queue_name) -> RabbitMQPublisher:
+    publisher = _publishers.get((url_connection, queue_name))
+    if publisher is None:
+        with _publishers_lock:
+            publisher = _publishers.setdefault(
+                (url_connection, queue_name), RabbitMQPublisher(url_connection=url_connection, queue_name=queue_name)
+            )
+    return publisher
+
+
+class RelayQueue(MessageBroker):
     def __init__(self):
-        super(RelayQueue, self).__init__()
-        self.connection = self.connect(url_connection=settings.RELAY_QUEUE_URL)
-        self.queue_name = settings.RELAY_QUEUE
+        self.publisher = get_publisher(url_connection=settings.RELAY_QUEUE_URL, queue_name=settings.RELAY_QUEUE)
 
     def send(self, data):
-        data = json.dumps(data)
-        super(RelayQueue, self).send(data)
+        return self.publisher.publish(json.dumps(data))
+
+    def send_multiple(self, multiple_data):
+        return self.publisher.publish_multiple([json.dumps(data) for data in multiple_data])
@@ -68,6 +68,45 @@ class S3Service:
             tb = traceback.format_exc()
             CyLog.error(**{"message": "Upload IO to s3 error: {}".format(tb)})
 
+    def create_multipart_upload(self, key, acl="private", bucket=settings.AWS_S3_BUCKET, **kwargs):
+        """
+        Start a multipart upload
+        :param key: S3 key (path)
+        :param acl: public-read or private?
+        :param bucket: The bucket name
+        :param kwargs: The object params, e.g. ContentType, ContentEncoding, ContentDisposition
+        :return: (str) The upload id
+        """
+        response = self.client.create_multipart_upload(Bucket=bucket, Key=key, ACL=acl, **kwargs)
+        return response.get("UploadId")
+
+    def upload_part(self, key, upload_id, part_number, body, bucket=settings.AWS_S3_BUCKET):
+        """
+        Upload a part of a multipart upload. The parts except the last one must be at least 5MB
+        :return: (dict) {"PartNumber", "ETag"}
+        """
+        response = self.client.upload_part(
+            Bucket=bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body
+        )
+        return {"PartNumber": part_number, "ETag": response.get("ETag")}
+
+    def complete_multipart_upload(self, key, upload_id, parts, bucket=settings.AWS_S3_BUCKET):
+        """
+        :param parts: (list) The {"PartNumber", "ETag"} of the uploaded parts
+        """
+        self.client.complete_multipart_upload(
+            Bucket=bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={"Parts": sorted(parts, key=lambda part: part["PartNumber"])}
+        )
+        return key
+
+    def abort_multipart_upload(self, key, upload_id, bucket=settings.AWS_S3_BUCKET):
+        try:
+            self.client.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except ClientError:
+            tb = traceback.format_exc()
+            CyLog.error(**{"message": "Abort s3 multipart upload error: {}".format(tb)})
+
     def gen_one_time_url(self, file_path: str, is_cdn=False, source: str = settings.AWS_S3_BUCKET,
                          **kwargs) -> Optional[str]:
         """
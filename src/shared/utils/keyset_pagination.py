@@ -0,0 +1,71 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from shared.error_responses.error import gen_error
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate a queryset from the newest rows by a cursor on (`date_field`, id). The cursor is the position of the last
+    row of the previous page, so a page is an index range scan whatever its depth, instead of an OFFSET scan and sort.
+    The response is {"next": <url or None>, "results": [...]}
+    """
+    cursor_query_param = "cursor"
+    date_field = "creation_date"
+    page_size = 10
+    max_page_size = 1000
+
+    def __init__(self):
+        self.request = None
+        self.next_position = None
+
+    @staticmethod
+    def encode_cursor(position):
+        return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            date_value, object_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            return float(date_value), str(object_id)
+        except (TypeError, ValueError, UnicodeError):
+            raise ValidationError({"non_field_errors": [gen_error("0004")]})
+
+    def filter_queryset_by_cursor(self, queryset, cursor):
+        if not cursor:
+            return queryset
+        date_value, object_id = self.decode_cursor(cursor)
+        return queryset.filter(
+            Q(**{f"{self.date_field}__lt": date_value}) | Q(**{self.date_field: date_value, "id__lt": object_id})
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = min(self.page_size, self.max_page_size)
+        queryset = queryset.order_by(f"-{self.date_field}", "-id")
+        queryset = self.filter_queryset_by_cursor(queryset, request.query_params.get(self.cursor_query_param))
+        # Load one more row to know whether there is a next page
+        page = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = [getattr(page[-1], self.date_field), page[-1].id]
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data
+        })
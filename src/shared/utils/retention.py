@@ -0,0 +1,221 @@
+import json
+import os
+import time
+
+from django.core.cache import cache
+from django.db.models import Min
+
+from shared.utils.app import now
+
+
+RETENTION_CHUNK_SIZE = int(os.getenv("RETENTION_CHUNK_SIZE", 1000))                  # Rows of a delete chunk
+RETENTION_ROWS_PER_SECOND = int(os.getenv("RETENTION_ROWS_PER_SECOND", 2000))         # 0 is unlimited
+RETENTION_CHECKPOINT_TIMEOUT = 7 * 86400
+
+
+def get_retention_days(env_name, default):
+    return int(os.getenv(env_name, default))
+
+
+def get_retention_overrides(env_name):
+    """
+    Parse the per-enterprise retention windows from a JSON env: {"<enterprise_id>": <days>}
+    :return: (dict) {enterprise_id: days}
+    """
+    try:
+        overrides = json.loads(os.getenv(env_name) or "{}")
+    except ValueError:
+        return {}
+    return {str(enterprise_id): int(days) for enterprise_id, days in overrides.items() if days is not None}
+
+
+class RetentionPolicy:
+    """
+    Describe which rows of a model expire.
+    The rows of the scopes in `scope_windows` use their own windows, the other rows use `default_days`
+    """
+    def __init__(self, name, queryset, date_field, default_days, scope_field=None, scope_windows=None,
+                 returning_fields=None, on_deleted=None):
+        """
+        :param name: (str) The name of the policy, used by the checkpoints
+        :param queryset: (QuerySet) The candidate rows
+        :param date_field: (str) The float timestamp field which the windows apply to
+        :param default_days: (int) The default retention window
+        :param scope_field: (str) The field of `scope_windows` keys, e.g. team_id or user_id
+        :param scope_windows: (dict) {scope value: days}
+        :param returning_fields: (list) The fields of the deleted rows which are passed to `on_deleted`
+        :param on_deleted: (func) Called with the list of the deleted rows of each chunk
+        """
+        self.name = name
+        self.queryset = queryset
+        self.date_field = date_field
+        self.default_days = default_days
+        self.scope_field = scope_field
+        self.scope_windows = scope_windows or {}
+        self.returning_fields = returning_fields or []
+        self.on_deleted = on_deleted
+
+    def get_passes(self, current_time):
+        """
+        Split the policy into passes which have one cutoff each. The scopes of the same window share a pass
+        :return: (list) [(pass name, queryset, cutoff)]
+        """
+        scopes_by_days = {}
+        for scope, days in self.scope_windows.items():
+            scopes_by_days.setdefault(days, []).append(scope)
+        default_queryset = self.queryset
+        if scopes_by_days:
+            default_queryset = default_queryset.exclude(**{f"{self.scope_field}__in": list(self.scope_windows)})
+        passes = [("default", default_queryset, current_time - self.default_days * 86400)]
+        for days, scopes in sorted(scopes_by_days.items()):
+            passes.append((
+                f"{days}d",
+                self.queryset.filter(**{f"{self.scope_field}__in": scopes}),
+                current_time - days * 86400
+            ))
+        return passes
+
+
+class RetentionEngine:
+    """
+    Delete the expired rows of a policy by primary key ordered chunks. The deletes are throttled by a rows per second
+    budget, so one run does not hold long locks or flood the replication. The last deleted primary key of each pass
+    is checkpointed in the cache, so a crashed run is resumed without scanning the deleted range again
+    """
+    def __init__(self, policy: RetentionPolicy, chunk_size=RETENTION_CHUNK_SIZE,
+                 rows_per_second=RETENTION_ROWS_PER_SECOND):
+        self.policy = policy
+        self.chunk_size = chunk_size
+        self.rows_per_second = rows_per_second
+
+    def get_checkpoint_key(self, pass_name):
+        return f"retention_checkpoint:{self.policy.name}:{pass_name}"
+
+    def run(self, dry_run=False):
+        """
+        :param dry_run: (bool) Only count the expired rows
+        :return: (dict) {"deleted" or "expired", "seconds", "rows_per_second", "lag"}
+        The lag is the age in seconds of the oldest expired row which is still kept, 0 if the policy is up to date
+        """
+        current_time = now()
+        start_time = time.monotonic()
+        num_rows = 0
+        for pass_name, queryset, cutoff in self.policy.get_passes(current_time=current_time):
+            expired_queryset = queryset.filter(**{f"{self.policy.date_field}__lte": cutoff})
+            if dry_run:
+                num_rows += expired_queryset.count()
+            else:
+                num_rows += self.delete_pass(pass_name, expired_queryset, start_time, num_rows)
+        run_time = time.monotonic() - start_time
+        result = {
+            "expired" if dry_run else "deleted": num_rows,
+            "seconds": round(run_time, 3),
+            "rows_per_second": round(num_rows / run_time, 2) if run_time else 0,
+            "lag": self.get_lag(current_time=current_time)
+        }
+        return result
+
+    def delete_pass(self, pass_name, expired_queryset, start_time, num_previous_rows):
+        checkpoint_key = self.get_checkpoint_key(pass_name)
+        last_pk = cache.get(checkpoint_key)
+        fields = ['pk'] + [field for field in self.policy.returning_fields if field != 'pk']
+        num_rows = 0
+        while True:
+            chunk_queryset = expired_queryset.order_by('pk')
+            if last_pk is not None:
+                chunk_queryset = chunk_queryset.filter(pk__gt=last_pk)
+            rows = list(chunk_queryset.values(*fields)[:self.chunk_size])
+            if not rows:
+                break
+            pks = [row["pk"] for row in rows]
+            self.policy.queryset.model.objects.filter(pk__in=pks).delete()
+            if self.policy.on_deleted:
+                self.policy.on_deleted(rows)
+            num_rows += len(rows)
+            last_pk = pks[-1]
+            cache.set(checkpoint_key, last_pk, RETENTION_CHECKPOINT_TIMEOUT)
+            self.throttle(start_time=start_time, num_rows=num_previous_rows + num_rows)
+            if len(rows) < self.chunk_size:
+                break
+        cache.delete(checkpoint_key)
+        return num_rows
+
+    def throttle(self, start_time, num_rows):
+        if self.rows_per_second <= 0:
+            return
+        wait_time = num_rows / self.rows_per_second - (time.monotonic() - start_time)
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    def get_lag(self, current_time):
+        lag = 0
+        for pass_name, queryset, cutoff in self.policy.get_passes(current_time=current_time):
+            oldest_date = queryset.aggregate(oldest_date=Min(self.policy.date_field)).get("oldest_date")
+            if oldest_date is not None and oldest_date <= cutoff:
+                lag = max(lag, cutoff - oldest_date)
+        return lag
+
+
+def get_events_retention_policy():
+    """
+    The events are kept RETENTION_EVENTS_DAYS (90 days). The enterprises in RETENTION_EVENTS_ENTERPRISE_DAYS
+    ({"<enterprise_id>": days}) keep their activity logs for their own windows
+    """
+    from cystack_models.models.events.events import Event
+
+    return RetentionPolicy(
+        name="events",
+        queryset=Event.objects.all(),
+        date_field="creation_date",
+        default_days=get_retention_days("RETENTION_EVENTS_DAYS", 90),
+        scope_field="team_id",
+        scope_windows=get_retention_overrides("RETENTION_EVENTS_ENTERPRISE_DAYS")
+    )
+
+
+def get_trash_ciphers_retention_policies():
+    """
+    The ciphers are kept RETENTION_TRASH_CIPHERS_DAYS (30 days) in the trash. The members of the enterprises in
+    RETENTION_TRASH_CIPHERS_ENTERPRISE_DAYS use the window of their enterprise, the longest one if they are in many.
+    The deleted ciphers are recorded as sync tombstones, and the expired tombstones are deleted too
+    """
+    from cystack_models.models.ciphers.ciphers import Cipher
+    from cystack_models.models.ciphers.sync_tombstones import SyncTombstone
+    from cystack_models.models.enterprises.members.enterprise_members import EnterpriseMember
+    from shared.caching.user_statistic_changes import record_user_statistic_changes, USER_STATISTIC_SOURCE_CIPHERS
+    from shared.constants.ciphers import SYNC_TOMBSTONE_CIPHER, SYNC_TOMBSTONE_RETENTION
+
+    def on_deleted_trash_ciphers(rows):
+        SyncTombstone.create_multiple(SYNC_TOMBSTONE_CIPHER, *rows)
+        record_user_statistic_changes(USER_STATISTIC_SOURCE_CIPHERS, *[row["created_by_id"] for row in rows])
+
+    user_windows = {}
+    enterprise_windows = get_retention_overrides("RETENTION_TRASH_CIPHERS_ENTERPRISE_DAYS")
+    if enterprise_windows:
+        members = EnterpriseMember.objects.filter(
+            enterprise_id__in=list(enterprise_windows), user_id__isnull=False
+        ).values_list('user_id', 'enterprise_id')
+        for user_id, enterprise_id in members:
+            user_windows[user_id] = max(user_windows.get(user_id, 0), enterprise_windows[enterprise_id])
+    return [
+        RetentionPolicy(
+            name="trash_ciphers",
+            queryset=Cipher.objects.filter(deleted_date__isnull=False),
+            date_field="deleted_date",
+            default_days=get_retention_days("RETENTION_TRASH_CIPHERS_DAYS", 30),
+            scope_field="user_id",
+            scope_windows=user_windows,
+            returning_fields=['id', 'user_id', 'team_id', 'created_by_id'],
+            on_deleted=on_deleted_trash_ciphers
+        ),
+        RetentionPolicy(
+            name="sync_tombstones",
+            queryset=SyncTombstone.objects.all(),
+            date_field="deleted_date",
+            default_days=SYNC_TOMBSTONE_RETENTION // 86400
+        ),
+    ]
+
+
+def get_retention_policies():
+    return [get_events_retention_policy()] + get_trash_ciphers_retention_policies()
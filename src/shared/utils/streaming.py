@@ -0,0 +1,133 @@
+import json
+import struct
+import zlib
+
+from django.db.models import Q
+from rest_framework.utils.encoders import JSONEncoder
+
+
+STREAM_CHUNK_SIZE = 64 * 1024           # Bytes of a written chunk
+STREAM_BATCH_SIZE = 500                 # Objects of a database batch
+STREAM_GZIP_LEVEL = 6
+# The gzip header without file name and modification time
+GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff"
+
+
+def iter_batches_by_keyset(queryset, date_field="revision_date", batch_size=STREAM_BATCH_SIZE, position=None):
+    """
+    Iterate the objects of the queryset from the newest `date_field` by keyset batches.
+    Each batch is a new query, so the prefetch_related() of the queryset still applies and only one batch is in memory
+    :param queryset: (QuerySet) The queryset of the objects which have `date_field` and `id`
+    :param date_field: (str) The date field of the order
+    :param batch_size: (int) Number of objects of a batch
+    :param position: (list) [date, id] of the last object which was already read, to resume the iteration
+    :return: The lists of objects
+    """
+    queryset = queryset.order_by(f"-{date_field}", "-id")
+    while True:
+        batch_queryset = queryset
+        if position is not None:
+            batch_queryset = queryset.filter(
+                Q(**{f"{date_field}__lt": position[0]}) | Q(**{date_field: position[0], "id__lt": position[1]})
+            )
+        batch = list(batch_queryset[:batch_size])
+        if batch:
+            yield batch
+        if len(batch) < batch_size:
+            return
+        position = [getattr(batch[-1], date_field), batch[-1].id]
+
+
+def iter_by_revision_date(queryset, batch_size=STREAM_BATCH_SIZE):
+    """
+    Iterate the objects of the queryset from the newest revision date by keyset batches
+    """
+    for batch in iter_batches_by_keyset(queryset, date_field="revision_date", batch_size=batch_size):
+        yield from batch
+
+
+def iter_json_object(data, streams=None):
+    """
+    Encode a JSON object piece by piece
+    :param data: (dict) The object. The values of the keys in `streams` are ignored
+    :param streams: (dict) {key: iterator} The items of these keys are encoded one by one as JSON arrays
+    :return: The str pieces
+    """
+    streams = streams or {}
+    encoder = JSONEncoder()
+    yield "{"
+    for index, (key, value) in enumerate(data.items()):
+        yield "{}{}:".format("," if index else "", json.dumps(key))
+        if key not in streams:
+            yield encoder.encode(value)
+            continue
+        yield "["
+        for item_index, item in enumerate(streams[key]):
+            yield "{}{}".format("," if item_index else "", encoder.encode(item))
+        yield "]"
+    yield "}"
+
+
+def iter_chunks(pieces, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Join the str pieces into utf-8 chunks of about `chunk_size` bytes
+    """
+    buffer = []
+    buffer_size = 0
+    for piece in pieces:
+        piece = piece.encode()
+        buffer.append(piece)
+        buffer_size += len(piece)
+        if buffer_size >= chunk_size:
+            yield b"".join(buffer)
+            buffer = []
+            buffer_size = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def iter_gzip(chunks, level=STREAM_GZIP_LEVEL):
+    """
+    Compress the byte chunks as one gzip stream
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed_chunk = compressor.compress(chunk)
+        if compressed_chunk:
+            yield compressed_chunk
+    yield compressor.flush()
+
+
+class ResumableGzip:
+    """
+    Compress a stream into one gzip member which can be cut into parts, e.g. the parts of a S3 multipart upload.
+    `flush_part()` ends a part on a byte boundary, then `get_state()` is enough to continue the same member from the
+    next part in another process: the raw deflate data is continued by a new compressor, and the CRC and the size
+    of the gzip trailer are carried in the state
+    """
+    def __init__(self, level=STREAM_GZIP_LEVEL, state=None):
+        state = state or {}
+        self.crc = state.get("crc", 0)
+        self.size = state.get("size", 0)
+        self.started = state.get("started", False)
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+
+    def get_state(self):
+        return {"crc": self.crc, "size": self.size, "started": self.started}
+
+    def _header(self):
+        if self.started:
+            return b""
+        self.started = True
+        return GZIP_HEADER
+
+    def compress(self, data: bytes):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        return self._header() + self.compressor.compress(data)
+
+    def flush_part(self):
+        return self._header() + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._header() + self.compressor.flush() + struct.pack("<II", self.crc, self.size & 0xffffffff)
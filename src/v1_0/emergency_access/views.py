@@ -1,6 +1,5 @@
 import json
 
-from django.conf import settings
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.exceptions import NotFound, ValidationError
@@ -49,9 +48,7 @@ class EmergencyAccessPwdViewSet(PasswordManagerViewSet):
             raise NotFound
 
     def allow_emergency_access(self, user):
-        current_plan = self.user_repository.get_current_plan(user=user, scope=settings.SCOPE_PWD_MANAGER)
-        plan_obj = current_plan.get_plan_obj()
-        if user.is_active_enterprise_member() is False and plan_obj.allow_emergency_access() is False:
+        if self.user_repository.get_user_entitlements(user=user).allow_emergency_access() is False:
             raise ValidationError({"non_field_errors": [gen_error("7002")]})
         return user
 
@@ -378,7 +375,7 @@ class EmergencyAccessPwdViewSet(PasswordManagerViewSet):
             raise NotFound
         ciphers = self.cipher_repository.get_multiple_by_user(
             user=emergency_access.grantor, # only_personal=True
-        ).prefetch_related('collections_ciphers')
+        ).prefetch_related('collections_ciphers', 'cipher_user_states')
         key_encrypted = emergency_access.key_encrypted
 
         team_members = emergency_access.grantor.team_members.filter(
@@ -67,23 +67,19 @@ class FolderPwdViewSet(PasswordManagerViewSet):
         self.check_pwd_session_auth(request=request)
         folder = self.get_object()
         folder_id = kwargs.get("pk")
-        user_id = user.user_id
-        # Get list cipher of this folder then re-set folder of cipher
-        ciphers = self.cipher_repository.get_multiple_by_user(user=user)
-        soft_delete_cipher = []
-        for cipher in ciphers:
-            folders_dict = cipher.get_folders()
-            cipher_folder_id = folders_dict.get(user_id, None)
-            if cipher_folder_id == folder_id:
-                folders_dict[user_id] = None
-                cipher.folders = folders_dict
-                cipher.save()
-                if not cipher.team_id:
-                    soft_delete_cipher.append(cipher.id)
+        # Get list ciphers of this folder, then reset their folder. The folder deletion only resets the folder of the
+        # CipherUserState rows, not the legacy folders of the ciphers which were not backfilled
+        folder_ciphers = list(
+            self.cipher_repository.get_multiple_by_folder(user=user, folder_id=folder_id).values_list('id', 'team_id')
+        )
+        self.cipher_repository.move_multiple_cipher(
+            cipher_ids=[cipher_id for cipher_id, team_id in folder_ciphers], user_moved=user, folder_id=None
+        )
+        soft_delete_cipher = [cipher_id for cipher_id, team_id in folder_ciphers if not team_id]
         # Soft delete all ciphers in folder
         self.cipher_repository.delete_multiple_cipher(cipher_ids=soft_delete_cipher, user_deleted=user)
         # Delete this folder object
-        folder.delete()
+        self.folder_repository.destroy_folder(folder=folder)
         # Clear sync data
         delete_sync_cache_data(user_id=user.user_id)
         # Sending sync event
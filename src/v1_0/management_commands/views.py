@@ -11,6 +11,7 @@ from rest_framework.exceptions import NotFound, PermissionDenied, ValidationErro
 
 from cystack_models.models import User, NotificationSetting
 from shared.background.i_background import BackgroundThread
+from shared.caching.sync_cache import get_sync_cache_metrics
 from shared.constants.ciphers import *
 from shared.constants.transactions import PLAN_TYPE_PM_FREE, PAYMENT_STATUS_PAID
 from shared.constants.user_notification import NOTIFY_PWD_TIP_TRICK
@@ -64,6 +65,10 @@ class ManagementCommandPwdViewSet(PasswordManagerViewSet):
             raise ValidationError(detail={"err": e.__str__()})
         return Response(status=200, data={"id": command_name})
 
+    @staticmethod
+    def sync_cache_metrics():
+        return get_sync_cache_metrics()
+
     def set_user_plan(self, user_id, start_period, end_period, cancel_at_period_end, default_payment_method, plan_id,
                       pm_mobile_subscription):
         user = self.user_repository.retrieve_or_create_by_id(user_id=user_id)
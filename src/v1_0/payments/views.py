@@ -993,7 +993,7 @@ class PaymentPwdViewSet(PasswordManagerViewSet):
     @action(methods=["get"], detail=False)
     def plan_limit(self, request, *args, **kwargs):
         user = self.request.user
-        current_plan = self.user_repository.get_current_plan(user=user, scope=settings.SCOPE_PWD_MANAGER)
+        entitlements = self.user_repository.get_user_entitlements(user=user)
 
         ciphers_statistic = Cipher.objects.filter(created_by_id=user)
         ciphers_statistic_data = {
@@ -1008,9 +1008,8 @@ class PaymentPwdViewSet(PasswordManagerViewSet):
         relay_addresses_statistic_data = {
             "total": user.relay_addresses.count()
         }
-        plan_limit = self.user_repository.get_max_allow_cipher_type(user=user)
-        plan_obj = current_plan.get_plan_obj()
-        if plan_obj.allow_relay_premium() or user.is_active_enterprise_member():
+        plan_limit = entitlements.get_max_allow_cipher_type()
+        if entitlements.allow_relay_premium():
             relay_addresses_limit = None
         else:
             relay_addresses_limit = MAX_FREE_RElAY_DOMAIN
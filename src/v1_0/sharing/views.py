@@ -1,6 +1,5 @@
 import json
 
-from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Q, Count
 from rest_framework.response import Response
@@ -10,7 +9,7 @@ from rest_framework.exceptions import NotFound, ValidationError
 from cystack_models.models import Enterprise
 from cystack_models.models.notifications.notification_settings import NotificationSetting
 from shared.background import LockerBackgroundFactory, BG_EVENT
-from shared.caching.sync_cache import delete_sync_cache_data
+from shared.caching.sync_cache import delete_sync_cache_data, delete_multiple_sync_cache_data
 from shared.constants.ciphers import MAP_CIPHER_TYPE_STR
 from shared.constants.enterprise_members import E_MEMBER_STATUS_CONFIRMED
 from shared.constants.event import EVENT_ITEM_SHARE_CREATED
@@ -64,9 +63,7 @@ class SharingPwdViewSet(PasswordManagerViewSet):
         return super(SharingPwdViewSet, self).get_serializer_class()
 
     def allow_personal_sharing(self, user):
-        current_plan = self.user_repository.get_current_plan(user=user, scope=settings.SCOPE_PWD_MANAGER)
-        plan_obj = current_plan.get_plan_obj()
-        if user.is_active_enterprise_member() is False and plan_obj.allow_personal_share() is False:
+        if self.user_repository.get_user_entitlements(user=user).allow_personal_share() is False:
             raise ValidationError({"non_field_errors": [gen_error("7002")]})
         return user
 
@@ -770,8 +767,7 @@ class SharingPwdViewSet(PasswordManagerViewSet):
             PwdSync(event=SYNC_EVENT_CIPHER, user_ids=[user.user_id] + removed_member_user_ids).send()
 
         # Delete cached data
-        for u_id in [user.user_id] + removed_member_user_ids:
-            delete_sync_cache_data(user_id=u_id)
+        delete_multiple_sync_cache_data(user_ids=[user.user_id] + removed_member_user_ids)
 
         return Response(status=200, data={"success": True})
 
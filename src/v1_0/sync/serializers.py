@@ -124,9 +124,8 @@ class SyncCipherSerializer(serializers.ModelSerializer):
         folder_id = instance.get_folders().get(user.user_id)
         favorite = instance.get_favorites().get(user.user_id, False)
 
-        collection_ids = []
-        if instance.collections_ciphers.exists():
-            collection_ids = list(instance.collections_ciphers.values_list('collection_id', flat=True))
+        # Use the prefetched collections_ciphers if it is available
+        collection_ids = [collection_cipher.collection_id for collection_cipher in instance.collections_ciphers.all()]
 
         try:
             view_password = instance.view_password
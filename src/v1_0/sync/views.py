@@ -2,17 +2,22 @@ from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.paginator import Paginator, EmptyPage
 from django.db.models import Count
-from rest_framework.exceptions import NotFound
+from django.http import StreamingHttpResponse
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
 from core.utils.data_helpers import camel_snake_data
-from shared.caching.sync_cache import get_sync_cache_key, SYNC_CACHE_TIMEOUT
+from shared.caching.sync_cache import get_sync_cache_key, incr_sync_cache_metrics, SYNC_CACHE_TIMEOUT, \
+    SYNC_CACHE_ENDPOINT_SYNC
 from shared.constants.account import LOGIN_METHOD_PASSWORDLESS
-from shared.constants.ciphers import CIPHER_TYPE_MASTER_PASSWORD
+from shared.constants.ciphers import CIPHER_TYPE_MASTER_PASSWORD, SYNC_TOMBSTONE_CIPHER, SYNC_TOMBSTONE_FOLDER, \
+    SYNC_TOMBSTONE_COLLECTION, SYNC_TOMBSTONE_RETENTION
 from shared.permissions.locker_permissions.sync_pwd_permission import SyncPwdPermission
 from v1_0.sync.serializers import SyncProfileSerializer, SyncCipherSerializer, SyncFolderSerializer, \
     SyncCollectionSerializer, SyncPolicySerializer, SyncOrgDetailSerializer, SyncEnterprisePolicySerializer
+from shared.utils.app import now
+from shared.utils.streaming import iter_by_revision_date, iter_json_object, iter_chunks, iter_gzip
 from v1_0.general_view import PasswordManagerViewSet
 
 
@@ -50,11 +55,89 @@ class SyncPwdViewSet(PasswordManagerViewSet):
         except ObjectDoesNotExist:
             raise NotFound
 
+    def get_since_param(self):
+        since_param = self.request.query_params.get("since")
+        if since_param is None:
+            return None
+        try:
+            since = float(since_param)
+        except (TypeError, ValueError):
+            raise ValidationError(detail={"since": ["The since revision date is not valid"]})
+        # The tombstones older than the retention were purged => The client must run the full sync
+        if since < now() - SYNC_TOMBSTONE_RETENTION:
+            return None
+        return since
+
+    def delta_sync(self, user, since):
+        """
+        Get the ciphers, folders and collections which were changed or deleted from the `since` revision date
+        :param user: (obj) User object
+        :param since: (float) The revision date of the last sync
+        :return:
+        """
+        delta_data = {
+            "object": "syncDelta",
+            "since": since,
+            "revision_date": user.revision_date,
+            "ciphers": [],
+            "collections": [],
+            "folders": [],
+            "deleted": {
+                "ciphers": [],
+                "collections": [],
+                "folders": []
+            }
+        }
+        # Nothing was changed from the last sync
+        if user.revision_date is not None and user.revision_date < since:
+            return camel_snake_data(delta_data, snake_to_camel=True)
+
+        exclude_types = []
+        if user.login_method == LOGIN_METHOD_PASSWORDLESS:
+            exclude_types = [CIPHER_TYPE_MASTER_PASSWORD]
+        ciphers = self.cipher_repository.get_multiple_by_user(
+            user=user, exclude_types=exclude_types
+        ).filter(revision_date__gte=since).order_by('-revision_date').prefetch_related('collections_ciphers', 'cipher_user_states')
+        folders = self.folder_repository.get_multiple_by_user(user=user).filter(revision_date__gte=since)
+        collections = self.collection_repository.get_multiple_user_collections(
+            user=user, exclude_team_ids=[]
+        ).filter(revision_date__gte=since).select_related('team')
+        tombstones = self.cipher_repository.get_sync_tombstones(user=user, since=since).values_list(
+            'object_type', 'object_id'
+        )
+        map_tombstone_types = {
+            SYNC_TOMBSTONE_CIPHER: "ciphers",
+            SYNC_TOMBSTONE_COLLECTION: "collections",
+            SYNC_TOMBSTONE_FOLDER: "folders"
+        }
+        for object_type, object_id in tombstones:
+            if object_type in map_tombstone_types:
+                delta_data["deleted"][map_tombstone_types[object_type]].append(object_id)
+
+        delta_data.update({
+            "ciphers": SyncCipherSerializer(ciphers, many=True, context={"user": user}).data,
+            "collections": SyncCollectionSerializer(collections, many=True, context={"user": user}).data,
+            "folders": SyncFolderSerializer(folders, many=True).data,
+        })
+        return camel_snake_data(delta_data, snake_to_camel=True)
+
     @action(methods=["get"], detail=False)
     def sync(self, request, *args, **kwargs):
         user = self.request.user
         self.check_pwd_session_auth(request=request)
 
+        # Delta sync mode: `sync?since=<revision_date>`
+        since = self.get_since_param()
+        # The user lost or got the access to a team from the last sync => The client must run the full sync
+        if since is not None and self.cipher_repository.is_sync_access_changed(user=user, since=since):
+            since = None
+        if since is not None:
+            return Response(status=200, data=self.delta_sync(user=user, since=since))
+
+        # Streaming mode: `sync?stream=1` writes the full sync response object by object
+        if self.request.query_params.get("stream") == "1":
+            return self.stream_sync(user=user)
+
         paging_param = self.request.query_params.get("paging", "0")
         page_size_param = self.check_int_param(self.request.query_params.get("size", 50))
         page_param = self.check_int_param(self.request.query_params.get("page", 1))
@@ -62,6 +145,7 @@ class SyncPwdViewSet(PasswordManagerViewSet):
         # Get sync data from cache
         cache_key = get_sync_cache_key(user_id=user.user_id, page=page_param, size=page_size_param)
         response_cache_data = cache.get(cache_key)
+        incr_sync_cache_metrics(endpoint=SYNC_CACHE_ENDPOINT_SYNC, hit=bool(response_cache_data))
         if response_cache_data:
             return Response(status=200, data=response_cache_data)
 
@@ -80,7 +164,7 @@ class SyncPwdViewSet(PasswordManagerViewSet):
 
         ciphers = self.cipher_repository.get_multiple_by_user(
             user=user, exclude_team_ids=block_team_ids, exclude_types=exclude_types
-        ).order_by('-revision_date').prefetch_related('collections_ciphers')
+        ).order_by('-revision_date').prefetch_related('collections_ciphers', 'cipher_user_states')
         total_cipher = ciphers.count()
         not_deleted_ciphers = ciphers.filter(deleted_date__isnull=True)
         not_deleted_ciphers_statistic = not_deleted_ciphers.values('type').annotate(
@@ -106,6 +190,7 @@ class SyncPwdViewSet(PasswordManagerViewSet):
 
         sync_data = {
             "object": "sync",
+            "revision_date": user.revision_date,
             "count": {
                 "ciphers": total_cipher,
                 "not_deleted_ciphers": {
@@ -125,6 +210,74 @@ class SyncPwdViewSet(PasswordManagerViewSet):
         cache.set(cache_key, sync_data, SYNC_CACHE_TIMEOUT)
         return Response(status=200, data=sync_data)
 
+    def stream_sync(self, user):
+        """
+        Stream the full sync response. The ciphers are loaded by batches, then serialized and camelized one by one,
+        so the memory of the request does not depend on the vault size. The response is not cached.
+        It is gzip-compressed if the client accepts it
+        :param user: (obj) User object
+        :return: (StreamingHttpResponse)
+        """
+        policies = self.team_repository.get_multiple_policy_by_user(user=user).select_related('enterprise')
+        exclude_types = []
+        if user.login_method == LOGIN_METHOD_PASSWORDLESS:
+            exclude_types = [CIPHER_TYPE_MASTER_PASSWORD]
+        ciphers = self.cipher_repository.get_multiple_by_user(
+            user=user, exclude_team_ids=[], exclude_types=exclude_types
+        ).prefetch_related('collections_ciphers', 'cipher_user_states')
+        not_deleted_ciphers = ciphers.filter(deleted_date__isnull=True)
+        not_deleted_ciphers_statistic = not_deleted_ciphers.values('type').annotate(
+            count=Count('type')
+        ).order_by('-count')
+        not_deleted_ciphers_count = {item["type"]: item["count"] for item in list(not_deleted_ciphers_statistic)}
+        folders = self.folder_repository.get_multiple_by_user(user=user)
+        collections = self.collection_repository.get_multiple_user_collections(
+            user=user, exclude_team_ids=[]
+        ).select_related('team')
+
+        sync_data = camel_snake_data({
+            "object": "sync",
+            "revision_date": user.revision_date,
+            "count": {
+                "ciphers": ciphers.count(),
+                "not_deleted_ciphers": {
+                    "total": sum(not_deleted_ciphers_count.values()),
+                    "ciphers": not_deleted_ciphers_count
+                },
+            },
+            "profile": SyncProfileSerializer(user, many=False).data,
+            "ciphers": [],
+            "collections": [],
+            "folders": [],
+            "domains": None,
+            "policies": SyncEnterprisePolicySerializer(policies, many=True).data,
+            "sends": []
+        }, snake_to_camel=True)
+        streams = {
+            "ciphers": (
+                camel_snake_data(SyncCipherSerializer(cipher, context={"user": user}).data, snake_to_camel=True)
+                for cipher in iter_by_revision_date(ciphers)
+            ),
+            "collections": (
+                camel_snake_data(
+                    SyncCollectionSerializer(collection, context={"user": user}).data, snake_to_camel=True
+                ) for collection in collections.iterator()
+            ),
+            "folders": (
+                camel_snake_data(SyncFolderSerializer(folder).data, snake_to_camel=True)
+                for folder in folders.iterator()
+            ),
+        }
+        content = iter_chunks(iter_json_object(sync_data, streams=streams))
+        is_gzip = "gzip" in self.request.META.get("HTTP_ACCEPT_ENCODING", "")
+        response = StreamingHttpResponse(
+            iter_gzip(content) if is_gzip else content, status=200, content_type="application/json"
+        )
+        response["Vary"] = "Accept-Encoding"
+        if is_gzip:
+            response["Content-Encoding"] = "gzip"
+        return response
+
     @action(methods=["get"], detail=False)
     def sync_count(self, request, *args, **kwargs):
         user = self.request.user
@@ -172,7 +325,7 @@ class SyncPwdViewSet(PasswordManagerViewSet):
         cipher = self.get_cipher_obj()
         cipher_obj = self.cipher_repository.get_multiple_by_user(
             user=user, filter_ids=[cipher.id]
-        ).prefetch_related('collections_ciphers').first()
+        ).prefetch_related('collections_ciphers', 'cipher_user_states').first()
         serializer = SyncCipherSerializer(cipher_obj, context={"user": user}, many=False)
         result = camel_snake_data(serializer.data, snake_to_camel=True)
         return Response(status=200, data=result)
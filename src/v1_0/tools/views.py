@@ -1,4 +1,3 @@
-from django.conf import settings
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
@@ -22,11 +21,10 @@ class ToolPwdViewSet(PasswordManagerViewSet):
     def get_object(self):
         user = self.request.user
         # Only premium plan
-        current_plan = self.user_repository.get_current_plan(user=user, scope=settings.SCOPE_PWD_MANAGER)
-        plan_obj = current_plan.get_plan_obj()
+        entitlements = self.user_repository.get_user_entitlements(user=user)
 
         if self.action == "breach":
-            if user.is_active_enterprise_member() is False and plan_obj.allow_tools_data_breach() is False:
+            if entitlements.allow_tools_data_breach() is False:
                 raise ValidationError({"non_field_errors": [gen_error("7002")]})
 
         return user
@@ -5,7 +5,7 @@ from typing import Dict, Union, Any
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import F, FloatField, ExpressionWrapper, Count, CharField, IntegerField
+from django.db.models import Count, CharField, IntegerField
 from django.db.models.expressions import RawSQL, Case, When
 from rest_framework.response import Response
 from rest_framework.exceptions import ValidationError, NotFound, PermissionDenied
@@ -20,6 +20,8 @@ from cystack_models.models.enterprises.members.enterprise_members import Enterpr
 from cystack_models.models.users.device_access_tokens import DeviceAccessToken
 from shared.background import LockerBackgroundFactory, BG_EVENT, BG_NOTIFY
 from shared.background.i_background import BackgroundThread
+from shared.caching.auth_token_cache import revoke_auth_token_cache
+from shared.caching.login_policy_cache import get_login_policy_snapshot
 from shared.constants.account import *
 from shared.constants.ciphers import CIPHER_TYPE_MASTER_PASSWORD
 from shared.constants.enterprise_members import *
@@ -122,6 +124,8 @@ class UserPwdViewSet(PasswordManagerViewSet):
         user.revision_date = now()
         user.delete_account_date = None
         user.save()
+        # The cached principals of this user are not activated
+        revoke_auth_token_cache(user.user_id)
 
         current_plan = self.user_repository.get_current_plan(user=user, scope=settings.SCOPE_PWD_MANAGER)
         # Upgrade trial plan
@@ -339,22 +343,8 @@ class UserPwdViewSet(PasswordManagerViewSet):
         else:
             is_factor2 = False
 
-        if is_factor2 is False:
-            user_enterprises = Enterprise.objects.filter(
-                enterprise_members__user=user, enterprise_members__status=E_MEMBER_STATUS_CONFIRMED
-            )
-            for enterprise in user_enterprises:
-                policy = enterprise.policies.filter(policy_type=POLICY_TYPE_2FA, enabled=True).first()
-                if not policy:
-                    continue
-                try:
-                    member_role = enterprise.enterprise_members.get(user=user).role_id
-                except ObjectDoesNotExist:
-                    continue
-                only_admin = policy.policy_2fa.only_admin
-                if only_admin is False or \
-                        (only_admin and member_role in [E_MEMBER_ROLE_ADMIN, E_MEMBER_ROLE_PRIMARY_ADMIN]):
-                    return Response(status=200, data={"block": True})
+        if is_factor2 is False and get_login_policy_snapshot(user_id=user.user_id).get("require_2fa"):
+            return Response(status=200, data={"block": True})
         return Response(status=200, data={"block": False})
 
     @action(methods=["get"], detail=False)
@@ -382,10 +372,9 @@ class UserPwdViewSet(PasswordManagerViewSet):
             error_detail["wait"] = wait
             return Response(status=400, data=error_detail)
 
-        user_enterprises = Enterprise.objects.filter(
-            enterprise_members__user=user, enterprise_members__status=E_MEMBER_STATUS_CONFIRMED
-        )
-        user_enterprise_ids = list(user_enterprises.values_list('id', flat=True))
+        # The enterprise login policies of the user are compiled once and cached
+        login_policy = get_login_policy_snapshot(user_id=user.user_id)
+        user_enterprise_ids = login_policy.get("enterprise_ids")
 
         ip = request.data.get("ip")
         serializer = self.get_serializer(data=request.data)
@@ -405,18 +394,11 @@ class UserPwdViewSet(PasswordManagerViewSet):
                     "enterprise_ids": user_enterprise_ids, "user_id": user.user_id, "acting_user_id": user.user_id,
                     "type": EVENT_USER_LOGIN_FAILED, "ip_address": ip
                 })
-                policy = self.team_repository.get_multiple_policy_by_user(user=user).filter(
-                    policy_type=POLICY_TYPE_BLOCK_FAILED_LOGIN, enabled=True
-                ).annotate(
-                    rate_limit=ExpressionWrapper(
-                        F('policy_failed_login__failed_login_attempts') * 1.0 /
-                        F('policy_failed_login__failed_login_duration'), output_field=FloatField()
-                    )
-                ).order_by('rate_limit').first()
+                policy = login_policy.get("failed_login_policy")
                 if policy:
-                    failed_login_attempts = policy.policy_failed_login.failed_login_attempts
-                    failed_login_duration = policy.policy_failed_login.failed_login_duration
-                    failed_login_block_time = policy.policy_failed_login.failed_login_block_time
+                    failed_login_attempts = policy.get("failed_login_attempts")
+                    failed_login_duration = policy.get("failed_login_duration")
+                    failed_login_block_time = policy.get("failed_login_block_time")
                     latest_request_login = user.last_request_login
 
                     user.login_failed_attempts = user.login_failed_attempts + 1
@@ -435,11 +417,10 @@ class UserPwdViewSet(PasswordManagerViewSet):
                                 "type": EVENT_USER_BLOCK_LOGIN, "ip_address": ip
                             }
                         )
-                        owner = policy.enterprise.enterprise_members.get(is_primary=True).user_id
                         raise ValidationError(detail={
                             "password": ["Password is not correct"],
-                            "failed_login_owner_email": policy.policy_failed_login.failed_login_owner_email,
-                            "owner": owner,
+                            "failed_login_owner_email": policy.get("failed_login_owner_email"),
+                            "owner": policy.get("owner"),
                             "lock_time": "{} (UTC+00)".format(
                                 datetime.utcfromtimestamp(now()).strftime('%H:%M:%S %d-%m-%Y')
                             ),
@@ -451,30 +432,17 @@ class UserPwdViewSet(PasswordManagerViewSet):
 
             raise ValidationError(detail={"password": ["Password is not correct"]})
 
-        if user_enterprises.filter(enterprise_members__user=user, enterprise_members__is_activated=False).exists():
+        if login_policy.get("inactive_member"):
             raise ValidationError({"non_field_errors": [gen_error("1009")]})
-        if EnterpriseMember.objects.filter(
-            user=user, status__in=[E_MEMBER_STATUS_REQUESTED, E_MEMBER_STATUS_INVITED], domain__isnull=False
-        ).exists():
+        if login_policy.get("pending_domain_member"):
             raise ValidationError({"non_field_errors": [gen_error("1011")]})
-        if user_enterprises.filter(enterprise_members__user=user, locked=True).exists():
+        if login_policy.get("locked_enterprise"):
             raise ValidationError({"non_field_errors": [gen_error("1010")]})
 
         # Check 2FA policy
         is_factor2 = request.data.get("is_factor2", False)
-        if is_factor2 is False:
-            for enterprise in user_enterprises:
-                policy = enterprise.policies.filter(policy_type=POLICY_TYPE_2FA, enabled=True).first()
-                if not policy:
-                    continue
-                try:
-                    member_role = enterprise.enterprise_members.get(user=user).role_id
-                except ObjectDoesNotExist:
-                    continue
-                only_admin = policy.policy_2fa.only_admin
-                if only_admin is False or \
-                        (only_admin and member_role in [E_MEMBER_ROLE_ADMIN, E_MEMBER_ROLE_PRIMARY_ADMIN]):
-                    raise ValidationError({"non_field_errors": [gen_error("1012")]})
+        if is_factor2 is False and login_policy.get("require_2fa"):
+            raise ValidationError({"non_field_errors": [gen_error("1012")]})
 
         # Unblock login
         user.last_request_login = now()
@@ -486,9 +454,9 @@ class UserPwdViewSet(PasswordManagerViewSet):
         decoded_token = self.decode_token(request.auth)
         sso_token_id = decoded_token.get("sso_token_id") if decoded_token else None
 
-        # Get current user plan, the sync device limit
-        current_plan = self.user_repository.get_current_plan(user=user, scope=settings.SCOPE_PWD_MANAGER)
-        limit_sync_device = None if user_enterprise_ids else current_plan.get_plan_obj().get_sync_device()
+        # Get the sync device limit of the current user plan
+        entitlements = self.user_repository.get_user_entitlements(user=user)
+        limit_sync_device = None if user_enterprise_ids else entitlements.sync_device
         # The list stores sso token id which will not be synchronized
         not_sync_sso_token_ids = []
 
@@ -78,6 +78,8 @@ urlpatterns += [
     url(r'^(?P<pk>[0-9a-z]+)/activity$', views.ActivityLogPwdViewSet.as_view({'get': 'list'})),
     url(r'^(?P<pk>[0-9a-z]+)/activity/export$',
         views.ActivityLogPwdViewSet.as_view({'get': 'export', 'post': 'export_to_email'})),
+    url(r'^(?P<pk>[0-9a-z]+)/activity/export/(?P<export_id>[0-9a-z]+)$',
+        views.ActivityLogPwdViewSet.as_view({'get': 'export_progress'})),
 ]
 
 